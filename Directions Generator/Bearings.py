@@ -0,0 +1,273 @@
+'''
+Program: Bearings.py
+Description: Works out the direction and turn of every street on a route in one
+             batch. True compass bearings are computed for the whole route at once
+             with NumPy, turns are classified by the angle between bearings, and
+             each street name is simplified only once. The result is the same list
+             of [street, length, direction, turn] records which generate_directions()
+             builds its sentences from.
+
+Usage: python Bearings.py [segments]
+       (Benchmarks the batch stage, with and without NumPy, against the step-by-step loop
+        which generate_directions() used before.)
+
+PLEASE NOTE: NumPy is optional. Without it, the same bearings are computed one street
+             at a time in plain Python.
+'''
+
+#Imports
+import sys
+import math
+import time
+
+try:
+    import numpy as np      #Only needed to compute the bearings in vectorized passes.
+except ImportError:
+    np = None
+
+#A street is north/south bound when its bearing is more than this many degrees from east/west...
+NORTH_SOUTH_ANGLE = math.degrees(math.atan(.70))
+#...and east/west bound when it is less than this many degrees. Anything in between is a mix (e.g. "North-East")
+#These match the latitude/longitude ratios used by determine_direction().
+EAST_WEST_ANGLE = math.degrees(math.atan(.30))
+
+#A change of bearing between these angles (in degrees) is a turn. Smaller changes carry on straight
+#and larger ones turn back on themselves, both of which are described without a left or right.
+MIN_TURN_ANGLE = 30
+MAX_TURN_ANGLE = 150
+
+def bearings(lat1, lng1, lat2, lng2):
+    '''
+    Computes the initial compass bearing from each point 1 to each point 2.
+    ------------------------------------------------------------------------------
+    Input:
+        Arrays of latitude/longitude degrees.
+    ------------------------------------------------------------------------------
+    Output:
+        bearing --> Array of bearings in degrees clockwise from north. (0 to 360)
+        north, east --> Arrays of the north and east components of each bearing.
+    '''
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlng = np.radians(np.asarray(lng2) - np.asarray(lng1))
+    east = np.sin(dlng) * np.cos(lat2)
+    north = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlng)
+    bearing = np.degrees(np.arctan2(east, north)) % 360
+    return bearing, north, east
+
+def compass_directions(north, east):
+    '''
+    Converts the components of bearings into directions such as "North" or "South-East".
+    Ties are broken the same way as determine_direction(). (No change --> "South")
+    '''
+    #Angle of each bearing away from the east/west axis.
+    angle = np.where(east == 0, 90, np.degrees(np.arctan2(np.abs(north), np.abs(east))))
+    north_south = np.where(north > 0, "North", "South")
+    east_west = np.where(east > 0, "East", "West")
+    mixed = np.char.add(np.char.add(north_south, "-"), east_west)
+    directions = np.where(angle > NORTH_SOUTH_ANGLE, north_south, np.where(angle < EAST_WEST_ANGLE, east_west, mixed))
+    return directions.tolist()
+
+def classify_turns(from_bearings, to_bearings):
+    '''
+    Classifies the turn needed to change from each bearing to the next as "Right", "Left" or "Unknown".
+    '''
+    #Change in bearing, between -180 and 180 degrees. (Positive is clockwise)
+    change = (np.asarray(to_bearings) - np.asarray(from_bearings) + 540) % 360 - 180
+    magnitude = np.abs(change)
+    turning = (magnitude >= MIN_TURN_ANGLE) & (magnitude <= MAX_TURN_ANGLE)
+    return np.where(turning, np.where(change > 0, "Right", "Left"), "Unknown").tolist()
+
+def bearing_of(lat1, lng1, lat2, lng2):
+    '''Same as bearings(), for a single pair of points in plain Python. Returns (bearing, north, east)'''
+    lat1 = math.radians(lat1)
+    lat2 = math.radians(lat2)
+    dlng = math.radians(lng2 - lng1)
+    east = math.sin(dlng) * math.cos(lat2)
+    north = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlng)
+    return math.degrees(math.atan2(east, north)) % 360, north, east
+
+def compass_direction(north, east):
+    '''Same as compass_directions(), for a single bearing in plain Python.'''
+    angle = 90 if east == 0 else math.degrees(math.atan2(abs(north), abs(east)))
+    north_south = "North" if north > 0 else "South"
+    east_west = "East" if east > 0 else "West"
+    if angle > NORTH_SOUTH_ANGLE:
+        return north_south
+    if angle < EAST_WEST_ANGLE:
+        return east_west
+    return north_south + "-" + east_west
+
+def classify_turn(from_bearing, to_bearing):
+    '''Same as classify_turns(), for a single change of bearing in plain Python.'''
+    change = (to_bearing - from_bearing + 540) % 360 - 180
+    if MIN_TURN_ANGLE <= abs(change) <= MAX_TURN_ANGLE:
+        return "Right" if change > 0 else "Left"
+    return "Unknown"
+
+def describe_route(route, simplify_streetname, vectorized=None):
+    '''
+    Builds the basic information of a route in one batch.
+    ------------------------------------------------------------------------------
+    Input:
+        route --> List of [latitude, longitude, street_name, distance], as returned by Graph.djikstra().
+        simplify_streetname --> Function which simplifies a street name. (See Functionality.py)
+        vectorized --> Whether the bearings are computed with NumPy. (Default: if NumPy is installed)
+    ------------------------------------------------------------------------------
+    Output:
+        A list of [street, length, direction, turn] for each street driven on.
+    '''
+    if len(route) == 0:
+        return []
+
+    #Simplify each street name only once.
+    simplified = {}
+    for step in route:
+        if step[2] not in simplified:
+            simplified[step[2]] = simplify_streetname(step[2])
+
+    #Split the route into runs of steps on the same street. (first index, last index, street, length)
+    runs = []
+    i = 0
+    while i < len(route):
+        street = simplified[route[i][2]]
+        first = i
+        length = 0
+        while i < len(route) and simplified[route[i][2]] == street:
+            length += route[i][3]
+            i += 1
+        runs.append((first, i - 1, street, length))
+
+    if vectorized is None:
+        vectorized = np is not None
+    firsts = [run[0] for run in runs]
+    lasts = [run[1] for run in runs]
+    #The end of the previous street; the very first street is measured from its own start.
+    previous_ends = firsts[:1] + lasts[:-1]
+
+    if vectorized:
+        coordinates = np.array([(step[0], step[1]) for step in route], dtype=float)
+        firsts, lasts, previous_ends = np.array(firsts), np.array(lasts), np.array(previous_ends)
+        #Direction of each street, from the end of the previous street to the end of this one.
+        direction_bearings, north, east = bearings(coordinates[previous_ends, 0], coordinates[previous_ends, 1],
+                                                   coordinates[lasts, 0], coordinates[lasts, 1])
+        directions = compass_directions(north, east)
+        #Bearing taken onto each street, from the end of the previous street to the start of this one.
+        entry_bearings = bearings(coordinates[previous_ends, 0], coordinates[previous_ends, 1],
+                                  coordinates[firsts, 0], coordinates[firsts, 1])[0]
+    else:
+        direction_bearings = []
+        directions = []
+        entry_bearings = []
+        for first, last, previous_end in zip(firsts, lasts, previous_ends):
+            bearing, north, east = bearing_of(route[previous_end][0], route[previous_end][1], route[last][0], route[last][1])
+            direction_bearings.append(bearing)
+            directions.append(compass_direction(north, east))
+            entry_bearings.append(bearing_of(route[previous_end][0], route[previous_end][1], route[first][0], route[first][1])[0])
+
+    #Merge runs the same way generate_directions() always has, remembering which run each
+    #turn is measured from. (The run of the most recent record)
+    route_information = []
+    record_runs = []
+    turn_from = [None] * len(runs)
+    pending = 0 #Length of links driven before the first record.
+    for r, (first, last, street, length) in enumerate(runs):
+        if r > 0 and record_runs != []:
+            turn_from[r] = record_runs[-1]
+        end_index = len(route_information) - 1
+        if end_index > 0 and route_information[end_index][0] == street:
+            #Helps deal with streets that are connected by round-abouts, etc.
+            route_information[end_index][1] += length
+        elif not "_" in street:
+            #Ignore "secondary_links" and other links that connect two streets.
+            route_information.append([street, length + pending, directions[r], "Unknown"])
+            record_runs.append(r)
+            pending = 0
+        elif end_index >= 0:
+            #Add the length of the secondary link to the previous street to increase distance accuracy
+            route_information[end_index][1] += length
+        else:
+            pending += length
+
+    #Classify every turn onto a new record at once.
+    turning = [r for r in record_runs if turn_from[r] is not None]
+    if turning != []:
+        if vectorized:
+            turns = classify_turns(direction_bearings[[turn_from[r] for r in turning]], entry_bearings[turning])
+        else:
+            turns = [classify_turn(direction_bearings[turn_from[r]], entry_bearings[r]) for r in turning]
+        turn_of = dict(zip(turning, turns))
+        for record, r in zip(route_information, record_runs):
+            record[3] = turn_of.get(r, "Unknown")
+    return route_information
+
+def stepwise_route_information(route, pathfinder):
+    '''
+    The step-by-step loop which generate_directions() used before describe_route(), kept to benchmark against.
+    Directions come from latitude/longitude ratios and turns from the direction names. (See Functionality.py)
+    '''
+    route_information = []
+    prev_end = None
+    i = 0
+    while i < len(route):
+        length = 0
+        street = pathfinder.simplify_streetname(route[i][2])
+        startlatlng = (route[i][0], route[i][1])
+        turn = "Unknown"
+        while i < len(route) and pathfinder.simplify_streetname(route[i][2]) == street:
+            length += route[i][3]
+            i += 1
+        endlatlng = (route[i-1][0], route[i-1][1])
+        if prev_end == None:
+            direction = pathfinder.determine_direction(startlatlng, endlatlng)
+        else:
+            direction = pathfinder.determine_direction(prev_end, endlatlng)
+            turn = pathfinder.deterimine_turn(route_information[len(route_information)-1][2], pathfinder.determine_direction(prev_end, startlatlng))
+        prev_end = endlatlng
+        end_index = len(route_information) - 1
+        if end_index > 0 and route_information[end_index][0] == street:
+            route_information[end_index][1] += length
+        elif not "_" in street:
+            route_information.append([street,length,direction,turn])
+        elif "_" in street:
+            route_information[end_index][1] += length
+    return route_information
+
+
+if __name__ == "__main__":
+    import Functionality as pathfinder
+
+    #Benchmark on a synthetic route which zig-zags through a grid of streets.
+    segments = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    route = []
+    latitude, longitude = 43.0, -79.0
+    for i in range(segments):
+        if (i // 5) % 2 == 0:
+            latitude += 0.001
+            street = "Street %d North" %(i // 10)
+        else:
+            longitude += 0.0014
+            street = "Avenue %d" %(i // 10)
+        route.append([latitude, longitude, street, 111.0])
+
+    def timed(function, repeats=5):
+        #Best of several runs, in milliseconds.
+        best = None
+        for repeat in range(repeats):
+            begin = time.perf_counter()
+            result = function()
+            elapsed = (time.perf_counter() - begin) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    old, stepwise = timed(lambda: stepwise_route_information(route, pathfinder))
+    plain, plain_ms = timed(lambda: describe_route(route, pathfinder.simplify_streetname, vectorized=False))
+    itinerary, directions_ms = timed(lambda: pathfinder.generate_directions("Start", "End", route))
+    print("%d segments --> %d streets    (%d itinerary lines)" %(segments, len(plain), len(itinerary)))
+    print("Old step-by-step loop:    %8.2f ms" %(stepwise))
+    print("Batch stage, plain Python: %7.2f ms" %(plain_ms))
+    if np is not None:
+        batch, batch_ms = timed(lambda: describe_route(route, pathfinder.simplify_streetname, vectorized=True))
+        print("Batch stage, NumPy:       %8.2f ms    (Same records as plain Python: %s)" %(batch_ms, batch == plain))
+    print("generate_directions():    %8.2f ms" %(directions_ms))
+    print("Same streets and lengths as the old loop: %s" %([record[:2] for record in old] == [record[:2] for record in plain]))
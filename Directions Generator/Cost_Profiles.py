@@ -0,0 +1,94 @@
+'''
+Program: Cost_Profiles.py
+Description: The cost profiles a route can be optimized for. Every edge of a Graph
+             stores one precomputed cost per profile, worked out once when the graph
+             is built, so a query only picks which column to search on and the same
+             cached graph serves every profile without being rebuilt.
+
+PROFILES:
+    "distance"       --> Length in metres. (The default, and what the directions always report)
+    "time"           --> Free-flow travel time in seconds, from the speed limit or the type of road.
+    "avoid_highways" --> Length in metres, with motorways and trunk roads made HIGHWAY_PENALTY times as costly.
+'''
+
+#Names of the profiles, in the order of the cost columns stored on each edge.
+PROFILES = ("distance", "time", "avoid_highways")
+DEFAULT_PROFILE = "distance"
+
+#Typical speeds in km/h for roads without a usable speed limit, by OSM highway type.
+DEFAULT_SPEEDS = {"motorway": 100, "motorway_link": 60, "trunk": 80, "trunk_link": 50,
+                  "primary": 60, "primary_link": 40, "secondary": 50, "secondary_link": 40,
+                  "tertiary": 50, "tertiary_link": 30, "unclassified": 40, "residential": 40,
+                  "living_street": 15, "service": 20}
+#Speed in km/h for roads of unknown type, including the links to the start and end addresses.
+FALLBACK_SPEED = 40
+
+#Highway types which the "avoid_highways" profile avoids, and how much more costly it makes them.
+HIGHWAYS = frozenset(("motorway", "motorway_link", "trunk", "trunk_link"))
+HIGHWAY_PENALTY = 5
+
+def column_of(profile):
+    '''
+    Returns the index of a profile's cost column.
+    Raises ValueError for unknown profiles.
+    '''
+    try:
+        return PROFILES.index(profile)
+    except ValueError:
+        raise ValueError("Unknown cost profile %r. Choose one of: %s" %(profile, ", ".join(PROFILES)))
+
+def first_value(value):
+    '''OSM tags are sometimes lists of values; use the first one.'''
+    if isinstance(value, (list, tuple)):
+        return value[0] if len(value) > 0 else None
+    return value
+
+def parse_maxspeed(maxspeed):
+    '''
+    Converts an OSM maxspeed tag such as "50", "30 mph" or ["50", "60"] to km/h.
+    Returns None for values which are not a number. (e.g. "signals", "none")
+    '''
+    maxspeed = first_value(maxspeed)
+    if maxspeed is None:
+        return None
+    parts = str(maxspeed).strip().lower().split()
+    try:
+        speed = float(parts[0])
+    except (ValueError, IndexError):
+        return None
+    if len(parts) > 1 and parts[1] == "mph":
+        speed *= 1.609344
+    return speed if speed > 0 else None
+
+def edge_costs(length, highway=None, maxspeed=None):
+    '''
+    Computes the cost of an edge under every profile.
+    ------------------------------------------------------------------------------
+    Input:
+        length --> Length of the edge in metres.
+        highway --> OSM highway type of the way, if known.
+        maxspeed --> OSM maxspeed tag of the way, if known.
+    ------------------------------------------------------------------------------
+    Output:
+        A tuple with one cost per profile, in the order of PROFILES.
+    '''
+    highway = first_value(highway)
+    speed = parse_maxspeed(maxspeed) or DEFAULT_SPEEDS.get(highway, FALLBACK_SPEED)
+    seconds = length / (speed / 3.6)
+    avoid = length * HIGHWAY_PENALTY if highway in HIGHWAYS else length
+    return (length, seconds, avoid)
+
+def weighted_column(profile):
+    '''
+    Returns the index of the cost column which weight updates of a profile change. (See Graph.apply_updates())
+    Raises ValueError for unknown profiles, and for "distance", whose cost is the length of the edge.
+    '''
+    column = column_of(profile)
+    if column == 0:
+        raise ValueError("The cost of the %r profile is the length of the street, which weight updates do not change." %(profile))
+    return column
+
+def with_cost(costs, profile, value):
+    '''Returns the costs of an edge with the cost under one profile replaced by value. (For traffic weight updates)'''
+    column = weighted_column(profile)
+    return costs[:column] + (value,) + costs[column + 1:]
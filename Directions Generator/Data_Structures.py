@@ -14,11 +14,25 @@ PLEASE NOTE: Nodes are analogous to vertices in my implementation.
 #Imports
 import geopy.distance as geopy
 import heapq
+import sys
+import hashlib
+from collections import OrderedDict
+import Cost_Profiles as profiles
+
+#Most shortest path trees kept per graph for reuse by Graph.cached_route()...
+TREE_CACHE_SIZE = 32
+#...and most megabytes they may hold together. Their memory is charged to the graph's region. (See Region_Cache.py)
+TREE_CACHE_MB = 16
+#Estimated bytes of each entry of a Shortest_Path_Tree, besides its containers. (See Shortest_Path_Tree.memory_size())
+#A float distance, a (node, street id, length) tuple in previous, and a (distance, id, node) tuple on the heap.
+TREE_DISTANCE_BYTES = 24
+TREE_PREVIOUS_BYTES = 64
+TREE_HEAP_BYTES = 88
 
 class Graph(object):
     '''My graph implementation'''
 
-    def __init__(self, start_street, start_node, end_street, end_node):
+    def __init__(self, start_street=None, start_node=None, end_street=None, end_node=None):
         ''' 
         Initialization for the graph.
         -----------------------------
@@ -27,12 +41,35 @@ class Graph(object):
             - start_node --> Node that representslocation of starting address.
             - end_street --> Name of ending street
             - end_node --> Node that represents location of ending address.
+
+        Note: The endpoints may be left out to build a regional graph which is
+              kept warm and routed on many times. See set_endpoints().
         '''
         self.node_list = {}                 #A dictionary of nodes. (Intersections)
         self.start_street = start_street    #Initialize start street.
         self.end_street = end_street        #Initialize end street.
         self.start_node = start_node        #Initialize start node.
         self.end_node = end_node            #Initialize end node.
+        #Table of every street name in the graph. Edges store street ids from this table.
+        self.names = Street_Names()
+        #Dictionary of lowercase street key --> set of (node id, street id) pairs leaving that node.
+        #Used to attach endpoints to the graph without rebuilding it.
+        self.street_index = {}
+        #Version of the graph, which is bumped every time its edges are updated.
+        #Anything cached from the graph should be keyed on it.
+        self.version = 0
+        #Dictionary of data derived from the graph (component labels, routing preprocessing, etc.)
+        #It is emptied whenever the graph is updated, so that it gets rebuilt.
+        self.derived = {}
+        #Counts of what was removed if the graph was pruned for its endpoints, otherwise None. (See Pruning.py)
+        self.pruning = None
+        #Dictionary of OSM way id --> set of (start id, end id) edges built from that way, so that
+        #a deleted way can be removed by its id alone. (See Graph_Updates.py)
+        self.ways = {}
+        #Dictionary of (start id, end id) --> list of (way ids, edge_length, street_id, costs), for edges which
+        #OSMNX merged out of several ways, in series or in parallel. Each entry is one of the parallel edges,
+        #so the edge can be worked out again from the others when one of its ways changes. (See record_sources())
+        self.sources = {}
 
     def add_node(self, osm_id, latitude, longitude):
         ''' 
@@ -53,25 +90,31 @@ class Graph(object):
         #This enables very fast look-up time for a node.
         self.node_list[osm_id] = node
 
-    def add_edge(self, start_id, end_id, way):
+    def add_edge(self, start_id, end_id, way, costs=None):
         '''
         Adds an edge between two nodes in the graph.
         --------------------------------------------
         Inputs
             - start_id --> The id of the starting node.
             - end_id   --> The id of the ending node.
-            - way --> A tuple of (edge_length, street_name)
+            - way --> A tuple of (edge_length, street_name), optionally followed by the
+                      way's OSM highway type and maxspeed tag.
+            - costs --> The edge's cost under each profile. Worked out from way if left out.
 
         Note: way is the OSM terminology for a street.
+              The street name is stored on the edge as its id in the graph's name table, and
+              the cost of the edge under every profile is computed once here. (See Cost_Profiles.py)
         '''
+        if costs is None:
+            costs = profiles.edge_costs(way[0], *way[2:4])
         #Index the node with id of start id.
         node = self.node_list[start_id]
         #Add an edge from the start node to the end node with the properties of way.
-        node.add_edge(self.node_list[end_id], way)
+        node.add_edge(self.node_list[end_id], (way[0], self.names.intern(way[1]), costs))
     
-    def add_critical_edge(self, start_id, way):
+    def add_critical_edge(self, start_id, street_id):
         '''
-        Takes a way with a street name that is the same as that of the start or end node.
+        Takes the id of a street name that is the same as that of the start or end node.
         In this case, there are two conditions:
         -------------------------------------------------------------
         Condition 1: Street name is same as start node's street name.
@@ -84,20 +127,357 @@ class Graph(object):
         #Index the node with id of start id.
         node = self.node_list[start_id]
     
+        #Names are compared by the integer key of their lowercase form.
+        street_key = self.names.lower_ids[street_id]
+
         #Cond1: Street name is same as start node's street name:
-        if (way[1].lower() == self.start_street.lower()):
+        if (street_key == self.names.lower_key(self.start_street)):
             #Calc distance in meters between them.
             distance = longlat_to_metres(node, self.start_node)
             #Then add an edge from start node to node with start_id.
-            self.start_node.add_edge(self.node_list[start_id], (distance, way[1]))
+            self.start_node.add_edge(self.node_list[start_id], (distance, street_id, profiles.edge_costs(distance)))
     
         #Cond2: Street name is same as end node's street name.
-        if (way[1].lower() == self.end_street.lower()):
+        if (street_key == self.names.lower_key(self.end_street)):
             #Calc longitude latitude distance between them.
             distance = longlat_to_metres(node, self.end_node)
             #Then add an edge from node with start_id to end node.
-            self.node_list[start_id].add_edge(self.end_node, (distance, way[1]))
+            self.node_list[start_id].add_edge(self.end_node, (distance, street_id, profiles.edge_costs(distance)))
     
+    def record_way(self, way_id, start_id, end_id):
+        '''
+        Records that the edge from start_id to end_id was built from an OSM way.
+        way_id may be a list, for edges OSMNX simplified out of several ways.
+        '''
+        for osm_id in (way_id if isinstance(way_id, list) else [way_id]):
+            self.ways.setdefault(osm_id, set()).add((start_id, end_id))
+
+    def record_sources(self, start_id, end_id, sources):
+        '''
+        Records the parallel edges which the edge from start_id to end_id was chosen from, as a list of
+        (way ids, way) where way is as given to add_edge(). Only edges merged out of more than one way
+        are recorded; an edge built from a single way is worked out again from that way alone.
+        '''
+        if len(sources) > 1 or any(len(way_ids) > 1 for way_ids, way in sources):
+            self.sources[(start_id, end_id)] = [(tuple(way_ids), way[0], self.names.intern(way[1]), profiles.edge_costs(way[0], *way[2:4]))
+                                                for way_ids, way in sources]
+
+    def merged_in_series(self, way_id):
+        '''Returns whether any edge built from an OSM way was also built from other ways joined to it end to end.'''
+        return any(way_id in source[0] and len(source[0]) > 1
+                   for edge in self.ways.get(way_id, ()) for source in self.sources.get(edge, ()))
+
+    def way_lengths(self, way_id):
+        '''Returns a dictionary of (start id, end id) --> length of the edges built from an OSM way, as that way alone gave them.'''
+        lengths = {}
+        for start_id, end_id in self.ways.get(way_id, ()):
+            for source in self.sources.get((start_id, end_id), ()):
+                if way_id in source[0]:
+                    lengths[(start_id, end_id)] = source[1]
+            edge = self.node_list[start_id].get_edgelist().get(end_id) if self.node_exists(start_id) else None
+            if edge is not None and (start_id, end_id) not in lengths:
+                lengths[(start_id, end_id)] = edge[1]
+        return lengths
+
+    def add_way_edge(self, start_id, end_id, way, way_id):
+        '''
+        Adds the edge which an OSM way gives between two nodes. If the nodes are already joined by an edge
+        from other ways, the way becomes one of its parallel edges and the shortest of them is kept.
+        '''
+        existing = self.node_list[start_id].get_edgelist().get(end_id)
+        sources = self.sources.get((start_id, end_id))
+        if existing is not None and sources is None:
+            #A way added next to a plain edge: find the way that edge came from. (Rare, so a scan is fine)
+            owners = tuple(other for other, edges in self.ways.items() if other != way_id and (start_id, end_id) in edges)
+            sources = [(owners, existing[1], existing[2], existing[3])] if owners != () else None
+        costs = profiles.edge_costs(way[0], *way[2:4])
+        self.add_edge(start_id, end_id, way, costs)
+        self.record_way(way_id, start_id, end_id)
+        if sources is not None:
+            sources = sources + [((way_id,), way[0], self.names.intern(way[1]), costs)]
+            self.sources[(start_id, end_id)] = sources
+            self.keep_shortest(start_id, end_id)
+
+    def keep_shortest(self, start_id, end_id):
+        '''Sets the edge from start_id to end_id to the shortest of its recorded parallel edges, the same one build_graph() picks.'''
+        length, street_id, costs = min(self.sources[(start_id, end_id)], key=lambda source: source[1])[1:]
+        self.node_list[start_id].add_edge(self.node_list[end_id], (length, street_id, costs))
+
+    def remove_way(self, way_id):
+        '''
+        Removes what an OSM way added to the graph. Edges it was the only way of are removed, and edges
+        merged from it and other ways are worked out again from the parallel edges it was not part of.
+        (A series of ways is broken by the loss of any of them)
+        Returns the set of ids of the nodes whose edges changed.
+        '''
+        changed = set()
+        for start_id, end_id in self.ways.pop(way_id, ()):
+            if not self.node_exists(start_id) or not self.node_exists(end_id):
+                continue
+            sources = self.sources.get((start_id, end_id))
+            if sources is None:
+                if self.remove_edge(start_id, end_id):
+                    changed.add(start_id)
+                continue
+            kept = [source for source in sources if way_id not in source[0]]
+            for source in sources:
+                if way_id in source[0]:
+                    #The other ways of a lost series no longer make up this edge.
+                    for other in source[0]:
+                        edges = self.ways.get(other)
+                        if other != way_id and edges is not None and not any(other in entry[0] for entry in kept):
+                            edges.discard((start_id, end_id))
+                            if not edges:
+                                del self.ways[other]
+            if kept != []:
+                self.sources[(start_id, end_id)] = kept
+                self.keep_shortest(start_id, end_id)
+            else:
+                del self.sources[(start_id, end_id)]
+                self.remove_edge(start_id, end_id)
+            changed.add(start_id)
+        return changed
+
+    def remove_edge(self, start_id, end_id):
+        '''
+        Removes the edge between two nodes in the graph, if there is one.
+        Returns True if an edge was removed.
+        '''
+        return self.node_list[start_id].get_edgelist().pop(end_id, None) is not None
+
+    def apply_updates(self, updates):
+        '''
+        Applies a batch of edge updates to the graph in place, instead of rebuilding it.
+        ------------------------------------------------------------------------------
+        Input:
+            updates --> A list of tuples, each of which is one of:
+                ("node", osm_id, latitude, longitude)  --> Adds a node if it does not exist.
+                ("add", start_id, end_id, way)         --> Adds or replaces an edge.
+                ("add", start_id, end_id, way, way_id) --> The same, recording the OSM way it was built from.
+                                                        Alongside an edge from other ways, the shortest is kept.
+                                                        (See add_way_edge())
+                ("weight", start_id, end_id, profile, value) --> Changes the cost of an existing edge under one profile,
+                                                        such as the seconds it takes under "time". Its length and
+                                                        distance are left alone. (See Cost_Profiles.with_cost())
+                ("remove", start_id, end_id)           --> Removes an edge. (For example, a closure)
+                ("remove_way", way_id)                 --> Removes what an OSM way added. (See remove_way())
+                ("refetch", way_id)                    --> The way changed in a way which cannot be worked out from the
+                                                        graph alone, so the graph must be pulled and built again. It is
+                                                        left alone here. (See Route_Service.update_regions())
+        ------------------------------------------------------------------------------
+        Output:
+            The set of ids of the nodes whose edges changed.
+            If anything changed, the version is bumped and derived data is dropped.
+            Raises ValueError, before changing anything, if a weight update names a profile it cannot change.
+        '''
+        for update in updates:
+            if update[0] == "weight":
+                profiles.weighted_column(update[3])
+        changed = set()
+        for update in updates:
+            kind = update[0]
+            if kind == "node":
+                if not self.node_exists(update[1]):
+                    self.add_node(update[1], update[2], update[3])
+                continue
+            if kind == "remove_way":
+                changed.update(self.remove_way(update[1]))
+                continue
+            if kind == "refetch":
+                continue
+            start_id, end_id = update[1], update[2]
+            if not self.node_exists(start_id) or not self.node_exists(end_id):
+                #The update lies outside of this graph.
+                continue
+            if kind == "add":
+                if len(update) > 4:
+                    self.add_way_edge(start_id, end_id, update[3], update[4])
+                else:
+                    self.add_edge(start_id, end_id, update[3])
+                #add_edge() has already interned the street name, so it can be indexed.
+                self.index_street(start_id, update[3])
+                changed.add(start_id)
+            elif kind == "weight":
+                edge = self.node_list[start_id].get_edgelist().get(end_id)
+                if edge is not None:
+                    self.node_list[start_id].add_edge(edge[0], (edge[1], edge[2], profiles.with_cost(edge[3], update[3], update[4])))
+                    changed.add(start_id)
+            elif kind == "remove":
+                if self.remove_edge(start_id, end_id):
+                    changed.add(start_id)
+
+        if changed:
+            self.version += 1
+            self.derived = {}
+            if self.start_node is not None:
+                #Reattach the endpoints, in case they connect to a changed street.
+                self.set_endpoints(self.start_street, self.start_node, self.end_street, self.end_node)
+        return changed
+
+    def index_street(self, start_id, way):
+        '''
+        Records that a way with the street name way[1] leaves the node with start_id.
+        Endpoints attached later with set_endpoints() connect to these nodes.
+        '''
+        street_id = self.names.intern(way[1])
+        self.street_index.setdefault(self.names.lower_ids[street_id], set()).add((start_id, street_id))
+
+    def set_endpoints(self, start_street, start_node, end_street, end_node):
+        '''
+        Attaches new start and end nodes to the graph, replacing any previous ones.
+        This allows a regional graph to be reused for many routes without being rebuilt.
+        -----------------------------
+        Inputs:
+            - start_street --> Name of starting street.
+            - start_node --> Node that represents location of starting address.
+            - end_street --> Name of ending street
+            - end_node --> Node that represents location of ending address.
+        '''
+        #Detach the previous end node from the nodes that lead into it.
+        if self.end_street is not None:
+            for node_id, street_id in self.street_index.get(self.names.lower_key(self.end_street), ()):
+                self.node_list[node_id].get_edgelist().pop(self.end_node.get_id(), None)
+
+        self.start_street = start_street
+        self.start_node = start_node
+        self.end_street = end_street
+        self.end_node = end_node
+
+        #Connect the endpoints to every node on their streets.
+        for street_key in set((self.names.lower_key(start_street), self.names.lower_key(end_street))):
+            for node_id, street_id in self.street_index.get(street_key, ()):
+                self.add_critical_edge(node_id, street_id)
+
+    def attach_stop(self, stop_node, street):
+        '''
+        Adds a custom node for a stop on a multi-stop route, connected in both directions
+        to every node on its street. Stops should use ids below -2. (-3, -4, ...)
+        -----------------------------
+        Inputs:
+            - stop_node --> Node that represents the location of the stop.
+            - street --> Name of the street the stop is on.
+        '''
+        self.node_list[stop_node.get_id()] = stop_node
+        for node_id, street_id in self.street_index.get(self.names.lower_key(street), ()):
+            node = self.node_list[node_id]
+            distance = longlat_to_metres(node, stop_node)
+            costs = profiles.edge_costs(distance)
+            stop_node.add_edge(node, (distance, street_id, costs))
+            node.add_edge(stop_node, (distance, street_id, costs))
+
+    def detach_stop(self, stop_id):
+        '''Removes a stop added by attach_stop(), along with every edge to and from it.'''
+        stop_node = self.node_list.pop(stop_id)
+        for node_id in stop_node.get_edgelist():
+            self.node_list[node_id].get_edgelist().pop(stop_id, None)
+
+    def get_node(self, node_id):
+        '''Returns the node with the given id, including the start (-1) and end (-2) nodes.'''
+        if node_id in self.node_list:
+            return self.node_list[node_id]
+        if self.start_node is not None and node_id == self.start_node.get_id():
+            return self.start_node
+        if self.end_node is not None and node_id == self.end_node.get_id():
+            return self.end_node
+        raise KeyError(node_id)
+
+    def edge_count(self):
+        '''Returns the number of directed edges between the intersections of the graph.'''
+        return sum(len(node.get_edgelist()) for node in self.node_list.values())
+
+    def fingerprint(self):
+        '''
+        Returns a digest of the intersections and streets of the graph: every edge between intersections
+        with its length, street name and costs. Unlike the version, it is the same for a graph rebuilt from
+        the same streets, and different after any change. It is kept in self.derived until the graph changes.
+        '''
+        digest = self.derived.get("fingerprint")
+        if digest is None:
+            content = hashlib.blake2b(digest_size=16)
+            for node_id in sorted(node_id for node_id in self.node_list if node_id >= 0):
+                edges = self.node_list[node_id].get_edgelist()
+                for end_id in sorted(end_id for end_id in edges if end_id >= 0):
+                    edge = edges[end_id]
+                    content.update(repr((node_id, end_id, edge[1], self.names.get_name(edge[2]), edge[3])).encode("utf-8"))
+            digest = self.derived["fingerprint"] = content.hexdigest()
+        return digest
+
+    def reverse_edgelists(self):
+        '''
+        Builds the edge lists of the graph with every edge reversed, for searching backwards from a node.
+        Returns a dictionary of node id --> list of (source_node, edge_length, street_id, costs)
+        '''
+        reverse = {}
+        nodes = list(self.node_list.values())
+        if self.start_node is not None:
+            nodes.append(self.start_node)
+        for u in nodes:
+            for key, edge in u.get_edgelist().items():
+                reverse.setdefault(key, []).append((u, edge[1], edge[2], edge[3]))
+        return reverse
+
+    def alternatives(self, k=3, max_settled=None, max_stretch=0.25, max_overlap=0.8, profile=profiles.DEFAULT_PROFILE):
+        '''
+        Finds up to k different routes between the start and end nodes, shortest first.
+        ------------------------------------------------------------------------------
+        Uses the via-node method: one search grows a shortest path tree forwards from the start
+        node, and one grows a tree backwards from the end node. Every node settled by both searches
+        gives a route (start --> via node --> end) read straight out of the two trees, so no
+        further searches are needed no matter how many alternatives are wanted.
+        ------------------------------------------------------------------------------
+        Input:
+            k --> The maximum number of routes to return.
+            max_settled --> Maximum nodes settled over both searches, to keep the time bounded.
+            max_stretch --> An alternative may be at most this much longer than the shortest route. (0.25 = 25%)
+            max_overlap --> An alternative may share at most this fraction of the shortest route's
+                            length with each route already chosen.
+            profile --> The cost profile routes are compared on. (See Cost_Profiles.py)
+        ------------------------------------------------------------------------------
+        Output:
+            A list of routes, each the same list of [latitude, longitude, street_name, distance]
+            as djikstra(). The list is empty if the end node could not be reached.
+        '''
+        cap = None if max_settled is None else max_settled // 2
+        forward = Shortest_Path_Tree(self, self.start_node, profile=profile)
+        backward = Shortest_Path_Tree(self, self.end_node, reverse=True, profile=profile)
+        forward.grow(max_settled=cap)
+        backward.grow(max_settled=cap)
+
+        end_id = self.end_node.get_id()
+        if end_id not in forward.settled:
+            return []
+        shortest = forward.distance[end_id]
+        #Overlap is measured in metres, whatever the profile.
+        shortest_length = sum(distance for node, street, distance in forward.path(end_id))
+
+        #Via nodes which give a route that is not too much longer than the shortest one.
+        candidates = []
+        for node_id in forward.settled & backward.settled:
+            length = forward.distance[node_id] + backward.distance[node_id]
+            if length <= shortest * (1 + max_stretch):
+                candidates.append((length, node_id))
+        candidates.sort()
+
+        routes = []
+        chosen = [] #Edge sets of the chosen routes, for measuring overlap.
+        for length, node_id in candidates:
+            steps = forward.path(node_id) + backward.path(node_id)
+            visited = [self.start_node.get_id()] + [node.get_id() for node, street, distance in steps]
+            if len(set(visited)) != len(visited):
+                #Route visits a node twice, which is never a sensible alternative.
+                continue
+            edges = {}
+            for i, (node, street, distance) in enumerate(steps):
+                edges[(visited[i], visited[i+1])] = distance
+            overlap = max([sum(distance for edge, distance in edges.items() if edge in other) for other in chosen] + [0])
+            if chosen != [] and overlap > shortest_length * max_overlap:
+                continue
+            chosen.append(edges)
+            routes.append([[node.latitude, node.longitude, street, distance] for node, street, distance in steps])
+            if len(routes) == k:
+                break
+        return routes
+
     def node_exists(self, node_id):
         '''Determine if a node with given ID already exists in the graph.'''
         if node_id in self.node_list:
@@ -165,18 +545,22 @@ class Graph(object):
         return False
 
 
-    def djikstra(self):
+    def djikstra(self, profile=profiles.DEFAULT_PROFILE):
         '''
         Performs a variant of Djikstra's algorithm to find the shortest path between nodes.
+        The path is the cheapest under the given cost profile (see Cost_Profiles.py), and node
+        distances hold that cost. The segments returned always give distances in metres.
         --------------------------------------------------------------------------------------------------
         Note:  Uses Python's implementation of heap queue to get a time complexity of O(|E|+|V|*|logV|).
         '''
+        #Index of the profile's cost on each edge.
+        column = profiles.column_of(profile)
         #List for heapqueue.
         heapqueue = []
         
         '''
         #---Start Node---# 
-        Note: Previous node and street will always be null / "" respectively.
+        Note: Previous node and street will always be null.
         '''
         self.start_node.set_distance(0)            #Initialize distance to source node as 0.
         heapq.heappush(heapqueue, self.start_node) #Push it to the heapqueue.
@@ -185,13 +569,13 @@ class Graph(object):
         for key, node in self.node_list.items():
             node.set_distance(40075000)         #Set distance to diameter of earth in meters. (max distance)
             node.set_previous(None)             #Set previous to None. (null)
-            node.set_prev_street("")            #Previous street --> non-existant.
+            node.set_prev_street(None)          #Previous street --> non-existant.
             heapq.heappush(heapqueue, node)     #Push the node to the heapqueue.
         
         #--End Node--#
         self.end_node.set_distance(40075000)     #Diameter of earth in meters (max distance)
         self.end_node.set_previous(None)         #Previous node to None. (null)
-        self.end_node.set_prev_street("")        #Previous street --> non-existant.
+        self.end_node.set_prev_street(None)      #Previous street --> non-existant.
         heapq.heappush(heapqueue, self.end_node) #Push the node to the heapqueue.
         
         #While heapqueue is not empty...
@@ -206,8 +590,8 @@ class Graph(object):
             #For each edge in the edge list..
             for key, edge in edge_list.items():
                 v = edge[0]         #v --> Node (i.e. intersection) that the edge (i.e. street) leads to.
-                weight = edge[1]    #weight --> Distance in metres from u (node popped) to v.
-                street = edge[2]    #street --> Name of street.
+                weight = edge[3][column]    #weight --> Cost of driving from u (node popped) to v. (Metres, by default)
+                street = edge[2]    #street --> Id of the street's name.
                 #Temp = the distance to v from node u.
                 temp = u.get_distance() + weight    
                 if temp < v.get_distance():
@@ -224,29 +608,339 @@ class Graph(object):
             #Heapify the heapqueue after dealing with each node.
             heapq.heapify(heapqueue)
 
+        #Return the list of edges in shortest path.
+        return list(self.route_segments())
+
+    def route_segments(self):
         '''
-        After Djikstra's has completed...
-        Reverse-build the shortest path from end node to start node.
+        Generates the segments of the shortest path found by the last call to djikstra(), from start to end.
+        Each segment is a list of [latitude, longitude, street_name, distance] for the node reached.
+        --------------------------------------------------------------------------------------------------
+        Note: The path is walked backwards once from the end node and then reversed, which is linear in its
+              length. Segments are only built as they are asked for, so a long route can be streamed to a
+              map or file without building an intermediate list. (See Route_Geometry.py)
         '''
-        #Start at last node.
+        #Start at last node, and collect every node on the path back to the start node.
         node = self.end_node
-        #List to build shortest path.
-        shortest_path = []
+        nodes = []
         #While the previous node is not equal to none.. (i.e. not equal to the very start node)
-        while(node != None):
-            latitude, longitude = node.get_latlong()
-            #Ignore start node because we are only interested in previous edges. (Start node previous = null)
-            if(node.get_previous() != None):
-                #Calculate distance from previous node to current node. (current_dist - prev_dist)
-                distance = node.get_distance() - node.get_previous().get_distance()
-                #Insert to front of list a list that includes [lat, long, prev_street, and distance]
-                shortest_path.insert(0, [latitude, longitude, node.get_prev_street(), distance])
-
+        while(node.get_previous() != None):
+            nodes.append(node)
             #Move to previous node of current node.
             node = node.get_previous()
-    
-        #Return the list of edges in shortest path.
-        return shortest_path
+        nodes.reverse()
+
+        for node in nodes:
+            latitude, longitude = node.get_latlong()
+            #Distance from previous node to current node, read from the edge between them.
+            #(Node distances hold the cost of the profile searched on, which may not be metres)
+            distance = node.get_previous().get_edgelist()[node.get_id()][1]
+            yield [latitude, longitude, self.names.get_name(node.get_prev_street()), distance]
+
+    def cached_route(self, profile=profiles.DEFAULT_PROFILE):
+        '''
+        Finds the same shortest path as djikstra(), but reuses the search from earlier routes
+        which began at the same start address.
+        --------------------------------------------------------------------------------------------------
+        The shortest path tree grown from the start node is kept in a Tree_Cache, keyed by the start
+        address, the graph's version and the profile. The tree only covers the intersections, so it stays
+        valid as end nodes come and go. A new destination whose street the tree has already settled is
+        answered by reading the path out of the tree; otherwise the search resumes from where it stopped.
+        --------------------------------------------------------------------------------------------------
+        Output:
+            The list of [latitude, longitude, street_name, distance] from djikstra(),
+            or None if the end node cannot be reached.
+        '''
+        trees = self.derived.get("trees")
+        if trees is None:
+            trees = self.derived["trees"] = Tree_Cache()
+        key = (self.start_street.lower(), self.start_node.get_latlong(), self.version, profile)
+        tree = trees.get(key)
+        if tree is None:
+            tree = trees.add(key, Shortest_Path_Tree(self, self.start_node, profile=profile, intersections_only=True))
+
+        #The edges leading into the end node, from every node on its street.
+        end_id = self.end_node.get_id()
+        entries = []
+        for node_id, street_id in self.street_index.get(self.names.lower_key(self.end_street), ()):
+            edge = self.node_list[node_id].get_edgelist().get(end_id)
+            if edge is not None:
+                entries.append((self.node_list[node_id], edge[1], edge[2], edge[3]))
+
+        entry = tree.reach(entries)
+        #The tree may have grown, so the cache is trimmed back to its budget.
+        trees.trim()
+        if entry is None:
+            return None
+        u, length, street_id, costs = entry
+        steps = tree.path(u.get_id()) + [(self.end_node, self.names.get_name(street_id), length)]
+        return [[node.latitude, node.longitude, street, distance] for node, street, distance in steps]
+
+class Shortest_Path_Tree(object):
+    '''
+    A shortest path tree grown outwards from a single node with Djikstra's algorithm.
+    Unlike Graph.djikstra(), the search state is kept in the tree rather than on the nodes,
+    and the search can be stopped and resumed, so one tree can answer many questions.
+    '''
+
+    def __init__(self, graph, source, reverse=False, terminals=(), profile=profiles.DEFAULT_PROFILE, intersections_only=False):
+        '''
+        Initialization for the tree.
+        -----------------------------
+        Inputs:
+            - graph --> The Graph to search.
+            - source --> The node the tree grows from.
+            - reverse --> If True, edges are followed backwards, so distances are to the source
+                          instead of from it.
+            - terminals --> Ids of nodes which may be reached but never driven through,
+                            such as the stops of a multi-stop route.
+            - profile --> The cost profile the tree is grown on. (See Cost_Profiles.py)
+                          Distances in the tree are costs under this profile.
+            - intersections_only --> If True, custom nodes (ids below 0, such as the end node) are never
+                                     added to the tree, so it can be kept while they change. (See reach())
+        '''
+        self.graph = graph
+        self.source = source
+        self.reverse = reverse
+        self.terminals = terminals
+        self.intersections_only = intersections_only
+        self.profile = profile
+        self.column = profiles.column_of(profile)   #Index of the profile's cost on each edge.
+        self.reverse_edges = graph.reverse_edgelists() if reverse else None
+        self.distance = {source.get_id(): 0}    #Lowest known cost of each node.
+        self.previous = {}                      #Node id --> (previous node, street id, edge length) in the tree.
+        self.settled = set()                    #Ids of nodes whose distance is final.
+        #Entries of (distance, node id, node). The id breaks ties so nodes are never compared.
+        self.heapqueue = [(0, source.get_id(), source)]
+
+    def memory_size(self):
+        '''
+        Estimates the bytes of the tree's search state, from the number of entries rather than by walking them.
+        The graph it grows on is not counted.
+        '''
+        containers = sum(sys.getsizeof(container) for container in (self.distance, self.previous, self.settled, self.heapqueue))
+        return (containers + len(self.distance) * TREE_DISTANCE_BYTES + len(self.previous) * TREE_PREVIOUS_BYTES
+                + len(self.heapqueue) * TREE_HEAP_BYTES)
+
+    def get_edges(self, node):
+        '''Returns the edges followed out of a node, as tuples of (node, edge_length, street_id, costs)'''
+        if self.reverse:
+            return self.reverse_edges.get(node.get_id(), ())
+        return node.get_edgelist().values()
+
+    def grow(self, target_id=None, budget=None, max_settled=None):
+        '''
+        Settles nodes until one of the stopping conditions is met.
+        --------------------------------------------------------------------------------------------------
+        Inputs:
+            - target_id --> Stop once the node with this id is settled.
+            - budget --> Stop before settling any node further away than this.
+            - max_settled --> Stop once this many nodes are settled in total.
+        --------------------------------------------------------------------------------------------------
+        Returns:
+        True  --> if the target was settled. (Or the whole tree was grown, when there is no target)
+        False --> if the search stopped first.
+        '''
+        if target_id is not None and target_id in self.settled:
+            return True
+        while self.heapqueue != []:
+            dist, key, u = self.heapqueue[0]
+            if budget is not None and dist > budget:
+                return False
+            if max_settled is not None and len(self.settled) >= max_settled:
+                return False
+            heapq.heappop(self.heapqueue)
+            if key in self.settled:
+                #Stale entry; u was already settled with a smaller distance.
+                continue
+            self.settled.add(key)
+            if key in self.terminals and u is not self.source:
+                #Terminals are only ever the end of a path.
+                edges = ()
+            else:
+                edges = self.get_edges(u)
+            column = self.column
+            for v, length, street, costs in edges:
+                if self.intersections_only and v.get_id() < 0:
+                    continue
+                temp = dist + costs[column]
+                if temp < self.distance.get(v.get_id(), 40075000):
+                    self.distance[v.get_id()] = temp
+                    self.previous[v.get_id()] = (u, street, length)
+                    heapq.heappush(self.heapqueue, (temp, v.get_id(), v))
+            if key == target_id:
+                return True
+        return target_id is None
+
+    def reach(self, entries):
+        '''
+        Finds the cheapest way into a node which is not part of the tree, such as the end node
+        of a route, growing the tree only as far as it needs to.
+        --------------------------------------------------------------------------------------------------
+        Inputs:
+            - entries --> The edges leading into the node, as tuples of (node, edge_length, street_id, costs)
+        --------------------------------------------------------------------------------------------------
+        Returns:
+        The cheapest entry, once its cost is final. (Every node left unsettled is further away)
+        None --> if none of the entries can be reached.
+        '''
+        column = self.column
+        while True:
+            best = None
+            pending = None
+            for entry in entries:
+                node_id = entry[0].get_id()
+                if node_id in self.settled:
+                    cost = self.distance[node_id] + entry[3][column]
+                    if best is None or cost < best[0]:
+                        best = (cost, entry)
+                elif pending is None:
+                    pending = node_id
+            if pending is None or self.heapqueue == []:
+                break
+            if best is not None and self.heapqueue[0][0] >= best[0]:
+                #Nothing left unsettled can beat the best entry.
+                break
+            if best is not None:
+                #Settle everything no further away than the best entry, which may find a better one.
+                self.grow(budget=best[0])
+            else:
+                self.grow(target_id=pending)
+        return None if best is None else best[1]
+
+    def path(self, node_id):
+        '''
+        Returns the path between the source and a settled node, in the order it is driven.
+        Each step is a tuple of (node arrived at, street_name, distance in metres).
+        For a reverse tree the path runs from the node to the source, otherwise from the source to the node.
+        '''
+        steps = []
+        while node_id in self.previous:
+            u, street_id, length = self.previous[node_id]
+            street = self.graph.names.get_name(street_id)
+            if self.reverse:
+                steps.append((u, street, length))
+            else:
+                steps.append((self.graph.get_node(node_id), street, length))
+            node_id = u.get_id()
+        if not self.reverse:
+            steps.reverse()
+        return steps
+
+class Tree_Cache(object):
+    '''
+    Least recently used cache of Shortest_Path_Trees, kept in Graph.derived["trees"].
+    Being derived data, it is dropped whenever the graph is updated. (See Graph.cached_route())
+    '''
+
+    def __init__(self, size=TREE_CACHE_SIZE, budget_mb=TREE_CACHE_MB):
+        '''
+        Initialization for the cache.
+        -----------------------------
+        Inputs:
+            - size --> Most trees kept at once.
+            - budget_mb --> Most megabytes the trees may hold together. The most recently used tree is
+                            always kept, even if it is larger on its own.
+        '''
+        self.size = size
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.trees = OrderedDict()  #Key --> Shortest_Path_Tree, least recently used first.
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''Returns the tree stored under key, or None. Counts as a hit or a miss.'''
+        tree = self.trees.get(key)
+        if tree is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.trees.move_to_end(key)
+        return tree
+
+    def add(self, key, tree):
+        '''Stores a tree under key, dropping the least recently used trees beyond the size. Returns the tree.'''
+        self.trees[key] = tree
+        self.trim()
+        return tree
+
+    def trim(self):
+        '''Drops the least recently used trees until the cache is within its size and budget.'''
+        while len(self.trees) > self.size:
+            self.trees.popitem(last=False)
+        sizes = [tree.memory_size() for tree in self.trees.values()]
+        total = sum(sizes)
+        for size in sizes[:-1]:
+            if total <= self.budget:
+                break
+            self.trees.popitem(last=False)
+            total -= size
+
+    def memory_size(self):
+        '''Estimates the bytes held by the cached trees. (See Shortest_Path_Tree.memory_size())'''
+        return sum(tree.memory_size() for tree in self.trees.values())
+
+
+class Street_Names(object):
+    '''
+    Table of the street names used by a graph.
+    Each OSM name is normalized and stored only once, and edges refer to it by an integer id,
+    so names are not duplicated per edge and comparing names is comparing integers.
+    '''
+
+    def __init__(self):
+        '''Initialization for the table.'''
+        self.ids = {}               #Dictionary of name --> id.
+        self.names = []             #Name of each id.
+        self.lowered = []           #Lowercase form of each name.
+        self.simplified = []        #Simplified form of each name. (See simplify_streetname())
+        self.unnamed = []           #True if the way has no name. (Stored as its highway type + "_")
+        self.lower_keys = {}        #Dictionary of lowercase form --> integer key.
+        self.lower_ids = []         #Key of the lowercase form of each name.
+        self.simplified_keys = {}   #Dictionary of simplified form --> integer key.
+        self.simplified_ids = []    #Key of the simplified form of each name.
+
+    def intern(self, name):
+        '''Returns the id of a street name, adding it to the table if it is new.'''
+        street_id = self.ids.get(name)
+        if street_id is None:
+            key = name
+            #Catch anomalies (some OSM names are not strings)
+            name = sys.intern(name if isinstance(name, str) else str(name))
+            street_id = len(self.names)
+            self.ids[key] = street_id
+            self.names.append(name)
+            lowered = name.lower()
+            simplified = simplify_streetname(name) if name.strip() else name
+            self.lowered.append(lowered)
+            self.simplified.append(simplified)
+            self.unnamed.append(name.endswith("_"))
+            self.lower_ids.append(self.lower_keys.setdefault(lowered, len(self.lower_keys)))
+            self.simplified_ids.append(self.simplified_keys.setdefault(simplified, len(self.simplified_keys)))
+        return street_id
+
+    def get_name(self, street_id):
+        '''Returns the street name with the given id.'''
+        return self.names[street_id]
+
+    def lower_key(self, name):
+        '''
+        Returns the key shared by every name which is the same as name ignoring case,
+        or None if there is no such name in the table.
+        '''
+        return self.lower_keys.get(name.lower())
+
+    def same_street(self, street_id1, street_id2):
+        '''Determine if two names are the same street, ignoring case.'''
+        return self.lower_ids[street_id1] == self.lower_ids[street_id2]
+
+    def same_simplified(self, street_id1, street_id2):
+        '''Determine if two names are the same street once simplified. (e.g. "King Street West" and "King Street")'''
+        return self.simplified_ids[street_id1] == self.simplified_ids[street_id2]
+
+    def __len__(self):
+        '''Returns the number of names in the table.'''
+        return len(self.names)
 
         
 class Node(object):
@@ -269,7 +963,7 @@ class Node(object):
         '''Variables for Djikstra's implementation'''
         self.distance = 40075000   #Diameter of earth in meters (max distance)
         self.previous = None       #Previous node = none. (null)
-        self.prev_street = ""      #Previous street --> Non existant.
+        self.prev_street = None    #Previous street --> Non existant.
 
     def __lt__(self, other):
         '''
@@ -290,9 +984,11 @@ class Node(object):
         ------------------------------------------
         Output:
         Adds an entry to edgelist with the key of the destination node's id.
-            - This entry is a tuple of (destination_node, edge_length, street_name)
+            - This entry is a tuple of (destination_node, edge_length, street_id, costs)
+              where street_id is the street's id in the graph's name table, and costs
+              is the edge's cost under each profile. (See Cost_Profiles.py)
         '''
-        self.edge_list[destination_node.get_id()] = (destination_node, way[0], way[1])
+        self.edge_list[destination_node.get_id()] = (destination_node, way[0], way[1], way[2])
     
     def set_distance(self, weight):
         '''
@@ -311,7 +1007,7 @@ class Node(object):
     def set_prev_street(self, street_name):
         '''
         Sets the prev_street attribute of the node.
-        prev_street is the previous street name which the current node was traversed from in shortest path.
+        prev_street is the id of the previous street which the current node was traversed from in shortest path.
         '''
         self.prev_street = street_name
 
@@ -331,8 +1027,8 @@ class Node(object):
     
     def get_prev_street(self):
         '''
-        Sets the prev_street attribute of the node.
-        prev_street is the previous street name which the current node was traversed from in shortest path.
+        Gets the prev_street attribute of the node.
+        prev_street is the id of the previous street which the current node was traversed from in shortest path.
         '''
         return self.prev_street
 
@@ -370,4 +1066,32 @@ def longlat_to_metres(node1, node2):
     #Use a geopy function to calculate the distance between the two nodes, and then manually convert to metres.
     distance = (geopy.vincenty((lat1, long1), (lat2, long2)).km * 1000)
     #Return the distance.
-    return distance
\ No newline at end of file
+    return distance
+
+def simplify_streetname(street):
+    '''
+    Simplifies the name of a street to account for experienced inconsistency
+    in the OSM database. This is done by removing "north", "south", "east", or
+    "west" from the end of a street name.
+    ---------------------------------------------------------------------------------
+    Reasoning for this:
+        I experienced that the OSM street name results have a habit of changing from, 
+        for example, "King Street West", to "King Street", back to "King Street West"
+        depending on the section of the street. To avoid confusion, it is easier to 
+        just simplify the street names.
+    '''
+    #Split the street by whitespace.
+    street_split = street.split()
+    #List of directions to look for in the street name.
+    direction_list = ["north","south","east","west"]
+
+    #If the street name ends with one of the directions,
+    #Rebuild the street name and exclude the direction at the end.
+    if street_split[len(street_split)-1].lower() in direction_list:
+        street = ""
+        for i, word in enumerate(street_split):
+            if word.lower() not in direction_list:
+                street += word + " "
+    
+    #Return street, split of whitespace.
+    return street.strip()
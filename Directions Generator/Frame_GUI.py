@@ -9,11 +9,33 @@ Description: Builds all the interfaces for the Directions generator application.
 '''
 
 #Imports
+import os
+import queue
 import threading
 import tkinter as tk
 from tkinter.font import Font
 import Image_Processing as Image
 import Functionality as pathfinder
+import Route_Service as service
+import Prefetch as prefetch
+import Geocoder as geocoding
+import Profiling as profiling
+
+#Error messages shown to the user.
+UNRESOLVED_BOTH = "Start address and destination address could not be resolved! Ensure spelling is correct, or be more descriptive."
+UNRESOLVED_START = "Start address could not be resolved! Ensure spelling is correct, or be more descriptive."
+UNRESOLVED_DEST = "Destination address could not be resolved! Ensure spelling is correct, or be more descriptive."
+GEOCODER_UNAVAILABLE = "The address lookup service could not be reached! Check your internet connection, then try again in a moment."
+SAME_ADDRESS = "Start address and destination address are the same!"
+DISCONNECTED = ("Unfortunately, according to my algorithms, there is no path that can be driven between your starting point and destination point!"
+                "Please note that my application does not account for inconsistencies in the OSM database and this could be thre reason for an apparent"
+                "disconnection. If you are sure that these two addresses are connected, clarifying the address may help.")
+#Milliseconds between checks of the event queue, and the number of route steps rendered per check.
+POLL_MS = 50
+STEPS_PER_TICK = 25
+
+PLEASE_WAIT = '''Please wait..\nFetching information from database and then calculating shortest path and directions.
+                                \nPlease note that the OSM (Open Street Map) database is open source and thus can be quite slow.'''
 
 class Interface_Frame(tk.Frame):
 
@@ -26,6 +48,24 @@ class Interface_Frame(tk.Frame):
         #Last searchest to prevent user from searching same thing repetitively.
         self.last_start = ""
         self.last_dest = ""
+        #If a routing service is running, act as a thin client of it instead of routing locally.
+        #Set the DIRECTIONS_SERVICE_URL environment variable to use one. (See Route_Service.py)
+        service_url = os.environ.get("DIRECTIONS_SERVICE_URL")
+        self.client = service.Route_Client(service_url) if service_url else None
+        #Otherwise, routes are computed by an in-process Route_Service, which keeps geocoding results and
+        #regions warm between searches and is warmed in the background while the user types. (See Prefetch.py)
+        #Its route results are saved to the file in DIRECTIONS_ROUTE_CACHE, if it is set. (See Route_Cache.py)
+        self.local = None
+        self.prefetcher = None
+        if self.client is None and self.frame_type != "Help":
+            self.local = service.Route_Service(workers=1, queue_size=1, route_cache_path=os.environ.get("DIRECTIONS_ROUTE_CACHE"))
+            self.prefetcher = prefetch.Prefetcher(self.local)
+        #Tk widgets may only be touched by the main loop, so worker threads post events to this queue instead.
+        #Each event is a tuple of (kind, arguments...), see drain_events().
+        self.events = queue.Queue()
+        #Steps of a route still waiting to be rendered, and the scheduled rendering job.
+        self.pending_steps = []
+        self.render_job = None
         #Fonts to be used for the Frame's widgets.
         self.main_bold_font = Font(family="Helvetica",size=25,weight="bold")
         self.alt_bold_font = Font(family="Helvetica",size=15,weight="bold")
@@ -46,6 +86,8 @@ class Interface_Frame(tk.Frame):
             #Help frame does not have a left frame.
             self.build_left(left_side) #Build left frame.
         self.build_right(right_side)   #Build right frame.
+        #Start draining the event queue on the main loop.
+        self.after(POLL_MS, self.drain_events)
 
     def build_left(self, left_side):
         '''Build left side of frames'''
@@ -73,6 +115,9 @@ class Interface_Frame(tk.Frame):
         dest_address_frame.grid_rowconfigure(0, weight=1)
         self.dest_address_field = tk.Entry(dest_address_frame, font=self.alt_norm_font, relief="ridge")
         self.dest_address_field.grid(row=0, column=0, rowspan=1, columnspan=2, sticky="nwse")
+        #Look addresses up in the background once the user stops typing them.
+        self.start_address_field.bind("<KeyRelease>", lambda event: self.address_edited("start", self.start_address_field))
+        self.dest_address_field.bind("<KeyRelease>", lambda event: self.address_edited("dest", self.dest_address_field))
         #search_button.
         self.search_button = tk.Button(left_side, text="Get Directions", font=self.alt_bold_font, command=self.search_pressed)
         self.search_button.grid(row=5, column=0, rowspan=1, columnspan=2, sticky="nwse", pady=(5,0))
@@ -234,23 +279,81 @@ class Interface_Frame(tk.Frame):
                          " every time, so they do not feel artificial or repetitive in nature!")
         self.btm_description_field.insert("end", functionality)
 
+    def address_edited(self, field, entry):
+        '''Passes an edited address on to the prefetcher, if addresses are routed locally.'''
+        if self.prefetcher is not None:
+            self.prefetcher.address_changed(field, entry.get())
+
+    def post(self, kind, *args):
+        '''
+        Posts an event for the main loop to handle. Safe to call from any thread.
+        Kinds of event:
+            ("status", string)                               --> Progress message.
+            ("error", err_string)                            --> Error message.
+            ("route", start_address, dest_address, itinerary) --> Finished route.
+            ("done",)                                        --> Search has finished.
+        '''
+        self.events.put((kind,) + args)
+
+    def drain_events(self):
+        '''
+        Handles every event posted since the last check, then checks again after POLL_MS.
+        Runs on the Tk main loop.
+        '''
+        handlers = {"status": self.display_string,
+                    "error": self.display_err,
+                    "route": self.display_route,
+                    "done": self.search_finished}
+        try:
+            while True:
+                event = self.events.get_nowait()
+                handlers[event[0]](*event[1:])
+        except queue.Empty:
+            pass
+        self.after(POLL_MS, self.drain_events)
+
+    def search_finished(self):
+        '''When a search has completed its operation, enable the search button once again.'''
+        self.search_button.config(state="normal")
+
     def display_route(self, start_address, dest_address, itinerary):
         '''
         Displays the route instructions on the GUI textfield.
+        The steps are rendered a few at a time, so the window stays responsive for long routes.
         '''
+        self.cancel_rendering()
         self.top_description_field.config(state="normal")
         self.top_description_field.delete(1.0, "end")
         self.top_description_field.insert("end",  start_address, "subtitle")
         self.top_description_field.insert("end", "\nto\n")
         self.top_description_field.insert("end",  dest_address, "subtitle")
-        for step in itinerary:
-            self.top_description_field.insert("end", "\n\n"+step)
         self.top_description_field.config(state="disabled")
+        self.pending_steps = list(itinerary)
+        self.pending_steps.reverse() #Reversed, so steps can be popped off of the end in order.
+        self.render_steps()
+
+    def render_steps(self):
+        '''Renders the next STEPS_PER_TICK steps of the route, and schedules the rest.'''
+        self.render_job = None
+        self.top_description_field.config(state="normal")
+        for i in range(min(STEPS_PER_TICK, len(self.pending_steps))):
+            self.top_description_field.insert("end", "\n\n"+self.pending_steps.pop())
+        self.top_description_field.config(state="disabled")
+        if self.pending_steps != []:
+            self.render_job = self.after(1, self.render_steps)
+
+    def cancel_rendering(self):
+        '''Stops rendering a previous route, so that it does not mix with new output.'''
+        if self.render_job is not None:
+            self.after_cancel(self.render_job)
+            self.render_job = None
+        self.pending_steps = []
 
     def display_string(self, string):
         '''
         Displays a string on the GUI textfield.
         '''
+        self.cancel_rendering()
         self.top_description_field.config(state="normal")
         self.top_description_field.delete(1.0, "end")
         self.top_description_field.insert("end", string)
@@ -260,6 +363,7 @@ class Interface_Frame(tk.Frame):
         '''
         Displays an error string on the GUI textfield.
         '''
+        self.cancel_rendering()
         self.top_description_field.config(state="normal")
         self.top_description_field.delete(1.0, "end")
         self.top_description_field.insert("end", "Error:\n", "subtitle")
@@ -273,47 +377,85 @@ class Interface_Frame(tk.Frame):
         ----------------------------------------------------------------------------------------------------------
         If the calculation is unsuccessful for some reason, an error will be printed to the GUI explaining why.
         If the calculation is successful, a dynamic array of directions will be printed to the GUI.
+        All output is posted as events, since this does not run on the Tk main loop.
         '''
-        err1 = False    #True if start address fails to be resolved.
-        err2 = False    #True if destination address fails to be resolved.
-        full_start_address = start_address
-        full_dest_address = dest_address
         try:
-            full_start_address = pathfinder.resolve_address(start_address)  #Attempt to resolve start address.
-        except AttributeError:
-            err1 = True
+            if self.client is not None:
+                #Let the routing service do the work.
+                self.client_process(start_address, dest_address)
+            else:
+                #Profiled if profiling is switched on. (See Profiling.py)
+                with profiling.default_profiler.profile(start_address=start_address, end_address=dest_address):
+                    self.local_process(start_address, dest_address)
+        except Exception as err:
+            self.post("error", "Something went wrong while calculating the route: %s" %(err))
+        #When thread is completed its operation, enable the search button once again.
+        self.post("done")
+
+    def local_process(self, start_address, dest_address):
+        '''
+        Calculates the route in this process, posting the result the same way as client_process().
+        Geocoding results and regions warmed by the prefetcher are reused.
+        '''
         try:
-            full_dest_address = pathfinder.resolve_address(dest_address)    #Attempt to resolve destination address.
-        except AttributeError:
-            err2 = True
+            location1 = self.local.geocode(start_address)   #Attempt to resolve start address.
+            location2 = self.local.geocode(dest_address)    #Attempt to resolve destination address.
+        except geocoding.Geocoding_Error:
+            #The addresses may well be fine; the lookup itself failed.
+            self.post("error", GEOCODER_UNAVAILABLE)
+            return
 
         #Error messages based on whether addresses could be resolved or not.
-        if err1 == True and err2 == True:
-            self.display_err("Start address and destination address could not be resolved! Ensure spelling is correct, or be more descriptive.")
-        elif err1 == True:
-            self.display_err("Start address could not be resolved! Ensure spelling is correct, or be more descriptive.")
-        elif err2 == True:
-            self.display_err("Destination address could not be resolved! Ensure spelling is correct, or be more descriptive.")
+        if location1 is None and location2 is None:
+            self.post("error", UNRESOLVED_BOTH)
+        elif location1 is None:
+            self.post("error", UNRESOLVED_START)
+        elif location2 is None:
+            self.post("error", UNRESOLVED_DEST)
         #See if the addresses are the same.
-        elif full_start_address == full_dest_address:
-            self.display_err("Start address and destination address are the same!")
+        elif pathfinder.format_address(location1) == pathfinder.format_address(location2):
+            self.post("error", SAME_ADDRESS)
 
         #If no error, attempt to generate directions.
         else:
-            self.display_string('''Please wait..\nFetching information from database and then calculating shortest path and directions.
-                                \nPlease note that the OSM (Open Street Map) database is open source and thus can be quite slow.''')
-            itinerary = pathfinder.generate_route(start_address, dest_address)
-            if itinerary != "Disconnected":
+            self.post("status", PLEASE_WAIT)
+            progress = lambda message: self.post("status", PLEASE_WAIT + "\n\n" + message)
+            route = self.local.route_locations(location1, location2, progress)
+            if route != "Disconnected":
                 #If successful, display the route. (The start and end addresses are connected by a path)
-                self.display_route(full_start_address, full_dest_address, itinerary)
+                progress("Generating directions..")
+                itinerary = pathfinder.generate_directions(start_address, dest_address, route)
+                self.post("route", pathfinder.format_address(location1), pathfinder.format_address(location2), itinerary)
             else:
                 #If unsuccessful, display error. (The start and end addresses are not connected by a path)
-                self.display_err("Unfortunately, according to my algorithms, there is no path that can be driven between your starting point and destination point!"
-                                 "Please note that my application does not account for inconsistencies in the OSM database and this could be thre reason for an apparent"
-                                 "disconnection. If you are sure that these two addresses are connected, clarifying the address may help.")
-    
-        #When thread is completed its operation, enable the search button once again.
-        self.search_button.config(state="normal")
+                self.post("error", DISCONNECTED)
+
+    def client_process(self, start_address, dest_address):
+        '''
+        Requests the route from a running routing service, and displays the result the same way main_process() would.
+        '''
+        self.post("status", PLEASE_WAIT)
+        try:
+            result = self.client.route(start_address, dest_address)
+        except OSError:
+            self.post("error", "The routing service could not be reached! Make sure that it is running.")
+            return
+
+        if result["status"] == "ok":
+            self.post("route", result["start_address"], result["end_address"], result["itinerary"])
+        elif result["status"] == "unresolved":
+            if len(result["unresolved"]) == 2:
+                self.post("error", UNRESOLVED_BOTH)
+            elif "start" in result["unresolved"]:
+                self.post("error", UNRESOLVED_START)
+            else:
+                self.post("error", UNRESOLVED_DEST)
+        elif result["status"] == "same":
+            self.post("error", SAME_ADDRESS)
+        elif result["status"] == "disconnected":
+            self.post("error", DISCONNECTED)
+        else:
+            self.post("error", result.get("error", "The routing service could not compute the route."))
 
     def search_pressed(self):
         #Disable the search button.
@@ -322,6 +464,7 @@ class Interface_Frame(tk.Frame):
         start_address = self.start_address_field.get()
         dest_address = self.dest_address_field.get()
         #If search is not equal to the user's prior search..
+        #(Differently worded searches for the same places are answered by the route cache. See Route_Cache.py)
         if self.last_start != start_address or self.last_dest != dest_address:
             #Run main process in a thread, passing start and destination parameters
             #Main process:
@@ -13,23 +13,46 @@ Description: Includes the main functions that provide functionality to the
 
 #Imports
 import math
-import geopy
-import random
 import osmnx as ox
+import Geocoder as geocoding
+import Region_Pack as packs
+import Pruning as pruning
+import Profiling as profiling
+import Bearings as bearings
+import Cost_Profiles as profiles
+import Search_Backends as backends
 import Data_Structures as ds
+import Sentence_Templates as templates
+
+def geocode(address):
+    '''
+    Converts an address to a geopy location using the shared geocoding client. (See Geocoder.py)
+    Returns None if the address cannot be found, and raises Geocoder.Geocoding_Error if the
+    geocoding service cannot be reached.
+    Addresses in an installed region pack are found without the network. (See Region_Pack.py)
+    '''
+    location = packs.geocode(address)
+    if location is not None or packs.offline():
+        return location
+    return geocoding.default_geocoder.geocode(address)
+
+def format_address(location):
+    '''
+    Obtain the full address of a location found by the geolocator.
+    The replacement is just to remove the comma after street number for more standard appearance.
+    '''
+    return location.address.replace(",","",1)
 
 def resolve_address(address):
     '''
     Attempt to resolve a given address.
     This is done by determining if it can be found by geolocator.
     If the address cannot be resolved then an AttributeError exception will be thrown.
+    If the geocoding service cannot be reached then a Geocoder.Geocoding_Error exception will be thrown.
     '''
-    #Geolocator object
-    geolocator = geopy.Nominatim()
     #Throws error if address not resolved:
     #Obtain full addresses from geolocator. 
-    #The replacement is just to remove the comma after street number for more standard appearance.
-    full_address = geolocator.geocode(address).address.replace(",","",1)
+    full_address = format_address(geocode(address))
 
     return full_address
     
@@ -45,22 +68,34 @@ def generate_bounding_box(address1, address2):
         - It is determined by 4 latitude longitude coordinates; one for each side of the box.
     '''
     #Geolocator to convert address to longitude / latitude locations.
-    geolocator = geopy.Nominatim()
-    location1 = geolocator.geocode(address1)
-    location2 = geolocator.geocode(address2)
+    return bounding_box_of(geocode(address1), geocode(address2))
 
+def bounding_box_of(location1, location2):
+    '''
+    Generate the bounding box of two locations that have already been geocoded.
+    See generate_bounding_box() for how the box is determined.
+    '''
+    return bounding_box_of_all([location1, location2])
+
+def bounding_box_of_all(locations, buffer_km=1):
+    '''
+    Generate the bounding box of any number of geocoded locations, such as the stops of a multi-stop route.
+    See generate_bounding_box() for how the box is determined. buffer_km widens the buffer area.
+    '''
     #North, south, east, west bounds for the bounding box.
-    north = max(location1.latitude, location2.latitude)     #Northern-most point.
-    south = min(location1.latitude, location2.latitude)     #Southern-most point.
-    east = max(location1.longitude, location2.longitude)    #East-most point.
-    west = min(location1.longitude, location2.longitude)    #West-most point.
+    north = max(location.latitude for location in locations)     #Northern-most point.
+    south = min(location.latitude for location in locations)     #Southern-most point.
+    east = max(location.longitude for location in locations)     #East-most point.
+    west = min(location.longitude for location in locations)     #West-most point.
 
     #Add approximately 1 km of distance to each parameter of the bounding box.
     #(1 kilometer is converted to longitude/latitude degrees)
-    north = north + (1 / 111.321543)
-    south = south - (1 / 111.321543)
-    east = east + abs((1 / (math.cos(east) * 111.321543)))
-    west = west - abs((1 / (math.cos(east) * 111.321543)))
+    north = north + (buffer_km / 111.321543)
+    south = south - (buffer_km / 111.321543)
+    #A degree of longitude shrinks with the cosine of the latitude; the side nearest a pole is used, so the buffer is never short.
+    scale = math.cos(math.radians(min(89.0, max(abs(north), abs(south)))))
+    east = east + (buffer_km / (scale * 111.321543))
+    west = west - (buffer_km / (scale * 111.321543))
 
     #Return the bounding box coordinates.
     return north, south, east, west
@@ -71,10 +106,13 @@ def generate_endpoint_nodes(address1, address2):
     Also, parse the data from geolocator to return the endpoint street names.
     '''
     #Geolocator to convert address to latitude/longitude locations.
-    geolocator = geopy.Nominatim()
-    location1 = geolocator.geocode(address1)
-    location2 = geolocator.geocode(address2)
+    return endpoint_nodes_of(geocode(address1), geocode(address2))
 
+def endpoint_nodes_of(location1, location2):
+    '''
+    Generate start and destination nodes from two locations that have already been geocoded.
+    See generate_endpoint_nodes().
+    '''
     #Address returned by geolocator is of format: 00, street, city, ... etc
     #So by splitting by ', ' and indexing point 1, obtain the street of each endpoint.
     start_street = location1.address.split(", ")[1]
@@ -224,21 +262,8 @@ def simplify_streetname(street):
         depending on the section of the street. To avoid confusion, it is easier to 
         just simplify the street names.
     '''
-    #Split the street by whitespace.
-    street_split = street.split()
-    #List of directions to look for in the street name.
-    direction_list = ["north","south","east","west"]
-
-    #If the street name ends with one of the directions,
-    #Rebuild the street name and exclude the direction at the end.
-    if street_split[len(street_split)-1].lower() in direction_list:
-        street = ""
-        for i, word in enumerate(street_split):
-            if word.lower() not in direction_list:
-                street += word + " "
-    
-    #Return street, split of whitespace.
-    return street.strip()
+    #The same simplification is used by the street name table of each Graph.
+    return ds.simplify_streetname(street)
 
 def build_sentence(i, steps, point_a, point_b):
     '''
@@ -254,88 +279,18 @@ def build_sentence(i, steps, point_a, point_b):
     Output:
         A string instruction of how to get from point_a to point_b. 
     '''
-    #Sentence pieces that can be used to dynamically and randomly generate a sentence template:
-
-    #Beginning strings mainly relevant for the very beginning instruction.
-    beginnings = ("Drive |nsew|", "Head |nsew|", "Travel |nsew|", "Go |nsew|")
+    #The templates are compiled once, when the Sentence_Templates module is loaded.
+    return templates.default_engine.build_sentence(i, steps, point_a, point_b)
 
-    #Beginning strings relevant for all instuctions after the very beginning.
-    sentence_starts = ("Follow |cs|", "Travel along |cs|", "Travel on |cs|", "Drive along |cs|", 
-                       "Drive on |cs|", "Drive |nsew|", "Continue |nsew|", "Head |nsew|", "Go |nsew|")
-    
-    #Strings used to build the middle of the sentence.
-    sentence_middle = {}
-    sentence_middle['nsew'] = (", heading |nsew| for |dist|", ", and head |nsew| for |dist|",
-                               " and go |nsew| for |dist|")
-    sentence_middle['cs'] = (" along |cs| for |dist|", " on |cs| for |dist|")
-
-    #Strings used to build the end of the sentence.
-    sentence_ends = {}
-    sentence_ends['lr known'] = (". Then turn |lr| onto |ns|.", " before turning |lr| onto |ns|.", " and turn |lr| onto |ns|.",
-                                 " and then turn |lr| onto |ns|.")
-    sentence_ends['lr unknown'] = (". Then head |nnsew| on |ns|.", " before heading |nnsew| on |ns|.", ". Then turn onto |ns|.",
-                                   " and head |nnsew| on |ns|.", " and turn onto |ns|.")
-
-    '''
-    SENTENCE TEMPLATE PLACEHOLDERS:
-        |cs| = current street.
-        |ns| = next street.
-        |lr| = left or right.
-        |dist| = distance.
-        |nsew| = direction. (north/south/east/west or combination)
-        |nnsew| = nsew of next street.
-    '''
-
-    #Generate sentence template depending on multiple conditions:
-    if i == 0:
-        #For very beginning steps.
-        sentence = random.choice(beginnings).lower()
-        sentence += random.choice(sentence_middle['cs'])
-    elif i < steps:
-        #For all other steps.
-        sentence = random.choice(sentence_starts)
-        if "|cs|" in sentence:
-            sentence += random.choice(sentence_middle['nsew'])
-        else:
-            sentence += random.choice(sentence_middle['cs'])
-    if i < steps-1:
-        #If not the final step.. attempt to include instruction for turning.
-        if point_b[3] != "Unknown":
-            #If turn is known, include instruction on how to turn.
-            sentence += random.choice(sentence_ends['lr known'])
-        else:
-            #If turn is not known, include generic instruction to indicate a street change.
-            sentence += random.choice(sentence_ends['lr unknown'])
-    
-    #Lambda function to add the word "bound" in order to make instructions sound more appealing.
-    #For example, instead of "drive North", say "drive North-bound"
-    add_bound = lambda s: s+"-bound" if not '-' in s else s 
-
-    distance = point_a[1]
-    #If distance is greater than 1000 Metres, convert it to Kilometres
-    if distance  >= 1000:
-        distance = distance / 1000
-        distance = ("%.1f Kilometres" %(distance)).replace(".0","")
-    else:
-        #If distance is less than 1000 Metres, round to nearest whole Metre.
-        distance = str(int(distance))+" Metres"
 
-    #Replace the placeholders with their respective vairables.
-    sentence = sentence.replace("|cs|", point_a[0]).replace("|dist|", distance).replace("|nsew|", add_bound(point_a[2]))
-    if point_b != None:
-        sentence = sentence.replace("|ns|", point_b[0]).replace("|nnsew|", add_bound(point_b[2])).replace("|lr|", point_b[3].lower())
-
-    #Return the instruction.
-    return sentence
-
-
-def generate_directions(start_address, end_address, route):
+def generate_directions(start_address, end_address, route, seed=None):
     '''
     Generates an array of instructional sentences for the route given.
     ------------------------------------------------------------------------------
     Input:
         start_address --> The address of which the route is to begin from.
         end_address --> The address of which the route is to end at.
+        seed --> Optional seed, so that the same route always gets the same sentences.
     ------------------------------------------------------------------------------
     Output:
         An array of sentences.
@@ -343,110 +298,74 @@ def generate_directions(start_address, end_address, route):
             for traversing from start_address to end_address.
     '''
 
-    #Initialization
-    route_information = [] #Basic information on the route.
-    prev_end = None        #The end coordinates of the previous street.
-    i = 0                  #Increment variable.
-
-    #While loop that runs until the route has been fully described.
-    while i < len(route):
-        '''
-        This while loop constructs simple paths from a series of latitude/longitude coordinates
-        along with the street names that correspond to those coordinates.
-        '''
-        #Initial variables for current street.
-        length = 0                                  #Length of street.
-        street = simplify_streetname(route[i][2])   #Street name.
-        startlatlng = (route[i][0], route[i][1])    #Start coordinates.
-        turn = "Unknown"                            #Turn to get onto this street.
-
-        while i < len(route) and simplify_streetname(route[i][2]) == street:
-            #While path is not ended, and still on this street...
-            #Continuously add to length and increment the incrementor.
-            length += route[i][3] 
-            i += 1
-
-        endlatlng = (route[i-1][0], route[i-1][1])  #Make note of end latlng of previous street.
-
-        if prev_end == None:
-            #If it is the very first street.
-            #Determine direction facing based on start of current street and current street end.
-            direction = determine_direction(startlatlng, endlatlng)
-            
-        else:
-            #If it is not the very first street.
-            #Determine direction facing based on end of previous street and current street end.
-            direction = determine_direction(prev_end, endlatlng)
-            turn = deterimine_turn(route_information[len(route_information)-1][2], determine_direction(prev_end, startlatlng))
-        
-        #Define previous end at the end latitude longitude of the previous street.
-        prev_end = endlatlng
-
-        end_index = len(route_information) - 1
-
-        if end_index > 0 and route_information[end_index][0] == street:
-            #Helps deal with streets that are connected by round-abouts, etc.
-            route_information[end_index][1] += length
-        elif not "_" in street:
-            #Ignore "secondary_links" and other links that connect two streets.
-            route_information.append([street,length,direction,turn])
-        elif "_" in street:
-            #Add the length of the secondary link to the previous street to increase distance accuracy
-            route_information[end_index][1] += length
-            
-    #A list of directions. (An itinerary)
-    itinerary = []
-
-    #Number of steps needed to address the route completely.
-    steps = len(route_information) #Had to be recalculated (incase route_information had another index appended to it)
-
-    #Loop through route_information, generating a dynamic instructional sentence for each step.
-    for i, street in enumerate(route_information):
-        if i < steps-1:
-           instruction = build_sentence(i, steps, street, route_information[i+1])
-           if i == 0:
-               #If the very beginning step.
-               instruction = "Starting at your location %s, %s" %(start_address, instruction)
-        else:
-            #If the very end step.
-            instruction = build_sentence(i, steps, street, None)
-            instruction = "%s and you will have arrived at your destination at %s." %(instruction, end_address)
-        
-        #Append each instruction to the itinerary.
-        itinerary.append(instruction)
+    #Basic information on the route; a list of [street, length, direction, turn] for each street.
+    #Directions and turns for the whole route are worked out in one batch. (See Bearings.py)
+    route_information = bearings.describe_route(route, simplify_streetname)
+
+    #Generate a dynamic instructional sentence for each step. (An itinerary)
+    engine = templates.default_engine if seed is None else templates.Template_Engine(seed)
+    itinerary = engine.render_itinerary(start_address, end_address, route_information)
     
     #Return the list of instructional sentences.
     return itinerary
 
-
-def generate_route(start_address, end_address):
+def generate_leg_directions(addresses, legs, seed=None):
     '''
-    The main function of this module which uses most other functions inside of it.
-    Attempts to determine a route from start_address to end_address. Based on the
-    route, specific directions will be generated.
+    Generates an array of instructional sentences for a trip with many stops, such as one from Multi_Stop.py.
+    Each leg is described on its own, ending with the arrival at its stop.
     ------------------------------------------------------------------------------
     Input:
-        start_address --> The address of which the route is to begin from.
-        end_address --> The address of which the route is to end at.
+        addresses --> The stops, in the order they are visited.
+        legs --> The route of each leg, in the format of find_route(). (legs[i] goes from addresses[i] to addresses[i+1])
+        seed --> Optional seed, so that the same trip always gets the same sentences.
     ------------------------------------------------------------------------------
     Output:
         An array of sentences.
-            Each sentence is a step in the instructions of the route 
-            for traversing from start_address to end_address.
     '''
+    engine = templates.default_engine if seed is None else templates.Template_Engine(seed)
+    return engine.render_legs(addresses, [bearings.describe_route(leg, simplify_streetname) for leg in legs])
 
-    #Generate the bounding box of which to pull coordinates from.
-    north, south, east, west = generate_bounding_box(start_address, end_address)
-
-    #Pull a custom graph data structure using the OSMNX api. 
-    #This is relaible and preferable as it considers many variables such as 1 way streets, etc.
-    G = ox.graph_from_bbox(north=north, south=south, east=east, west=west, network_type='drive', simplify=True, truncate_by_edge=True, timeout=30)
 
-    #Generate start street name, end street name, and their respective nodes.
-    start_street, start_node, end_street, end_node = generate_endpoint_nodes(start_address, end_address)
+#Errors OSMNX raises for an area with no streets in it. (They were renamed and moved between versions of OSMNX)
+EMPTY_REGION_ERRORS = tuple(error for module in (getattr(ox, "_errors", None), getattr(ox, "errors", None), getattr(ox, "core", None))
+                            for error in (getattr(module, name, None) for name in ("EmptyOverpassResponse", "InsufficientResponseError"))
+                            if isinstance(error, type) and issubclass(error, Exception))
 
+def fetch_region(north, south, east, west):
+    '''
+    Pull the streets inside of a bounding box from the OSM database using the OSMNX api.
+    This is relaible and preferable as it considers many variables such as 1 way streets, etc.
+    If an installed region pack covers the bounding box, the streets are cut out of it instead,
+    with no network I/O. (See Region_Pack.py)
+    Raises one of EMPTY_REGION_ERRORS if there are no streets inside of the bounding box.
+    '''
+    pack = packs.find_pack(north, south, east, west)
+    if pack is not None:
+        return pack.region(north, south, east, west)
+    if packs.offline():
+        raise packs.Pack_Error("No installed region pack covers this area, and the network may not be used. (DIRECTIONS_OFFLINE)")
+    return ox.graph_from_bbox(north=north, south=south, east=east, west=west, network_type='drive', simplify=True, truncate_by_edge=True, timeout=30)
+
+def build_graph(G, start_street=None, start_node=None, end_street=None, end_node=None, prune=pruning.PRUNE, exclude=()):
+    '''
+    Parse a graph pulled by fetch_region() into my own Graph implementation.
+    ------------------------------------------------------------------------------
+    Input:
+        G --> The OSMNX graph.
+        The endpoints are optional. Leave them out to build a regional graph, and
+        attach them afterwards with Graph.set_endpoints().
+        prune --> Whether to remove what can never be on the route between the endpoints,
+                  when they are given. (See Pruning.py)
+        exclude --> Highway classes to leave out, unless an endpoint is on them.
+                    (Such as Pruning.LOW_VALUE_HIGHWAYS)
+    ------------------------------------------------------------------------------
+    Output:
+        A Graph where intersections are nodes and streets are edges.
+    '''
     #Create my own graph, initializing with start and end nodes.
     intersections = ds.Graph(start_street, start_node, end_street, end_node)
+    endpoint_streets = set(street.lower() for street in (start_street, end_street) if street is not None)
+    excluded = 0
 
     #u --> Start vertex
     #v --> End vertex
@@ -463,15 +382,26 @@ def generate_route(start_address, end_address):
         #way_list --> List of minimum paths.
             #Way is analogous to street. (It is OSM terminology; thought it would be more consistent)
         way_list = []
+        #sources --> The OSM ways and first entry of each parallel path, so the edge can be worked out again. (See Graph.record_sources())
+        sources = []
 
         #Loop through street adjacency lists to find paths between intersection u and intersection v.
         for key, way in G.adj[u][v].items():
+            if exclude and pruning.is_excluded(way, exclude, endpoint_streets):
+                excluded += 1
+                continue
+            if 'osmid' in way:
+                #Remember which OSM ways the edge comes from, so it can be removed when they are deleted.
+                intersections.record_way(way['osmid'], u, v)
+            first = len(way_list)
 
             '''
-            Note for future implementation:
-                #way['maxspeed'] gets speed of way. Can use this for fastest path implementation
-                Such as: time = way['maxspeed]/way['length']
+            Note: way['highway'] and way['maxspeed'] are kept with each way, so that its cost under
+                  every profile (such as free-flow travel time) is computed once when the edge is added.
+                  (See Cost_Profiles.py)
             '''
+            highway = way.get('highway')
+            maxspeed = way.get('maxspeed')
 
             if 'name' in way:
                 #If way has a name (some do not have 'name' attributes)
@@ -479,31 +409,27 @@ def generate_route(start_address, end_address):
                     #If it is a list of names (Some have multiple names)
                     for name in way['name']:
                         #Append them all because one street may be equivalent to that start/end address.
-                        way_list.append((way['length'], name))
+                        way_list.append((way['length'], name, highway, maxspeed))
                 else:
-                    way_list.append((way['length'], way['name']))
+                    way_list.append((way['length'], way['name'], highway, maxspeed))
             elif 'highway' in way:
                 if type(way['highway']) is list:
                     #If it qualifies of different types of ways.
-                    way_list.append((way['length'], way['highway'][0]+"_")) #_ Helps conclude that path has no name.
+                    way_list.append((way['length'], way['highway'][0]+"_", highway, maxspeed)) #_ Helps conclude that path has no name.
                 else:
                     #Append highway type instead.
-                    way_list.append((way['length'], way['highway']+"_")) #_ Helps conclude that path has no name.
+                    way_list.append((way['length'], way['highway']+"_", highway, maxspeed)) #_ Helps conclude that path has no name.
 
-            #A list of critical ways. (Ways that connect to start point / end point)
-            critical_list = []
+            if len(way_list) > first:
+                osmid = way.get('osmid', [])
+                sources.append((osmid if isinstance(osmid, list) else [osmid], way_list[first]))
 
             for way in way_list:
-                #For each way in way list, append it to critical list if it matches start or end street names.
+                #Index each way by street name, so that endpoints on that street can be connected to node u.
                 try:
-                    if way[1].lower() == start_street.lower() or way[1].lower() == end_street.lower():
-                        critical_list.append(way)
+                    intersections.index_street(u, way)
                 except:
                     continue #Catch anomalies
-            
-            for way in critical_list:
-                #For each way in the critical list (if there are any), add the critical edge to node u's edgelist.
-                intersections.add_critical_edge(u,way)
 
             #Sort the way list and then take the smallest index. (The smallest value... time complexity nlogn)
             way_list.sort(key=lambda t: t[0])
@@ -511,35 +437,135 @@ def generate_route(start_address, end_address):
             
             #Add the minimum weight edge between intersections u and v to my graph implementation.
             intersections.add_edge(u,v,way)
+            intersections.record_sources(u, v, sources)
 
-    '''
-    Use the intersections Graph's function djikstra() to determine if the graph's start node
-    and the graph's end node are connected.
-        - intersections.dfs() = True if connected.
-        -                     = False if not connected.
+    if start_node is not None:
+        #Add the critical edges. (Ways that connect to start point / end point)
+        intersections.set_endpoints(start_street, start_node, end_street, end_node)
+        if prune:
+            #Remove what can never be on the route, now that the endpoints are known.
+            pruning.prune(intersections)
+            intersections.pruning["excluded_ways"] = excluded
 
-    Proof of concept / a test case for disconnected graphs can be found in the datastructures.py module
-    under the BFS function.
-    '''
-    if intersections.dfs() == False:
-        return "Disconnected"
-    
+    return intersections
+
+def find_route(intersections, profile=profiles.DEFAULT_PROFILE, reuse=False, backend=None):
     '''
-    Use the intersections Graph's function djikstra() to obtain the shortest route path between
-    the Graph's predefined start and end nodes. (Nodes are analogous to vertices)
+    Determine the shortest route between the start and end nodes of a Graph.
+    profile chooses what "shortest" means, such as "time" for the fastest route. (See Cost_Profiles.py)
+    With reuse, the search from the start address is kept for later routes on the same graph.
+    (For warm graphs which are routed on many times, see Graph.cached_route())
+    backend names the search engine which is used, such as "csgraph". (See Search_Backends.py)
+    ------------------------------------------------------------------------------
+    Output:
+        "Disconnected" if there is no path between the start and end nodes.
+        Otherwise, the list of [latitude, longitude, street_name, distance] from djikstra().
 
-    The shortest path route will be a list of lists in format:
-        [latitude, longitude, street_name, distance]
-    
     Notes:
         - latitude/longitude = the coordinates of the node / intersection referred to.
         - Street_name  = Street that is being traversed to reach that intersection.
         - distance = distance in meters.
     '''
-    route = intersections.djikstra()
+    route = backends.get_backend(backend).route(intersections, profile, reuse)
+    return "Disconnected" if route is None else route
+
+def report(progress, message):
+    '''Passes a progress message to the progress callback, if there is one.'''
+    if progress is not None:
+        progress(message)
+
+def prepare_graph(start_address, end_address, progress=None, exclude=()):
+    '''
+    Geocodes both addresses, pulls the streets around them and builds a Graph with
+    the addresses attached as its start and end nodes.
+    progress is an optional function which is called with a message as each stage begins.
+    exclude lists highway classes to leave out of the graph. (See build_graph())
+    '''
+    #Convert both addresses to latitude/longitude locations once.
+    report(progress, "Locating addresses..")
+    location1 = geocode(start_address)
+    location2 = geocode(end_address)
+
+    #Generate the bounding box of which to pull coordinates from.
+    north, south, east, west = bounding_box_of(location1, location2)
 
-    #Generate a list of directions using generate_directions function call.
-    itinerary = generate_directions(start_address, end_address, route)
+    #Pull a custom graph data structure using the OSMNX api. 
+    report(progress, "Fetching streets from the OSM database..")
+    G = fetch_region(north, south, east, west)
+
+    #Generate start street name, end street name, and their respective nodes.
+    start_street, start_node, end_street, end_node = endpoint_nodes_of(location1, location2)
+
+    #Create my own graph, initializing with start and end nodes.
+    report(progress, "Building the graph of intersections and streets..")
+    return build_graph(G, start_street, start_node, end_street, end_node, exclude=exclude)
+
+def generate_route(start_address, end_address, progress=None, profile=profiles.DEFAULT_PROFILE, backend=None, exclude=()):
+    '''
+    The main function of this module which uses most other functions inside of it.
+    Attempts to determine a route from start_address to end_address. Based on the
+    route, specific directions will be generated.
+    ------------------------------------------------------------------------------
+    Input:
+        start_address --> The address of which the route is to begin from.
+        end_address --> The address of which the route is to end at.
+        progress --> Optional function which is called with a message as each stage begins.
+        profile --> The cost profile to optimize for. (See Cost_Profiles.py)
+        backend --> The search engine to use. (Default: Search_Backends.DEFAULT_BACKEND)
+        exclude --> Highway classes to leave out, such as Pruning.LOW_VALUE_HIGHWAYS.
+    ------------------------------------------------------------------------------
+    Output:
+        An array of sentences.
+            Each sentence is a step in the instructions of the route 
+            for traversing from start_address to end_address.
+    ------------------------------------------------------------------------------
+    The query is profiled if profiling is switched on. (See Profiling.py)
+    '''
+    with profiling.default_profiler.profile(start_address=start_address, end_address=end_address, profile=profile):
+        intersections = prepare_graph(start_address, end_address, progress, exclude)
+        profiling.tag_graph(intersections)
+
+        report(progress, "Calculating the shortest path..")
+        route = find_route(intersections, profile, backend=backend)
+        if route == "Disconnected":
+            return route
+
+        #Generate a list of directions using generate_directions function call.
+        report(progress, "Generating directions..")
+        itinerary = generate_directions(start_address, end_address, route)
 
     #Return the list of directions.
-    return itinerary
\ No newline at end of file
+    return itinerary
+
+def find_alternatives(intersections, k=3, max_settled=None, profile=profiles.DEFAULT_PROFILE):
+    '''
+    Determine up to k routes between the start and end nodes of a Graph, shortest first.
+    See Graph.alternatives() for how they are chosen.
+    ------------------------------------------------------------------------------
+    Output:
+        "Disconnected" if there is no path between the start and end nodes
+        (or none was found within max_settled).
+        Otherwise, a list of routes in the format of djikstra().
+    '''
+    routes = intersections.alternatives(k, max_settled, profile=profile)
+    if routes == []:
+        return "Disconnected"
+    return routes
+
+def generate_alternatives(start_address, end_address, k=3, max_settled=None, profile=profiles.DEFAULT_PROFILE):
+    '''
+    Like generate_route(), but returns up to k alternative itineraries, shortest first.
+    ------------------------------------------------------------------------------
+    Input:
+        k --> The maximum number of itineraries.
+        max_settled --> Cap on the number of nodes settled by the search, to bound latency.
+        profile --> The cost profile to optimize for. (See Cost_Profiles.py)
+    ------------------------------------------------------------------------------
+    Output:
+        A list of itineraries (each an array of sentences), or "Disconnected".
+    '''
+    routes = find_alternatives(prepare_graph(start_address, end_address), k, max_settled, profile)
+    if routes == "Disconnected":
+        return routes
+
+    return [generate_directions(start_address, end_address, route) for route in routes]
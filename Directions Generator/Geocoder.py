@@ -0,0 +1,199 @@
+'''
+Program: Geocoder.py
+Description: A single shared client for the Nominatim geocoding service. Connections
+             are kept alive and reused from a small pool, requests are spaced out by
+             a token bucket so the service does not throttle us, failed requests are
+             retried a bounded number of times with jittered backoff, and concurrent
+             lookups of the same address share one request. The base url can point
+             at any Nominatim compatible server, such as a local stub for testing.
+
+Set the DIRECTIONS_GEOCODER_URL environment variable to change the server used by default.
+'''
+
+#Imports
+import os
+import json
+import time
+import queue
+import random
+import threading
+import http.client
+import urllib.parse
+from concurrent.futures import Future
+import geopy
+
+#The public Nominatim server. Its usage policy allows at most 1 request per second.
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "Directions-Generator"
+
+#Response codes which are worth trying again.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class Geocoding_Error(Exception):
+    '''Raised when the geocoding service cannot answer, even after retrying.'''
+    pass
+
+class Token_Bucket(object):
+    '''Rate limiter which allows bursts of up to capacity requests, refilled at rate requests per second.'''
+
+    def __init__(self, rate, capacity=1):
+        '''
+        Initialization for the bucket.
+        -----------------------------
+        Inputs:
+            - rate --> Tokens added per second.
+            - capacity --> Most tokens the bucket can hold.
+        '''
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''Takes a token, waiting until one is available.'''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class Geocoder(object):
+    '''Pooled, rate limited and retrying geocoding client.'''
+
+    def __init__(self, base_url=NOMINATIM_URL, rate=1.0, burst=1, pool_size=2, timeout=10, retries=3, backoff=0.5,
+                 user_agent=USER_AGENT):
+        '''
+        Initialization for the geocoder. No connection is made until the first lookup.
+        -----------------------------
+        Inputs:
+            - base_url --> Url of the server's search endpoint.
+            - rate, burst --> Requests per second, and how many may be sent at once after a quiet period.
+            - pool_size --> Most connections kept open to the server.
+            - timeout --> Seconds to wait for the server on each attempt.
+            - retries --> Number of attempts after the first before giving up.
+            - backoff --> Base delay in seconds between attempts, doubled after each one and jittered.
+            - user_agent --> Identifies the application to the server, as Nominatim requires.
+        '''
+        url = urllib.parse.urlsplit(base_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.path = url.path or "/"
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.user_agent = user_agent
+        self.bucket = Token_Bucket(rate, burst)
+        #Idle connections, and a count of how many more may still be opened.
+        self.idle = queue.LifoQueue()
+        self.openable = threading.BoundedSemaphore(pool_size)
+        #Dictionary of address --> Future of the request which is already looking it up.
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def geocode(self, address):
+        '''
+        Converts an address to a geopy location.
+        Returns None if the address cannot be found, and raises Geocoding_Error if the service cannot answer.
+        '''
+        with self.lock:
+            future = self.inflight.get(address)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.inflight[address] = future
+        if not owner:
+            #Another thread is already looking this address up; share its answer.
+            return future.result()
+        try:
+            future.set_result(self.lookup(address))
+        except BaseException as err:
+            future.set_exception(err)
+        finally:
+            with self.lock:
+                del self.inflight[address]
+        return future.result()
+
+    def lookup(self, address):
+        '''Sends the request for an address, retrying failures with jittered exponential backoff.'''
+        query = urllib.parse.urlencode({"q": address, "format": "json", "limit": 1})
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            self.bucket.acquire()
+            try:
+                status, body = self.send(self.path + "?" + query)
+            except (OSError, http.client.HTTPException) as err:
+                problem = "%s: %s" %(type(err).__name__, err)
+                continue
+            if status == 200:
+                return self.parse(body)
+            problem = "HTTP %d" %(status)
+            if status not in RETRY_STATUSES:
+                break
+        raise Geocoding_Error("Could not geocode %r (%s)" %(address, problem))
+
+    def send(self, path):
+        '''Sends a GET request on a pooled connection. Returns (status, body).'''
+        connection = self.connection()
+        try:
+            connection.request("GET", path, headers={"User-Agent": self.user_agent, "Accept": "application/json"})
+            response = connection.getresponse()
+            body = response.read()
+        except:
+            #A broken connection is not returned to the pool.
+            connection.close()
+            self.openable.release()
+            raise
+        if response.will_close:
+            connection.close()
+            self.openable.release()
+        else:
+            self.idle.put(connection)
+        return response.status, body
+
+    def connection(self):
+        '''Takes an idle connection from the pool, opening a new one if the pool is not full yet.'''
+        while True:
+            try:
+                return self.idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self.openable.acquire(timeout=0.05):
+                if self.scheme == "https":
+                    return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+                return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def parse(self, body):
+        '''Converts a Nominatim JSON response to a geopy location, or None if there were no results.'''
+        try:
+            results = json.loads(body.decode("utf-8"))
+        except ValueError as err:
+            raise Geocoding_Error("Unreadable response from the geocoding service (%s)" %(err))
+        if results == []:
+            return None
+        place = results[0]
+        return geopy.Location(place["display_name"], (float(place["lat"]), float(place["lon"])), place)
+
+    def close(self):
+        '''Closes every idle connection.'''
+        while True:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            connection.close()
+            self.openable.release()
+
+def location_of(address, latitude, longitude):
+    '''Rebuilds a geopy location from its address and coordinates, e.g. one sent between processes as JSON.'''
+    return geopy.Location(address, (latitude, longitude), {})
+
+#Geocoder shared by the whole application.
+default_geocoder = Geocoder(os.environ.get("DIRECTIONS_GEOCODER_URL", NOMINATIM_URL))
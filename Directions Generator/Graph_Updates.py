@@ -0,0 +1,170 @@
+'''
+Program: Graph_Updates.py
+Description: Reads street changes (closure lists and OSM change files) into
+             updates that can be applied to a cached Graph in place with
+             Graph.apply_updates(), so that a region does not have to be pulled
+             from the OSM database and rebuilt whenever a street changes.
+'''
+
+#Imports
+import csv
+import xml.etree.ElementTree as ET
+import Data_Structures as ds
+import Region_Pack as packs
+
+#Highway types that can be driven on. (Similar to the OSMNX 'drive' network type)
+DRIVE_HIGHWAYS = set(("motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+                      "secondary", "secondary_link", "tertiary", "tertiary_link", "unclassified",
+                      "residential", "living_street", "service", "road"))
+
+def read_closures(path):
+    '''
+    Reads a closure list into updates.
+    ------------------------------------------------------------------------------
+    Input:
+        path --> A CSV file with one closed street section per row:
+                    start_id,end_id
+                 The section is closed in both directions.
+    ------------------------------------------------------------------------------
+    Output:
+        A list of ("remove", start_id, end_id) updates.
+    '''
+    updates = []
+    with open(path, newline="") as closures:
+        for row in csv.reader(closures):
+            #Skip blank lines, comments and headers.
+            if len(row) < 2 or not row[0].strip().lstrip("-").isdigit():
+                continue
+            start_id, end_id = int(row[0]), int(row[1])
+            updates.append(("remove", start_id, end_id))
+            updates.append(("remove", end_id, start_id))
+    return updates
+
+def way_edges(graph, node_ids, coordinates, tags, lengths=None):
+    '''
+    Splits an OSM way into graph edges.
+    The graph is simplified, so a way is only cut at nodes which are intersections in the graph
+    (or at the ends of the way), and the lengths of the pieces in between are added up.
+    ------------------------------------------------------------------------------
+    Input:
+        graph --> The Graph the edges are meant for.
+        node_ids --> The ids of the nodes of the way, in order.
+        coordinates --> Dictionary of osm_id --> (latitude, longitude) for nodes not in the graph.
+        tags --> Dictionary of the way's tags.
+        lengths --> Optional dictionary of (start_id, end_id) --> length of the pieces the way had before.
+                    A piece none of whose inner nodes are in coordinates has kept its shape, so its old
+                    length is used when those nodes cannot be located. (Change files leave out unchanged nodes)
+    ------------------------------------------------------------------------------
+    Output:
+        A list of (start_id, end_id, way) tuples, in the directions the way can be driven. (See Region_Pack.oneway_of())
+        Each way is (length, name, highway, maxspeed), so its profile costs can be worked out. (See Graph.add_edge())
+        None if a piece of the way cannot be measured.
+    '''
+    def location(osm_id):
+        if graph.node_exists(osm_id):
+            return graph.node_list[osm_id]
+        if osm_id in coordinates:
+            return ds.Node(osm_id, *coordinates[osm_id])
+        return None
+
+    def measure(piece):
+        nodes = [location(osm_id) for osm_id in piece]
+        if None not in nodes:
+            return sum(ds.longlat_to_metres(u, v) for u, v in zip(nodes, nodes[1:]))
+        if lengths is None or nodes[0] is None or nodes[-1] is None or any(osm_id in coordinates for osm_id in piece[1:-1]):
+            return None
+        return lengths.get((piece[0], piece[-1]), lengths.get((piece[-1], piece[0])))
+
+    name = tags.get("name", tags.get("highway", "road") + "_") #_ Helps conclude that path has no name.
+    oneway = packs.oneway_of(tags)
+
+    edges = []
+    start = 0
+    for i in range(1, len(node_ids)):
+        if not graph.node_exists(node_ids[i]) and i != len(node_ids) - 1:
+            continue
+        length = measure(node_ids[start:i + 1])
+        if length is None:
+            return None
+        way = (length, name, tags.get("highway"), tags.get("maxspeed"))
+        if oneway >= 0:
+            edges.append((node_ids[start], node_ids[i], way))
+        if oneway <= 0:
+            edges.append((node_ids[i], node_ids[start], way))
+        start = i
+    return edges
+
+def read_osm_change(path, graph):
+    '''
+    Reads an OSM change file (.osc) into updates for a graph.
+    ------------------------------------------------------------------------------
+    Input:
+        path --> The OSM change file, or a file object.
+        graph --> The Graph the updates are meant for.
+    ------------------------------------------------------------------------------
+    Output:
+        A list of updates for graph.apply_updates().
+            - Modified and deleted ways which the graph was built from remove what they added by way id.
+              (Deleted ways usually come without their nodes or tags) Edges merged from them and parallel
+              ways fall back to the parallel ways. (See Graph.remove_way())
+            - Created or modified drivable ways add their edges, measured from the nodes in the change file,
+              or from the old edges where a piece kept its shape.
+            - Ways which cannot be worked out from the change file and the graph alone give a "refetch"
+              update, so the graph is built again:
+                - Modified ways which OSMNX joined end to end with others, since the others are not known.
+                - Ways which cannot be measured, or which end at a node the graph simplified away.
+            - Ways which no longer drive only remove their old edges. (Graphs which did not record their
+              ways remove the edges between the way's nodes instead)
+    '''
+    return osm_change_updates(ET.parse(path).getroot(), graph)
+
+def osm_change_updates(root, graph):
+    '''Same as read_osm_change(), for the root element of an OSM change file which was already parsed.'''
+
+    #Coordinates of the nodes in the change file, and which of them are new.
+    coordinates = {}
+    created = set()
+    for action in root:
+        for node in action.findall("node"):
+            if "lat" in node.attrib and "lon" in node.attrib:
+                coordinates[int(node.get("id"))] = (float(node.get("lat")), float(node.get("lon")))
+                if action.tag == "create":
+                    created.add(int(node.get("id")))
+
+    updates = []
+    for action in root:
+        for way in action.findall("way"):
+            way_id = int(way.get("id"))
+            known = action.tag != "create" and way_id in graph.ways
+            node_ids = [int(nd.get("ref")) for nd in way.findall("nd")]
+            if not known and not any(graph.node_exists(osm_id) for osm_id in node_ids):
+                #The way does not touch this graph.
+                continue
+            if known and action.tag == "modify" and graph.merged_in_series(way_id):
+                updates.append(("refetch", way_id))
+                continue
+            lengths = graph.way_lengths(way_id) if known else None
+            if known:
+                updates.append(("remove_way", way_id))
+            if action.tag == "delete":
+                continue
+            tags = {tag.get("k"): tag.get("v") for tag in way.findall("tag")}
+            if tags.get("highway") not in DRIVE_HIGHWAYS:
+                if not graph.ways:
+                    #The graph does not know which ways its edges came from, so remove the way's edges by their nodes.
+                    updates.extend(("remove", start_id, end_id) for start_id, end_id, street in way_edges(graph, node_ids, coordinates, tags) or ())
+                continue
+            edges = way_edges(graph, node_ids, coordinates, tags, lengths)
+            if edges is None:
+                updates.append(("refetch", way_id))
+                continue
+            #A new node is a dead end. Any other node which is not in the graph was simplified away, so joining it makes a new intersection.
+            ends = set(osm_id for start_id, end_id, street in edges for osm_id in (start_id, end_id) if not graph.node_exists(osm_id))
+            if not ends <= created:
+                updates.append(("refetch", way_id))
+                continue
+            for osm_id in sorted(ends):
+                updates.append(("node", osm_id) + coordinates[osm_id])
+            for start_id, end_id, street in edges:
+                updates.append(("add", start_id, end_id, street, way_id))
+    return updates
@@ -0,0 +1,105 @@
+'''
+Program: Isochrones.py
+Description: Reachability (isochrone) queries for service-area planning. Answers
+             "everything reachable within N km of this address" with a single
+             Djikstra search that stops at the largest distance budget, so only
+             the reachable part of the graph is ever touched. Several budgets are
+             answered by the same search.
+'''
+
+#Imports
+import Data_Structures as ds
+import Functionality as pathfinder
+
+class Address_Not_Found(Exception):
+    '''Raised when the address to start from cannot be geocoded.'''
+    pass
+
+def convex_hull(points):
+    '''
+    Returns the convex hull of a list of (latitude, longitude) points, in counter-clockwise order.
+    Uses Andrew's monotone chain algorithm. (O(n*logn))
+    '''
+    points = sorted(set(points))
+    if len(points) <= 2:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    upper = []
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    return lower[:-1] + upper[:-1]
+
+def reachable(graph, source, budgets):
+    '''
+    Finds every node that can be driven to from source within each distance budget.
+    ------------------------------------------------------------------------------
+    Input:
+        graph --> The Graph to search.
+        source --> The node to start from.
+        budgets --> A list of distance budgets in metres.
+    ------------------------------------------------------------------------------
+    Output:
+        A dictionary of budget --> dictionary with:
+            "nodes"   --> Dictionary of node id --> distance in metres.
+            "polygon" --> The boundary of the reached area, as a list of (latitude, longitude).
+        Empty if there are no budgets.
+    '''
+    if not budgets:
+        return {}
+    #A single search, which stops once the largest budget is used up.
+    tree = ds.Shortest_Path_Tree(graph, source)
+    tree.grow(budget=max(budgets))
+
+    #Settled nodes sorted by distance, so each budget takes a prefix of them.
+    settled = sorted((tree.distance[node_id], node_id) for node_id in tree.settled)
+    results = {}
+    for budget in budgets:
+        nodes = {}
+        points = []
+        for distance, node_id in settled:
+            if distance > budget:
+                break
+            nodes[node_id] = distance
+            points.append(graph.get_node(node_id).get_latlong())
+        results[budget] = {"nodes": nodes, "polygon": convex_hull(points)}
+    return results
+
+def generate_isochrones(address, budgets_km):
+    '''
+    Determines the area that can be driven to from an address within each distance budget.
+    ------------------------------------------------------------------------------
+    Input:
+        address --> The address to start from.
+        budgets_km --> A list of distance budgets in kilometres.
+    ------------------------------------------------------------------------------
+    Output:
+        A dictionary of budget in kilometres --> dictionary of "nodes" and "polygon". (See reachable())
+        Empty if there are no budgets, without looking the address up.
+        Raises Address_Not_Found if the address cannot be found.
+    '''
+    if not budgets_km:
+        return {}
+    location = pathfinder.geocode(address)
+    if location is None:
+        raise Address_Not_Found("Address not found: %s" %(address))
+
+    #Nothing further away than the largest budget can be reached, so only that area is pulled.
+    north, south, east, west = pathfinder.bounding_box_of_all([location], buffer_km=max(budgets_km))
+    graph = pathfinder.build_graph(pathfinder.fetch_region(north, south, east, west))
+
+    #Address returned by geolocator is of format: 00, street, city, ... etc
+    source = ds.Node(-3, location.latitude, location.longitude)
+    graph.attach_stop(source, location.address.split(", ")[1])
+
+    results = reachable(graph, source, [budget * 1000 for budget in budgets_km])
+    return {budget: results[budget * 1000] for budget in budgets_km}
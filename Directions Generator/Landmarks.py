@@ -0,0 +1,363 @@
+'''
+Program: Landmarks.py
+Description: Landmark (ALT) preprocessing for warm regional graphs. A few intersections
+             spread around the region are chosen as landmarks, and the cost from each
+             landmark to every intersection, and from every intersection back to it, is
+             stored. By the triangle inequality these give a lower bound on the cost of
+             getting from any intersection to the end node, which stays tight where the
+             roads have to go around rivers and lakes, unlike a straight line estimate.
+             An A* search guided by the bounds settles far fewer intersections than
+             Djikstra's algorithm, and finds a route of the same cost.
+
+             The tables are kept per cost profile in graph.derived, so they are dropped
+             when the graph is updated and built again for its new version. They can be
+             saved to disk with the region's bounding box, so a restarted service loads
+             them instead of building them again. (See Route_Service.py)
+
+Usage: python Landmarks.py [--sizes 20 40] [--queries N] [--landmarks N] [--river]
+       (Compares the landmark search with Djikstra's algorithm on synthetic grids of streets)
+
+PLEASE NOTE: Building the tables takes two full searches per landmark, so they only pay off
+             on graphs which are routed on many times.
+'''
+
+#Imports
+import os
+import gzip
+import json
+import heapq
+import time
+import random
+import argparse
+from array import array
+import Cost_Profiles as profiles
+import Data_Structures as ds
+
+#Number of landmarks chosen for each graph and profile.
+LANDMARK_COUNT = 8
+#Number of landmarks which guide each search; the ones giving the highest bounds at its start.
+ACTIVE_LANDMARKS = 4
+#Version of the saved table layout.
+TABLE_FORMAT = 1
+UNREACHABLE = float("inf")
+
+class Landmark_Table(object):
+    '''The costs between each landmark and every intersection of a Graph, under one cost profile.'''
+
+    def __init__(self, profile, fingerprint, landmarks, ids, forward, reverse):
+        '''
+        Initialization for the table.
+        -----------------------------
+        Inputs:
+            - profile --> The cost profile the costs are in. (See Cost_Profiles.py)
+            - fingerprint --> fingerprint() of the graph the table was built on.
+            - landmarks --> Ids of the landmark intersections.
+            - ids --> Ids of every intersection, in the order of the arrays.
+            - forward --> forward[k][i] is the cost from landmark k to intersection ids[i].
+            - reverse --> reverse[k][i] is the cost from intersection ids[i] to landmark k.
+        '''
+        self.profile = profile
+        self.fingerprint = fingerprint
+        self.landmarks = landmarks
+        self.ids = ids
+        self.index = {node_id: i for i, node_id in enumerate(ids)}
+        self.forward = forward
+        self.reverse = reverse
+
+    def estimator(self, entries, start_ids, column):
+        '''
+        Returns a function giving a lower bound on the cost from an intersection to the end node.
+        ------------------------------------------------------------------------------
+        Input:
+            entries --> Dictionary of node id --> edge into the end node, for every node on its street.
+            start_ids --> Ids of the intersections the start node leads to.
+            column --> Index of the profile's cost on each edge.
+        ------------------------------------------------------------------------------
+        For the end node t, reached from an entry e, and a landmark L:
+            cost(v, t) >= cost(L, t) - cost(L, v)                                 (L --> v --> t)
+            cost(v, t) >= cost(v, L) - max over e of (cost(e, L) - cost(e, t))    (v --> e --> L)
+        Terms which cannot be worked out, because a cost is unknown, are left out.
+        '''
+        index = self.index
+        known = [(index[node_id], edge[3][column]) for node_id, edge in entries.items() if node_id in index]
+        terms = []
+        for forward, reverse in zip(self.forward, self.reverse):
+            to_end = min([forward[i] + cost for i, cost in known] or [UNREACHABLE])
+            from_entries = [reverse[i] - cost for i, cost in known]
+            past_end = max(from_entries) if from_entries != [] and UNREACHABLE not in from_entries else None
+            terms.append((forward, to_end, reverse, past_end))
+
+        def bound(term, i):
+            forward, to_end, reverse, past_end = term
+            best = 0.0
+            if forward[i] != UNREACHABLE:
+                best = max(best, to_end - forward[i])
+            if past_end is not None:
+                best = max(best, reverse[i] - past_end)
+            return best
+
+        #Only the landmarks which bound the start best are used, since every term costs time at every node.
+        starts = [index[node_id] for node_id in start_ids if node_id in index]
+        terms.sort(key=lambda term: max([bound(term, i) for i in starts] or [0.0]), reverse=True)
+        active = terms[:ACTIVE_LANDMARKS]
+
+        def estimate(node_id):
+            i = index.get(node_id)
+            if i is None:
+                return 0.0
+            return max([bound(term, i) for term in active] or [0.0])
+        return estimate
+
+def fingerprint(graph, profile):
+    '''
+    Returns what a saved table must match to be used on a graph: its version, and the number and total
+    cost of the edges between its intersections. (Edges to custom nodes such as endpoints are not counted)
+    '''
+    column = profiles.column_of(profile)
+    nodes = edges = 0
+    total = 0.0
+    for node_id, node in graph.node_list.items():
+        if node_id < 0:
+            continue
+        nodes += 1
+        for end_id, edge in node.get_edgelist().items():
+            if end_id >= 0:
+                edges += 1
+                total += edge[3][column]
+    return [graph.version, nodes, edges, round(total, 3)]
+
+def search_costs(graph, node, reverse, profile):
+    '''Returns a dictionary of node id --> cost from node to every intersection (or to node, with reverse).'''
+    tree = ds.Shortest_Path_Tree(graph, node, reverse=reverse, profile=profile, intersections_only=True)
+    tree.grow()
+    return tree.distance
+
+def build_table(graph, profile=profiles.DEFAULT_PROFILE, count=LANDMARK_COUNT):
+    '''
+    Chooses landmarks for a graph and builds their Landmark_Table.
+    ------------------------------------------------------------------------------
+    The landmarks are chosen farthest first: the first is the intersection furthest from the centre
+    of the region, and each next one is the intersection whose round trip to the nearest landmark
+    chosen so far costs the most. This spreads them around the edge of the region, which is where
+    landmarks give the tightest bounds.
+    '''
+    ids = sorted(node_id for node_id in graph.node_list if node_id >= 0)
+    landmarks, forward, reverse = [], [], []
+    if ids == []:
+        return Landmark_Table(profile, fingerprint(graph, profile), landmarks, ids, forward, reverse)
+
+    latitude = sum(graph.node_list[node_id].latitude for node_id in ids) / len(ids)
+    longitude = sum(graph.node_list[node_id].longitude for node_id in ids) / len(ids)
+    candidate = max(ids, key=lambda node_id: (graph.node_list[node_id].latitude - latitude) ** 2 +
+                                             (graph.node_list[node_id].longitude - longitude) ** 2)
+    nearest = {}        #Node id --> round trip cost to the nearest landmark.
+    while candidate is not None and len(landmarks) < count:
+        node = graph.node_list[candidate]
+        costs_from = search_costs(graph, node, False, profile)
+        costs_to = search_costs(graph, node, True, profile)
+        landmarks.append(candidate)
+        forward.append(array("d", (costs_from.get(node_id, UNREACHABLE) for node_id in ids)))
+        reverse.append(array("d", (costs_to.get(node_id, UNREACHABLE) for node_id in ids)))
+        for node_id in ids:
+            trip = costs_from.get(node_id, UNREACHABLE) + costs_to.get(node_id, UNREACHABLE)
+            if trip < nearest.get(node_id, UNREACHABLE):
+                nearest[node_id] = trip
+        #Intersections which no landmark reaches both ways are left out; they are usually small islands.
+        farthest = max(nearest.items(), key=lambda item: (item[1], item[0]))
+        candidate = farthest[0] if farthest[1] > 0 else None
+    return Landmark_Table(profile, fingerprint(graph, profile), landmarks, ids, forward, reverse)
+
+def table_path(directory, bounding_box, profile):
+    '''Returns the file the landmark table of a region's bounding box and a profile is saved to, within directory.'''
+    return os.path.join(directory, "landmarks_%s_%s.json.gz" %("_".join("%.6f" %(value) for value in bounding_box), profile))
+
+def save_table(table, path):
+    '''Writes a table as gzip compressed JSON. Unreachable costs are written as null. The file is replaced in one step.'''
+    def costs(values):
+        return [None if value == UNREACHABLE else value for value in values]
+    saved = {"format": TABLE_FORMAT, "profile": table.profile, "fingerprint": table.fingerprint, "landmarks": table.landmarks,
+             "ids": table.ids, "forward": [costs(values) for values in table.forward], "reverse": [costs(values) for values in table.reverse]}
+    temporary = path + ".tmp"
+    with gzip.open(temporary, "wt", encoding="utf-8") as output:
+        json.dump(saved, output)
+    os.replace(temporary, path)
+
+def load_table(path, expected):
+    '''
+    Loads a table saved by save_table(), if it was built on a graph with the fingerprint expected.
+    Returns None if the file is missing, cannot be read, or is out of date.
+    '''
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as saved:
+            saved = json.load(saved)
+    except (OSError, ValueError):
+        return None
+    if saved.get("format") != TABLE_FORMAT or saved.get("fingerprint") != expected:
+        return None
+    def costs(values):
+        return array("d", (UNREACHABLE if value is None else value for value in values))
+    return Landmark_Table(saved["profile"], saved["fingerprint"], saved["landmarks"], saved["ids"],
+                          [costs(values) for values in saved["forward"]], [costs(values) for values in saved["reverse"]])
+
+def table_for(graph, profile=profiles.DEFAULT_PROFILE, path=None):
+    '''
+    Returns the Landmark_Table of a graph under a profile, kept in graph.derived["landmarks"].
+    On first use since the graph was built or updated, it is loaded from path if one is given and the
+    saved table matches the graph, otherwise it is built (and saved to path).
+    '''
+    tables = graph.derived.setdefault("landmarks", {})
+    table = tables.get(profile)
+    if table is None:
+        if path is not None:
+            table = load_table(path, fingerprint(graph, profile))
+        if table is None:
+            table = build_table(graph, profile)
+            if path is not None:
+                save_table(table, path)
+        tables[profile] = table
+    return table
+
+def search(graph, table, profile=profiles.DEFAULT_PROFILE):
+    '''
+    A* search from the start node to the end node of a Graph, guided by a Landmark_Table of the graph.
+    ------------------------------------------------------------------------------
+    Output:
+        The list of [latitude, longitude, street_name, distance] from Graph.djikstra(),
+        or None if the end node cannot be reached.
+    '''
+    column = profiles.column_of(profile)
+    end_id = graph.end_node.get_id()
+    #The edges into the end node, from every node on its street.
+    entries = {}
+    for node_id, street_id in graph.street_index.get(graph.names.lower_key(graph.end_street), ()):
+        edge = graph.node_list[node_id].get_edgelist().get(end_id)
+        if edge is not None:
+            entries[node_id] = edge
+    starts = [(node_id, edge) for node_id, edge in graph.start_node.get_edgelist().items() if node_id >= 0]
+    if entries == {} or starts == []:
+        return None
+    estimate = table.estimator(entries, [node_id for node_id, edge in starts], column)
+
+    distance = {}       #Lowest known cost of each intersection.
+    previous = {}       #Node id --> (previous node, edge from it)
+    heapqueue = []      #Entries of (cost + bound, cost, node id)
+    for node_id, edge in starts:
+        cost = edge[3][column]
+        if cost < distance.get(node_id, UNREACHABLE):
+            distance[node_id] = cost
+            previous[node_id] = (graph.start_node, edge)
+            heapq.heappush(heapqueue, (cost + estimate(node_id), cost, node_id))
+
+    best = UNREACHABLE
+    best_id = None
+    settled = set()
+    while heapqueue != []:
+        bound, cost, u = heapq.heappop(heapqueue)
+        if bound >= best:
+            #Every route through the nodes left costs at least as much as the best one found.
+            break
+        if u in settled:
+            continue
+        settled.add(u)
+        if u in entries and cost + entries[u][3][column] < best:
+            best = cost + entries[u][3][column]
+            best_id = u
+        node = graph.node_list[u]
+        for v, edge in node.get_edgelist().items():
+            if v < 0 or v in settled:
+                continue
+            temp = cost + edge[3][column]
+            if temp < distance.get(v, UNREACHABLE):
+                distance[v] = temp
+                previous[v] = (node, edge)
+                heapq.heappush(heapqueue, (temp + estimate(v), temp, v))
+    if best_id is None:
+        return None
+
+    #Walk back from the best entry to the start node.
+    steps = [(graph.end_node, entries[best_id])]
+    node_id = best_id
+    while True:
+        u, edge = previous[node_id]
+        steps.append((graph.node_list[node_id], edge))
+        if u is graph.start_node:
+            break
+        node_id = u.get_id()
+    steps.reverse()
+    return [[node.latitude, node.longitude, graph.names.get_name(edge[2]), edge[1]] for node, edge in steps]
+
+def add_river(region, column, bridges):
+    '''
+    Cuts a Synthetic_Region in two along a column of its grid, as a river would, leaving only the
+    streets on the given rows to cross it. (See Load_Test.py)
+    '''
+    import Load_Test as load_test
+    crossing = load_test.GRID_ORIGIN[1] + (column + 0.5) * load_test.GRID_STEP
+    for u in list(region.adj):
+        for v in list(region.adj[u]):
+            x1, x2 = region.node[u]["x"], region.node[v]["x"]
+            row = int(round((region.node[u]["y"] - load_test.GRID_ORIGIN[0]) / load_test.GRID_STEP))
+            if min(x1, x2) < crossing < max(x1, x2) and row not in bridges:
+                del region.adj[u][v]
+    return region
+
+def landmark_report(sizes, queries=10, count=LANDMARK_COUNT, river=False, profile=profiles.DEFAULT_PROFILE, seed=0):
+    '''
+    Routes on synthetic grids with Djikstra's algorithm and with the landmark search.
+    ------------------------------------------------------------------------------
+    Output:
+        A list of (size, nodes, build_ms, djikstra_ms, landmark_ms, same_length) for each grid,
+        with the search times averaged over the queries.
+    '''
+    #Only needed for the report, which builds its graphs from the synthetic grid.
+    import Functionality as pathfinder
+    import Load_Test as load_test
+
+    results = []
+    for size in sizes:
+        north = load_test.GRID_ORIGIN[0] + (size - 1) * load_test.GRID_STEP
+        east = load_test.GRID_ORIGIN[1] + (size - 1) * load_test.GRID_STEP
+        region = load_test.Synthetic_Region(north, load_test.GRID_ORIGIN[0], east, load_test.GRID_ORIGIN[1])
+        if river:
+            add_river(region, size // 2, (0, size - 1))
+        graph = pathfinder.build_graph(region)
+
+        begin = time.perf_counter()
+        table = build_table(graph, profile, count)
+        build = time.perf_counter() - begin
+
+        generator = random.Random(seed)
+        djikstra_time = landmark_time = 0
+        same = 0
+        for query in range(queries):
+            start_row, start_column, end_row, end_column = (generator.randrange(size - 1) for i in range(4))
+            start = load_test.grid_address(start_row, start_column)[1]
+            end = load_test.grid_address(end_row, end_column)[1]
+            graph.set_endpoints("Row %d Street" %(start_row), ds.Node(-1, start[1], start[2]),
+                                "Row %d Street" %(end_row), ds.Node(-2, end[1], end[2]))
+            begin = time.perf_counter()
+            expected = graph.djikstra(profile) if graph.dfs() else None
+            djikstra_time += time.perf_counter() - begin
+            begin = time.perf_counter()
+            route = search(graph, table, profile)
+            landmark_time += time.perf_counter() - begin
+            if route is None or expected is None:
+                same += route is None and expected is None
+            else:
+                same += abs(sum(row[3] for row in route) - sum(row[3] for row in expected)) < 1e-6
+        results.append((size, len(graph.node_list), build * 1000, djikstra_time / queries * 1000, landmark_time / queries * 1000, same))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the landmark (ALT) search with Djikstra's algorithm on synthetic grids.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 40], help="Rows (and columns) of each grid.")
+    parser.add_argument("--queries", type=int, default=10, help="Routes per grid.")
+    parser.add_argument("--landmarks", type=int, default=LANDMARK_COUNT)
+    parser.add_argument("--river", action="store_true", help="Cut each grid in two, with a bridge at either end.")
+    parser.add_argument("--profile", default=profiles.DEFAULT_PROFILE, choices=profiles.PROFILES)
+    args = parser.parse_args()
+
+    print("Size    Nodes   Build ms  Djikstra ms  Landmark ms  Same length")
+    for size, nodes, build, djikstra_ms, landmark_ms, same in landmark_report(args.sizes, args.queries, args.landmarks, args.river, args.profile):
+        print("%4d %8d %10.1f %12.2f %12.2f %8d/%d" %(size, nodes, build, djikstra_ms, landmark_ms, same, args.queries))
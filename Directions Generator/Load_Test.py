@@ -0,0 +1,368 @@
+'''
+Program: Load_Test.py
+Description: Load generator for the routing core. Replays a corpus of address pairs
+             against a Route_Service, either in this process or over its HTTP API,
+             at a fixed number of simultaneous users or at a target request rate.
+             The geocoder and the OSM fetch are replaced by local stubs (a small
+             Nominatim compatible server and a synthetic grid of streets), so runs
+             are repeatable and do not depend on the public servers. Throughput,
+             latency percentiles, a per-stage breakdown and error rates are
+             reported, and saved as JSON so runs can be compared.
+
+Usage: python Load_Test.py [--target local|http|URL] [--concurrency N | --rate R] [--requests N]
+                           [--corpus FILE] [--output FILE] [--compare FILE]
+
+    local --> Calls an in-process Route_Service directly. (Default)
+    http  --> Starts a Route_Service HTTP server in this process and calls it with Route_Client.
+    URL   --> Calls an already running service. Its geocoder and OSM fetch are left as they are.
+    A corpus file has one "start address|end address" pair per line. Without one, pairs are generated
+    on the synthetic grid. With the local and http targets, the stub geocoder places each address of
+    a corpus file at a fixed spot on the synthetic grid, since it cannot look up real addresses.
+'''
+
+#Imports
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import Functionality as pathfinder
+import Geocoder as geocoding
+import Route_Service as service
+
+#Spacing of the synthetic grid of streets, in degrees. (About 110 metres north-south)
+GRID_STEP = 0.001
+#Latitude and longitude of row 0 and column 0 of the synthetic grid.
+GRID_ORIGIN = (43.0, -79.0)
+METRES_PER_DEGREE = 111320
+#Every ARTERIAL_EVERY-th row and column of the synthetic grid is a faster secondary road.
+ARTERIAL_EVERY = 5
+
+class Synthetic_Region(object):
+    '''
+    A grid of streets covering a bounding box, in the shape of the OSMNX graphs used by build_graph().
+    Rows are "Row i Street" (east-west) and columns are "Col j Avenue" (north-south). Node ids come from
+    the grid position, so the same intersection has the same id in every region. Every ARTERIAL_EVERY-th
+    row and column is a secondary road, the rest are residential.
+    '''
+
+    def __init__(self, north, south, east, west):
+        self.node = {}
+        self.adj = {}
+        rows = range(int(math.floor((south - GRID_ORIGIN[0]) / GRID_STEP)), int(math.ceil((north - GRID_ORIGIN[0]) / GRID_STEP)) + 1)
+        columns = range(int(math.floor((west - GRID_ORIGIN[1]) / GRID_STEP)), int(math.ceil((east - GRID_ORIGIN[1]) / GRID_STEP)) + 1)
+        for i in rows:
+            for j in columns:
+                self.node[grid_id(i, j)] = {"y": GRID_ORIGIN[0] + i * GRID_STEP, "x": GRID_ORIGIN[1] + j * GRID_STEP}
+        row_metres = GRID_STEP * METRES_PER_DEGREE * math.cos(math.radians(GRID_ORIGIN[0]))
+        column_metres = GRID_STEP * METRES_PER_DEGREE
+        for i in rows:
+            for j in columns:
+                if j + 1 in columns:
+                    self.add_street(grid_id(i, j), grid_id(i, j + 1), row_metres, "Row %d Street" %(i), highway_of(i))
+                if i + 1 in rows:
+                    self.add_street(grid_id(i, j), grid_id(i + 1, j), column_metres, "Col %d Avenue" %(j), highway_of(j))
+
+    def add_street(self, u, v, length, name, highway="residential"):
+        '''Adds a two way street between intersections u and v.'''
+        way = {"length": length, "name": name, "highway": highway}
+        self.adj.setdefault(u, {})[v] = {0: way}
+        self.adj.setdefault(v, {})[u] = {0: way}
+
+    def edges(self, data=None, keys=False):
+        '''Generates (u, v, key, None) for every edge, like the OSMNX graph.'''
+        for u in self.adj:
+            for v in self.adj[u]:
+                for key in self.adj[u][v]:
+                    yield u, v, key, None
+
+def highway_of(number):
+    '''OSM highway type of row or column number of the synthetic grid.'''
+    return "secondary" if number % ARTERIAL_EVERY == 0 else "residential"
+
+def grid_id(i, j):
+    '''OSM style id of the intersection of row i and column j.'''
+    return (i + 500000) * 1000000 + (j + 500000)
+
+def synthetic_fetch(north, south, east, west):
+    '''Stand-in for Functionality.fetch_region() which returns a Synthetic_Region.'''
+    return Synthetic_Region(north, south, east, west)
+
+def grid_address(i, j):
+    '''An address on row i of the synthetic grid, near column j, and its (display_name, latitude, longitude).'''
+    address = "%d, Row %d Street, Grid Town" %(j * 10 + 1, i)
+    return address, (address, GRID_ORIGIN[0] + i * GRID_STEP, GRID_ORIGIN[1] + (j + 0.5) * GRID_STEP)
+
+def synthetic_corpus(pairs, spread=20, seed=0):
+    '''
+    Generates address pairs on the synthetic grid.
+    Output: (pairs, places) where pairs is a list of (start, end) and places is a dictionary of address --> place.
+    '''
+    rng = random.Random(seed)
+    places = {}
+    corpus = []
+    for n in range(pairs):
+        ends = []
+        for end in range(2):
+            address, place = grid_address(rng.randrange(spread), rng.randrange(spread))
+            places[address] = place
+            ends.append(address)
+        corpus.append(tuple(ends))
+    return corpus, places
+
+def corpus_places(corpus, spread=20):
+    '''
+    Places every address of a corpus on the synthetic grid, for the stub geocoder.
+    Each address always lands on the same spot, chosen from the address itself, so runs are repeatable.
+    Output: A dictionary of address --> place, like synthetic_corpus() gives.
+    '''
+    places = {}
+    for pair in corpus:
+        for address in pair:
+            if address not in places:
+                rng = random.Random(address)
+                places[address] = grid_address(rng.randrange(spread), rng.randrange(spread))[1]
+    return places
+
+def read_corpus(path):
+    '''Reads "start address|end address" pairs from a file, one per line.'''
+    corpus = []
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            if "|" in line:
+                start, end = line.strip().split("|", 1)
+                corpus.append((start.strip(), end.strip()))
+    return corpus
+
+class Stub_Geocoder(object):
+    '''A local Nominatim compatible /search server which answers from a dictionary of places.'''
+
+    def __init__(self, places, delay=0.0):
+        '''
+        Initialization for the stub.
+        -----------------------------
+        Inputs:
+            - places --> Dictionary of address --> (display_name, latitude, longitude). Other addresses are not found.
+            - delay --> Seconds to wait before each answer, to imitate the network.
+        '''
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                place = stub.places.get(query.get("q", [""])[0])
+                results = [] if place is None else [{"display_name": place[0], "lat": str(place[1]), "lon": str(place[2])}]
+                time.sleep(stub.delay)
+                body = json.dumps(results).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.places = places
+        self.delay = delay
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def get_url(self):
+        '''Returns the url of the stub's search endpoint.'''
+        return "http://127.0.0.1:%d/search" %(self.server.server_port)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def install_stubs(places, geocoder_delay=0.0):
+    '''Points the shared geocoder at a Stub_Geocoder, and the OSM fetch at the synthetic grid. Returns the stub.'''
+    stub = Stub_Geocoder(places, geocoder_delay)
+    geocoding.default_geocoder = geocoding.Geocoder(stub.get_url(), rate=10000, burst=100, pool_size=64)
+    pathfinder.fetch_region = synthetic_fetch
+    return stub
+
+def percentile(values, fraction):
+    '''The nearest rank percentile of a list of values, e.g. percentile(latencies, 0.95)'''
+    if values == []:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, int(math.ceil(fraction * len(ordered))) - 1)]
+
+def summarize(samples, seconds):
+    '''
+    Summarizes the samples of a run.
+    Each sample is (status, latency in milliseconds, dictionary of stage --> milliseconds).
+    '''
+    latencies = [sample[1] for sample in samples]
+    statuses = {}
+    stages = {}
+    for status, latency, timings in samples:
+        statuses[status] = statuses.get(status, 0) + 1
+        for stage, milliseconds in timings.items():
+            stages.setdefault(stage, []).append(milliseconds)
+    #Addresses which could not be found count as errors, and are also reported on their own.
+    failed = sum(count for status, count in statuses.items() if status not in ("ok", "disconnected", "same"))
+    return {"requests": len(samples), "seconds": round(seconds, 3),
+            "throughput": round(len(samples) / seconds, 2) if seconds > 0 else None,
+            "latency_ms": {"mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+                           "p50": percentile(latencies, 0.50), "p95": percentile(latencies, 0.95),
+                           "p99": percentile(latencies, 0.99), "max": max(latencies) if latencies else None},
+            "stages_ms": dict((stage, {"mean": round(sum(values) / len(values), 2), "p95": percentile(values, 0.95)})
+                              for stage, values in stages.items()),
+            "statuses": statuses, "error_rate": round(failed / len(samples), 4) if samples else None,
+            "unresolved_rate": round(statuses.get("unresolved", 0) / len(samples), 4) if samples else None}
+
+class Load_Test(object):
+    '''Replays address pairs against a route function and collects a sample for each request.'''
+
+    def __init__(self, route, corpus):
+        '''
+        Initialization for the load test.
+        -----------------------------
+        Inputs:
+            - route --> Function of (start_address, end_address) which returns a Route_Service.route() dictionary.
+            - corpus --> List of (start_address, end_address) pairs, replayed in order and repeated as needed.
+        '''
+        self.route = route
+        self.corpus = corpus
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def request(self, n):
+        '''Sends the n-th request of the run and records its sample.'''
+        start_address, end_address = self.corpus[n % len(self.corpus)]
+        begin = time.perf_counter()
+        try:
+            result = self.route(start_address, end_address)
+            status = result.get("status", "error")
+            timings = result.get("timings", {})
+        except service.Service_Busy:
+            status, timings = "busy", {}
+        except Exception:
+            status, timings = "error", {}
+        latency = round((time.perf_counter() - begin) * 1000, 3)
+        with self.lock:
+            self.samples.append((status, latency, timings))
+
+    def run_concurrent(self, requests, concurrency):
+        '''Closed loop: concurrency simulated users each send their next request as soon as the last one returns.'''
+        counter = iter(range(requests))
+        lock = threading.Lock()
+
+        def user():
+            while True:
+                with lock:
+                    n = next(counter, None)
+                if n is None:
+                    return
+                self.request(n)
+
+        begin = time.perf_counter()
+        users = [threading.Thread(target=user) for i in range(concurrency)]
+        for thread in users:
+            thread.start()
+        for thread in users:
+            thread.join()
+        return summarize(self.samples, time.perf_counter() - begin)
+
+    def run_rate(self, requests, rate, max_in_flight=256):
+        '''Open loop: requests are started at a fixed rate per second, however long earlier ones take.'''
+        begin = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            for n in range(requests):
+                delay = begin + n / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.request, n)
+        return summarize(self.samples, time.perf_counter() - begin)
+
+def compare(current, previous):
+    '''Prints how the main numbers of a run changed from a previous run's saved results.'''
+    print("\nCompared with the previous run:")
+    rows = [("throughput", current["throughput"], previous["throughput"])]
+    for key in ("p50", "p95", "p99"):
+        rows.append((key + " ms", current["latency_ms"][key], previous["latency_ms"][key]))
+    rows.append(("error rate", current["error_rate"], previous["error_rate"]))
+    for name, now, before in rows:
+        change = "%+.1f%%" %((now - before) / before * 100) if now is not None and before else "n/a"
+        print("    %-12s %10s --> %-10s (%s)" %(name, before, now, change))
+
+def print_summary(summary):
+    '''Prints the summary of a run.'''
+    latency = summary["latency_ms"]
+    print("%d requests in %.2f s --> %s requests/s" %(summary["requests"], summary["seconds"], summary["throughput"]))
+    print("Latency (ms): p50 %s   p95 %s   p99 %s   max %s" %(latency["p50"], latency["p95"], latency["p99"], latency["max"]))
+    for stage, values in sorted(summary["stages_ms"].items()):
+        print("    %-11s mean %8.2f ms   p95 %8.2f ms" %(stage, values["mean"], values["p95"]))
+    print("Statuses: %s   Error rate: %s   (Unresolved: %s)" %(summary["statuses"], summary["error_rate"], summary["unresolved_rate"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the routing core.")
+    parser.add_argument("--target", default="local", help="local, http, or the url of a running service.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50, help="Simultaneous users. (Closed loop)")
+    parser.add_argument("--rate", type=float, help="Requests started per second, instead of --concurrency. (Open loop)")
+    parser.add_argument("--corpus", help="File of 'start|end' address pairs.")
+    parser.add_argument("--pairs", type=int, default=200, help="Number of synthetic pairs, without --corpus.")
+    parser.add_argument("--geocoder-delay", type=float, default=0.0, help="Seconds the stub geocoder waits per lookup.")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--output", help="File the results are saved to, as JSON.")
+    parser.add_argument("--compare", help="Results saved by an earlier run to compare against.")
+    args = parser.parse_args()
+
+    corpus, places = synthetic_corpus(args.pairs)
+    if args.corpus:
+        corpus = read_corpus(args.corpus)
+        places = corpus_places(corpus)
+    stub = None
+    server = None
+    if args.target in ("local", "http"):
+        stub = install_stubs(places, args.geocoder_delay)
+    if args.target == "local":
+        route_service = service.Route_Service(args.workers, args.queue)
+        route = lambda start, end: route_service.submit(route_service.route, start, end).result()
+    elif args.target == "http":
+        server = service.make_server("127.0.0.1", 0, args.workers, args.queue)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = service.Route_Client("http://127.0.0.1:%d" %(server.server_port))
+        route = client.route
+    else:
+        client = service.Route_Client(args.target)
+        route = client.route
+
+    test = Load_Test(route, corpus)
+    if args.rate:
+        summary = test.run_rate(args.requests, args.rate)
+    else:
+        summary = test.run_concurrent(args.requests, args.concurrency)
+    summary["config"] = {"target": args.target, "requests": args.requests, "rate": args.rate,
+                         "concurrency": None if args.rate else args.concurrency, "pairs": len(corpus),
+                         "workers": args.workers, "queue": args.queue, "geocoder_delay": args.geocoder_delay,
+                         "python": sys.version.split()[0], "started": time.strftime("%Y-%m-%d %H:%M:%S")}
+    print_summary(summary)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as previous:
+            compare(summary, json.load(previous))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(summary, output, indent=2)
+    if args.target == "local":
+        route_service.shutdown()
+    if server is not None:
+        server.shutdown()
+        server.service.shutdown()
+    if stub is not None:
+        stub.close()
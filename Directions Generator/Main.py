@@ -3,11 +3,15 @@ Name: Mitchell Marino
 Date: 2018-02-20
 Program: Main.py
 Description: The main program for the Directions Generator.
+
+Usage: python Main.py [--profile] [--profile-dir DIR] [--profile-rate RATE]   (See Profiling.py)
 '''
 
 #Imports
+import argparse
 import tkinter as tk
 import Frame_GUI as Frame
+import Profiling as profiling
 
 #Class for application GUI.
 class Application_GUI(tk.Tk):
@@ -54,6 +58,14 @@ class Application_GUI(tk.Tk):
         frame = self.frames["Help"]
         frame.tkraise()
 
+#Switch on profiling of route queries if asked to.
+parser = argparse.ArgumentParser(description="Mitchell Marino's Directions Generator.")
+parser.add_argument("--profile", action="store_true", help="Profile route queries with cProfile and tracemalloc.")
+parser.add_argument("--profile-dir", help="Directory the profiles are written to.")
+parser.add_argument("--profile-rate", type=float, help="Fraction of route queries which are profiled.")
+args = parser.parse_args()
+profiling.default_profiler.configure(enabled=True if args.profile else None, directory=args.profile_dir, rate=args.profile_rate)
+
 #Launch and start application.
 window = Application_GUI()
 window.mainloop()
\ No newline at end of file
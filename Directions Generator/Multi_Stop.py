@@ -0,0 +1,145 @@
+'''
+Program: Multi_Stop.py
+Description: Routing for drivers with many stops. One region covering every stop
+             is pulled and built once, the driving distance between every pair of
+             stops is computed on it, and the stops are put in a short order with
+             the nearest neighbour heuristic followed by 2-opt. The legs are then
+             described one after another in one itinerary, arriving at each stop.
+'''
+
+#Imports
+import Data_Structures as ds
+import Functionality as pathfinder
+import Cost_Profiles as profiles
+
+#Distance used for pairs of stops that cannot be driven between.
+UNREACHABLE = float("inf")
+
+def stop_nodes_of(locations):
+    '''
+    Generate a node and street name for each geocoded stop.
+    Stops are given the ids -3, -4, -5, ... so they never clash with OSM ids or the start/end nodes.
+    '''
+    stops = []
+    for i, location in enumerate(locations):
+        #Address returned by geolocator is of format: 00, street, city, ... etc
+        street = location.address.split(", ")[1]
+        stops.append((ds.Node(-3 - i, location.latitude, location.longitude), street))
+    return stops
+
+def distance_matrix(graph, stop_nodes, profile=profiles.DEFAULT_PROFILE):
+    '''
+    Computes the driving distance between every pair of stops attached to a graph.
+    ------------------------------------------------------------------------------
+    Input:
+        graph --> A Graph which the stops have been attached to with Graph.attach_stop().
+        stop_nodes --> The stop nodes.
+        profile --> The cost profile to measure with. (See Cost_Profiles.py)
+    ------------------------------------------------------------------------------
+    Output:
+        matrix --> matrix[i][j] is the cost (metres, for the default profile) from stop i to stop j, or UNREACHABLE.
+        trees --> The Shortest_Path_Tree grown from each stop, for reading legs out of.
+    '''
+    stop_ids = set(node.get_id() for node in stop_nodes)
+    matrix = []
+    trees = []
+    for stop_node in stop_nodes:
+        #One search per stop reaches every other stop. Stops are never driven through.
+        tree = ds.Shortest_Path_Tree(graph, stop_node, terminals=stop_ids, profile=profile)
+        for other in stop_nodes:
+            if not tree.grow(target_id=other.get_id()):
+                break
+        matrix.append([tree.distance[node.get_id()] if node.get_id() in tree.settled else UNREACHABLE
+                       for node in stop_nodes])
+        trees.append(tree)
+    return matrix, trees
+
+def tour_length(matrix, order):
+    '''Returns the total distance of visiting the stops in the given order.'''
+    return sum(matrix[order[i]][order[i+1]] for i in range(len(order) - 1))
+
+def nearest_neighbour(matrix, return_to_start=False):
+    '''
+    Orders the stops by always driving to the closest stop not yet visited, starting at stop 0.
+    If return_to_start is True, the order ends back at stop 0.
+    '''
+    order = [0]
+    remaining = set(range(1, len(matrix)))
+    while remaining:
+        current = order[-1]
+        closest = min(remaining, key=lambda stop: (matrix[current][stop], stop))
+        order.append(closest)
+        remaining.remove(closest)
+    if return_to_start and len(matrix) > 1:
+        order.append(0)
+    return order
+
+def two_opt(matrix, order):
+    '''
+    Improves an order by reversing sections of it for as long as that makes it shorter.
+    The first stop (and the last, for a round trip) stays in place.
+    Distances are not assumed to be symmetric, so every candidate is measured in full.
+    '''
+    fixed_end = len(order) > 1 and order[0] == order[-1]
+    last = len(order) - 1 if fixed_end else len(order)
+    best = tour_length(matrix, order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, last - 1):
+            for j in range(i + 1, last):
+                candidate = order[:i] + order[i:j+1][::-1] + order[j+1:]
+                length = tour_length(matrix, candidate)
+                if length < best:
+                    order = candidate
+                    best = length
+                    improved = True
+    return order
+
+def order_stops(matrix, return_to_start=False):
+    '''Orders the stops with the nearest neighbour heuristic, then improves the order with 2-opt.'''
+    return two_opt(matrix, nearest_neighbour(matrix, return_to_start))
+
+def generate_multi_stop_route(addresses, return_to_start=False, profile=profiles.DEFAULT_PROFILE):
+    '''
+    Determines a short order to visit every address in, starting at the first one, and generates
+    directions for the whole trip.
+    ------------------------------------------------------------------------------
+    Input:
+        addresses --> The stops. The first address is where the trip begins.
+        return_to_start --> If True, the trip ends back at the first address.
+        profile --> The cost profile the order is optimized for. (See Cost_Profiles.py)
+    ------------------------------------------------------------------------------
+    Output:
+        {"status": "unresolved", "unresolved": [addresses]} if some addresses cannot be found. (Like Route_Service.matrix())
+        "Disconnected" if some stop cannot be driven to.
+        Otherwise, a tuple of (ordered addresses, itinerary), where the itinerary is an array of sentences
+        which arrives at every stop in turn.
+    '''
+    locations = [pathfinder.geocode(address) for address in addresses]
+    unresolved = [address for address, location in zip(addresses, locations) if location is None]
+    if unresolved != []:
+        return {"status": "unresolved", "unresolved": unresolved}
+
+    #One region, pulled and built once, covers every stop.
+    north, south, east, west = pathfinder.bounding_box_of_all(locations)
+    graph = pathfinder.build_graph(pathfinder.fetch_region(north, south, east, west))
+
+    stops = stop_nodes_of(locations)
+    for stop_node, street in stops:
+        graph.attach_stop(stop_node, street)
+    stop_nodes = [stop_node for stop_node, street in stops]
+
+    matrix, trees = distance_matrix(graph, stop_nodes, profile)
+    order = order_stops(matrix, return_to_start)
+    if tour_length(matrix, order) == UNREACHABLE:
+        return "Disconnected"
+
+    #The route of each leg, in the format of Graph.djikstra().
+    legs = []
+    for i in range(len(order) - 1):
+        tree = trees[order[i]]
+        legs.append([list(node.get_latlong()) + [street, distance] for node, street, distance in tree.path(stop_nodes[order[i+1]].get_id())])
+
+    ordered = [addresses[stop] for stop in order]
+    return ordered, pathfinder.generate_leg_directions(ordered, legs)
@@ -0,0 +1,114 @@
+'''
+Program: Prefetch.py
+Description: Speculative work done while the user is still typing. Once an address
+             field stops changing for a moment, its address is geocoded in the
+             background and the region around it is pulled and built, and once both
+             addresses are known so is the region around the two of them (unless the
+             first already covers it). Pressing "Get Directions" then mostly finds the
+             geocoding results and the graph already warm in the Route_Service.
+             Work for an address which has since been edited again is abandoned, and a
+             region which was being built for it is not kept.
+'''
+
+#Imports
+import threading
+import Route_Service as service
+
+#Seconds an address must stay unchanged before it is looked up.
+PREFETCH_DELAY = 0.75
+#Kilometres around a single address which are warmed, so most trips from it fall inside of that region.
+PREFETCH_BUFFER_KM = 3
+
+class Prefetcher(object):
+    '''Debounces address edits and warms a Route_Service with them.'''
+
+    def __init__(self, route_service, delay=PREFETCH_DELAY):
+        '''
+        Initialization for the prefetcher.
+        -----------------------------
+        Inputs:
+            - route_service --> The Route_Service whose caches are warmed.
+            - delay --> Seconds an address must stay unchanged before it is looked up.
+        '''
+        self.service = route_service
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.timers = {}        #Dictionary of field --> pending threading.Timer.
+        self.generations = {}   #Dictionary of field --> number of edits seen, to spot outdated work.
+        self.addresses = {}     #Dictionary of field --> last address scheduled.
+        self.locations = {}     #Dictionary of field --> geocoded location of its current address.
+
+    def address_changed(self, field, address):
+        '''
+        Called whenever an address field is edited. (e.g. "start" or "dest")
+        Cancels any pending work for the field, and schedules the new address to be looked up.
+        '''
+        address = address.strip()
+        with self.lock:
+            if self.addresses.get(field) == address:
+                #Keys such as the arrow keys do not change the address.
+                return
+            self.addresses[field] = address
+            generation = self.generations.get(field, 0) + 1
+            self.generations[field] = generation
+            self.locations.pop(field, None)
+            if field in self.timers:
+                self.timers[field].cancel()
+                del self.timers[field]
+            if address == "":
+                return
+            timer = threading.Timer(self.delay, self.resolve, (field, generation, address))
+            timer.daemon = True
+            self.timers[field] = timer
+        timer.start()
+
+    def current(self, field, generation):
+        '''Determine if work for an edit is still for the field's latest address. The caller must hold self.lock.'''
+        return self.generations.get(field) == generation
+
+    def resolve(self, field, generation, address):
+        '''Geocodes an address which has stopped changing, then warms the region around it, and around both addresses if both are known.'''
+        with self.lock:
+            if not self.current(field, generation):
+                return
+            self.timers.pop(field, None)
+        try:
+            location = self.service.geocode(address)
+        except Exception:
+            #Prefetching is only a head start; the search itself reports any errors.
+            return
+        with self.lock:
+            if not self.current(field, generation) or location is None:
+                return
+            self.locations[field] = location
+            warms = [({field: generation}, [location], PREFETCH_BUFFER_KM)]
+            if len(self.locations) == 2:
+                #The bounding box does not depend on which address is the start.
+                warms.append((dict(self.generations), [self.locations[key] for key in sorted(self.locations)], 1))
+        for generations, locations, buffer_km in warms:
+            try:
+                self.service.submit(self.warm, generations, locations, buffer_km)
+            except service.Service_Busy:
+                pass
+
+    def wanted(self, generations):
+        '''Determine if none of the fields of a warm, given as a dictionary of field --> generation, was edited since.'''
+        with self.lock:
+            return all(self.current(field, generation) for field, generation in generations.items())
+
+    def warm(self, generations, locations, buffer_km):
+        '''
+        Builds the region around some locations, unless their addresses were edited while this waited to run.
+        If they are edited while it is being built, the build is abandoned and the region is not kept.
+        '''
+        wanted = lambda: self.wanted(generations)
+        if wanted():
+            self.service.warm(locations, buffer_km, wanted)
+
+    def cancel(self):
+        '''Cancels all pending work, e.g. when the window is closed.'''
+        with self.lock:
+            for timer in self.timers.values():
+                timer.cancel()
+            self.timers = {}
+            self.generations = dict((field, generation + 1) for field, generation in self.generations.items())
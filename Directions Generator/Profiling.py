@@ -0,0 +1,159 @@
+'''
+Program: Profiling.py
+Description: An opt-in profiling mode for route queries. When it is switched on, a
+             sample of queries are run under cProfile and tracemalloc, and for each
+             one a .prof dump (readable with pstats or snakeviz) and a .json summary
+             of the largest allocations are written, tagged with the addresses and
+             the size of the graph. The sampling rate keeps the overhead low enough
+             to leave it on in production.
+
+Switched on with the --profile flag of Main.py, or with these environment variables:
+    DIRECTIONS_PROFILE=1            --> Profile queries.
+    DIRECTIONS_PROFILE_DIR=<path>   --> Directory the dumps are written to. (Default: "profiles")
+    DIRECTIONS_PROFILE_RATE=<0..1>  --> Fraction of queries which are profiled. (Default: 1)
+'''
+
+#Imports
+import os
+import json
+import time
+import random
+import cProfile
+import threading
+import itertools
+import tracemalloc
+
+#The query being profiled on each thread, so code deep inside a query can tag it.
+_local = threading.local()
+
+class Query_Profile(object):
+    '''The profile of a single query. Collects tags while the query runs.'''
+
+    def __init__(self, active, tags):
+        '''
+        Initialization for the profile.
+        -----------------------------
+        Inputs:
+            - active --> False if the query was not sampled, in which case nothing is recorded.
+            - tags --> Dictionary of information about the query, such as its addresses.
+        '''
+        self.active = active
+        self.tags = dict(tags)
+
+    def tag(self, **tags):
+        '''Adds information about the query, e.g. query.tag(nodes=1200)'''
+        if self.active:
+            self.tags.update(tags)
+
+class Query_Profiler(object):
+    '''Profiles a sample of queries and writes the results to a directory.'''
+
+    def __init__(self, enabled=False, directory="profiles", rate=1.0, top=25):
+        '''
+        Initialization for the profiler.
+        -----------------------------
+        Inputs:
+            - enabled --> If False, queries are never profiled.
+            - directory --> Directory the dumps are written to. Created when the first one is written.
+            - rate --> Fraction of queries which are profiled, between 0 and 1.
+            - top --> Number of allocation sites listed in each summary.
+        '''
+        self.enabled = enabled
+        self.directory = directory
+        self.rate = rate
+        self.top = top
+        self.counter = itertools.count(1)
+        #Only one cProfile profiler can run at a time, so concurrent queries are not sampled.
+        self.lock = threading.Lock()
+
+    def configure(self, enabled=None, directory=None, rate=None):
+        '''Changes the settings of the profiler. Settings which are None are left unchanged.'''
+        if enabled is not None:
+            self.enabled = enabled
+        if directory is not None:
+            self.directory = directory
+        if rate is not None:
+            self.rate = rate
+
+    def profile(self, **tags):
+        '''
+        Profiles a query, if it is sampled. Used as a context manager:
+            with profiler.profile(start_address=a, end_address=b) as query:
+                ...
+                query.tag(nodes=n)
+        '''
+        return _Profiled_Query(self, tags)
+
+    def write(self, query, profiler, snapshot, seconds, peak):
+        '''Writes the .prof dump and .json summary of a profiled query. Returns the path of the summary.'''
+        os.makedirs(self.directory, exist_ok=True)
+        name = os.path.join(self.directory, "%s-%d-%04d" %(time.strftime("%Y%m%d-%H%M%S"), os.getpid(), next(self.counter)))
+        profiler.dump_stats(name + ".prof")
+        allocations = []
+        for statistic in snapshot.statistics("lineno")[:self.top]:
+            frame = statistic.traceback[0]
+            allocations.append({"file": frame.filename, "line": frame.lineno,
+                                "size_kb": round(statistic.size / 1024, 1), "count": statistic.count})
+        summary = {"tags": query.tags, "seconds": round(seconds, 4), "peak_traced_kb": round(peak / 1024, 1),
+                   "profile": os.path.basename(name + ".prof"), "top_allocations": allocations}
+        with open(name + ".json", "w", encoding="utf-8") as output:
+            json.dump(summary, output, indent=2, default=str)
+        return name + ".json"
+
+class _Profiled_Query(object):
+    '''Context manager returned by Query_Profiler.profile().'''
+
+    def __init__(self, owner, tags):
+        self.owner = owner
+        self.tags = tags
+
+    def __enter__(self):
+        owner = self.owner
+        sampled = owner.enabled and random.random() < owner.rate and owner.lock.acquire(blocking=False)
+        self.query = Query_Profile(sampled, self.tags)
+        if sampled:
+            #Only stop tracemalloc afterwards if it was not already tracing for someone else.
+            self.started_tracing = not tracemalloc.is_tracing()
+            if self.started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            _local.query = self.query
+            self.profiler = cProfile.Profile()
+            self.begin = time.perf_counter()
+            self.profiler.enable()
+        return self.query
+
+    def __exit__(self, kind, value, traceback):
+        if not self.query.active:
+            return False
+        try:
+            self.profiler.disable()
+            _local.query = None
+            seconds = time.perf_counter() - self.begin
+            snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+            peak = tracemalloc.get_traced_memory()[1]
+            if self.started_tracing:
+                tracemalloc.stop()
+            if kind is not None:
+                self.query.tag(error=repr(value))
+            self.owner.write(self.query, self.profiler, snapshot, seconds, peak)
+        finally:
+            self.owner.lock.release()
+        return False
+
+def current_query():
+    '''Returns the Query_Profile being recorded on this thread, or None.'''
+    return getattr(_local, "query", None)
+
+def tag_graph(graph):
+    '''Tags the query being profiled on this thread, if any, with the size of the graph it runs on.'''
+    query = current_query()
+    if query is not None:
+        query.tag(nodes=len(graph.node_list), edges=graph.edge_count(), street_names=len(graph.names))
+        if graph.pruning is not None:
+            query.tag(pruned_nodes=graph.pruning["removed_nodes"], pruned_edges=graph.pruning["removed_edges"])
+
+#Profiler shared by the whole application, set up from the environment.
+default_profiler = Query_Profiler(os.environ.get("DIRECTIONS_PROFILE", "") not in ("", "0"),
+                                  os.environ.get("DIRECTIONS_PROFILE_DIR", "profiles"),
+                                  float(os.environ.get("DIRECTIONS_PROFILE_RATE", "1")))
@@ -0,0 +1,245 @@
+'''
+Program: Pruning.py
+Description: Removes the parts of a graph which can never be on the route between its
+             start and end nodes, before the graph is searched.
+             - Intersections which cannot be reached from the start node, or from which
+               the end node cannot be reached. (Islands, and parts cut off by one way streets)
+             - Dead-end trees, such as cul-de-sacs and parking aisles, are collapsed into the
+               intersection they hang from. A route could only go in and come back out the
+               same way, so only the branches leading to an endpoint's street are kept.
+             - Optionally, ways of low-value highway classes (such as service roads) are left
+               out by build_graph(), unless an endpoint is on them.
+             The shortest route is the same on the pruned graph as on the whole graph.
+
+Usage: python Pruning.py [--sizes 20 40] [--queries N] [--exclude service track]
+       (Prunes synthetic grids cluttered with cul-de-sacs, parking lots and an island,
+        and reports what was removed and how the search time changed. Engines which
+        preprocess the graph, such as alt, have that time reported on its own)
+
+PLEASE NOTE: A pruned graph only serves the endpoints it was pruned for. Regional graphs
+             which are routed on many times (See Route_Service.py) are never pruned.
+'''
+
+#Imports
+import os
+import time
+import random
+import argparse
+import Cost_Profiles as profiles
+
+#Whether build_graph() prunes the graph of a single route. It can be switched off with DIRECTIONS_PRUNE=0.
+PRUNE = os.environ.get("DIRECTIONS_PRUNE", "1") != "0"
+#Highway classes which are rarely worth driving through, for use with build_graph(exclude=...).
+LOW_VALUE_HIGHWAYS = frozenset(("service", "track"))
+
+def is_excluded(way, exclude, endpoint_streets):
+    '''
+    Returns whether build_graph() should leave out an OSM way.
+    ------------------------------------------------------------------------------
+    Input:
+        way --> The way's OSM attributes.
+        exclude --> Highway classes to leave out.
+        endpoint_streets --> Lowercase names of the endpoints' streets, which are never left out.
+    '''
+    if profiles.first_value(way.get('highway')) not in exclude:
+        return False
+    names = way.get('name')
+    names = names if isinstance(names, list) else [names]
+    return not any(isinstance(name, str) and name.lower() in endpoint_streets for name in names)
+
+def reachable(first, edges):
+    '''Returns the set of node ids reachable from the ids in first, where edges maps an id to the ids it leads to.'''
+    seen = set(first)
+    stack = list(first)
+    while stack != []:
+        for v in edges(stack.pop()):
+            if v not in seen:
+                seen.add(v)
+                stack.append(v)
+    return seen
+
+def prune(graph):
+    '''
+    Removes every intersection of a graph which can never be on the route between its start and end nodes.
+    The graph is changed in place, and must have its endpoints attached.
+    ------------------------------------------------------------------------------
+    Output:
+        A dictionary of counts, which is also kept as graph.pruning:
+            nodes, edges --> Size of the graph before pruning.
+            unreachable_nodes --> Intersections not on any path from the start node to the end node.
+            dead_end_nodes --> Intersections in dead-end trees.
+            removed_nodes, removed_edges --> Everything removed.
+    '''
+    nodes, edges = len(graph.node_list), graph.edge_count()
+    start_id, end_id = graph.start_node.get_id(), graph.end_node.get_id()
+    reverse = graph.reverse_edgelists()
+
+    #Intersections on some path from the start node to the end node. (Custom nodes such as stops are left alone)
+    forward = reachable([start_id], lambda u: (v for v in graph.get_node(u).get_edgelist() if v in graph.node_list))
+    backward = reachable([end_id], lambda v: (edge[0].get_id() for edge in reverse.get(v, ()) if edge[0].get_id() in graph.node_list))
+    keep = set(node_id for node_id in graph.node_list if node_id < 0 or (node_id in forward and node_id in backward))
+    unreachable = len(graph.node_list) - len(keep)
+
+    #Neighbours of each kept intersection, in either direction.
+    neighbours = {node_id: set() for node_id in keep}
+    for node_id in keep:
+        for v in graph.node_list[node_id].get_edgelist():
+            if v in keep and v != node_id:
+                neighbours[node_id].add(v)
+                neighbours[v].add(node_id)
+
+    #The intersections the endpoints attach to are never removed, nor are custom nodes.
+    terminals = set(graph.start_node.get_edgelist())
+    terminals.update(edge[0].get_id() for edge in reverse.get(end_id, ()))
+    terminals.update(node_id for node_id in keep if node_id < 0)
+
+    #Peel dead-end trees from their leaves inwards, until only the intersection each one hangs from is left.
+    dead_ends = 0
+    leaves = [node_id for node_id in keep if len(neighbours[node_id]) <= 1 and node_id not in terminals]
+    queued = set(leaves)
+    while leaves != []:
+        node_id = leaves.pop()
+        keep.discard(node_id)
+        dead_ends += 1
+        for v in neighbours.pop(node_id):
+            neighbours[v].discard(node_id)
+            if len(neighbours[v]) <= 1 and v not in terminals and v not in queued:
+                queued.add(v)
+                leaves.append(v)
+
+    #Remove the intersections, every edge into them, and their entries in the street index.
+    for node_id in [node_id for node_id in graph.node_list if node_id not in keep]:
+        for edge in reverse.get(node_id, ()):
+            edge[0].get_edgelist().pop(node_id, None)
+        del graph.node_list[node_id]
+    for street_key in list(graph.street_index):
+        entries = set(entry for entry in graph.street_index[street_key] if entry[0] in keep)
+        if entries:
+            graph.street_index[street_key] = entries
+        else:
+            del graph.street_index[street_key]
+    graph.derived = {}
+
+    graph.pruning = {"nodes": nodes, "edges": edges, "unreachable_nodes": unreachable, "dead_end_nodes": dead_ends,
+                     "removed_nodes": nodes - len(graph.node_list), "removed_edges": edges - graph.edge_count()}
+    return graph.pruning
+
+def same_length(route1, route2):
+    '''Returns whether two results of find_route() are equally long. (Routes which tie may differ in their rows)'''
+    if route1 == "Disconnected" or route2 == "Disconnected":
+        return route1 == route2
+    return abs(sum(row[3] for row in route1) - sum(row[3] for row in route2)) < 1e-6
+
+def add_clutter(region, seed=0, share=0.3):
+    '''
+    Adds what a real OSM region has and a synthetic grid does not, to a Synthetic_Region. (See Load_Test.py)
+        - A cul-de-sac of 1 to 3 intersections hanging from about share of the grid's intersections.
+        - A parking lot (a loop of service road) hanging from about share / 2 of them.
+          A loop is not a dead-end tree, so these are only removed by excluding "service".
+        - An island of streets to the east of the grid, which no route can reach.
+    '''
+    import Load_Test as load_test
+    generator = random.Random(seed)
+    step = load_test.GRID_STEP
+    next_id = [1]
+
+    def add_node(latitude, longitude):
+        node_id = next_id[0]
+        next_id[0] += 1
+        region.node[node_id] = {"y": latitude, "x": longitude}
+        return node_id
+
+    for node_id, position in sorted(region.node.items()):
+        if generator.random() < share:
+            u = node_id
+            for depth in range(generator.randint(1, 3)):
+                v = add_node(position["y"] + step * 0.2 * (depth + 1), position["x"] + step * 0.15)
+                region.add_street(u, v, step * 0.2 * load_test.METRES_PER_DEGREE, "Court %d" %(node_id % 1000), "residential")
+                u = v
+        if generator.random() < share / 2:
+            corners = [add_node(position["y"] - step * 0.2 * a, position["x"] + step * 0.2 * b) for a, b in ((1, 0), (1, 1), (2, 1), (2, 0))]
+            region.add_street(node_id, corners[0], step * 0.2 * load_test.METRES_PER_DEGREE, "Lot %d" %(node_id % 1000), "service")
+            for a, b in zip(corners, corners[1:] + corners[:1]):
+                region.add_street(a, b, step * 0.2 * load_test.METRES_PER_DEGREE, "Lot %d" %(node_id % 1000), "service")
+
+    east = max(position["x"] for position in region.node.values())
+    island = [[add_node(load_test.GRID_ORIGIN[0] + i * step, east + (j + 2) * step) for j in range(4)] for i in range(4)]
+    for i in range(4):
+        for j in range(3):
+            region.add_street(island[i][j], island[i][j + 1], step * load_test.METRES_PER_DEGREE, "Island Road", "residential")
+            region.add_street(island[j][i], island[j + 1][i], step * load_test.METRES_PER_DEGREE, "Island Road", "residential")
+    return region
+
+def pruning_report(sizes, queries=5, exclude=(), seed=0):
+    '''
+    Routes on cluttered synthetic grids with and without pruning, with every available search engine.
+    (See Search_Backends.py) Each route is checked to be as long either way.
+    ------------------------------------------------------------------------------
+    Output:
+        A list of (size, nodes, edges, removed_nodes, removed_edges, prune_ms, engine, prepare_ms, search_ms,
+        pruned_prepare_ms, pruned_search_ms, same_length) for each grid and engine, with the counts and times
+        averaged over the queries. prepare_ms is the engine's preprocessing of the graph (See Search_Backend.prepare()),
+        which is not part of search_ms.
+    '''
+    #Only needed for the report, which builds its graphs from the synthetic grid.
+    import Functionality as pathfinder
+    import Data_Structures as ds
+    import Load_Test as load_test
+    import Search_Backends as backends
+
+    results = []
+    for size in sizes:
+        north = load_test.GRID_ORIGIN[0] + (size - 1) * load_test.GRID_STEP
+        east = load_test.GRID_ORIGIN[1] + (size - 1) * load_test.GRID_STEP
+        region = add_clutter(load_test.Synthetic_Region(north, load_test.GRID_ORIGIN[0], east, load_test.GRID_ORIGIN[1]), seed)
+        generator = random.Random(seed)
+        totals = {}
+        for query in range(queries):
+            start_row, start_column, end_row, end_column = (generator.randrange(size - 1) for i in range(4))
+            start = load_test.grid_address(start_row, start_column)[1]
+            end = load_test.grid_address(end_row, end_column)[1]
+            endpoints = ("Row %d Street" %(start_row), ds.Node(-1, start[1], start[2]), "Row %d Street" %(end_row), ds.Node(-2, end[1], end[2]))
+            for name in backends.available_backends():
+                backend = backends.get_backend(name)
+                whole = pathfinder.build_graph(region, *endpoints, prune=False)
+                begin = time.perf_counter()
+                backend.prepare(whole)
+                prepared_at = time.perf_counter()
+                route = pathfinder.find_route(whole, backend=name)
+                search = time.perf_counter() - prepared_at
+                prepare_time = prepared_at - begin
+
+                pruned = pathfinder.build_graph(region, *endpoints, prune=False, exclude=exclude)
+                begin = time.perf_counter()
+                prune(pruned)
+                pruned_at = time.perf_counter()
+                backend.prepare(pruned)
+                prepared_at = time.perf_counter()
+                pruned_route = pathfinder.find_route(pruned, backend=name)
+                pruned_search = time.perf_counter() - prepared_at
+
+                total = totals.setdefault(name, [0] * 10)
+                for i, value in enumerate((len(whole.node_list), whole.edge_count(), len(whole.node_list) - len(pruned.node_list),
+                                           whole.edge_count() - pruned.edge_count(), pruned_at - begin, prepare_time, search,
+                                           prepared_at - pruned_at, pruned_search, same_length(route, pruned_route))):
+                    total[i] += value
+        for name, total in totals.items():
+            results.append((size, total[0] / queries, total[1] / queries, total[2] / queries, total[3] / queries,
+                            total[4] / queries * 1000, name, total[5] / queries * 1000, total[6] / queries * 1000,
+                            total[7] / queries * 1000, total[8] / queries * 1000, total[9]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report what pruning removes from cluttered synthetic grids, and its effect on search time.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 40], help="Rows (and columns) of each grid.")
+    parser.add_argument("--queries", type=int, default=5, help="Routes per grid.")
+    parser.add_argument("--exclude", nargs="*", default=[], help="Highway classes to leave out, such as: service track")
+    args = parser.parse_args()
+
+    print("Size    Nodes    Edges  Removed nodes  Removed edges  Prune ms  Engine   Prepare ms  Search ms  Pruned prepare ms  Pruned ms  Same length")
+    for (size, nodes, edges, removed_nodes, removed_edges, prune_ms, name, prepare_ms, search_ms, pruned_prepare_ms, pruned_ms,
+         same) in pruning_report(args.sizes, args.queries, frozenset(args.exclude)):
+        print("%4d %8d %8d %14d %14d %9.2f  %-8s %10.2f %10.2f %18.2f %10.2f %8d/%d" %(size, nodes, edges, removed_nodes, removed_edges,
+                                                                                     prune_ms, name, prepare_ms, search_ms,
+                                                                                     pruned_prepare_ms, pruned_ms, same, args.queries))
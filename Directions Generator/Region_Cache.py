@@ -0,0 +1,202 @@
+'''
+Program: Region_Cache.py
+Description: Keeps regional graphs warm in memory within a memory budget. The size of
+             each graph, including whatever preprocessing has been stored with it,
+             is measured when it is added, and the least recently used regions are
+             evicted whenever the total goes over the budget. Hits, misses and
+             evictions are counted so the budget can be tuned.
+
+PLEASE NOTE: Evicting a region only removes it from the cache. A query which is already
+             running on it keeps its own reference, so the graph stays valid until that
+             query finishes and is freed afterwards.
+'''
+
+#Imports
+import sys
+import types
+import threading
+from collections import OrderedDict
+
+class Region(object):
+    '''A regional graph which is kept warm by the service.'''
+
+    def __init__(self, north, south, east, west, graph):
+        '''
+        Initialization for the region.
+        -----------------------------
+        Inputs:
+            - north, south, east, west --> The bounding box the graph was pulled from.
+            - graph --> The Graph built from the bounding box, without endpoints.
+        '''
+        self.north = north
+        self.south = south
+        self.east = east
+        self.west = west
+        self.graph = graph
+        #Searches store their state on the graph's nodes, so only one search may run on a region at once.
+        self.lock = threading.Lock()
+        #Bytes used by the graph, measured by the cache...
+        self.size = 0
+        #...of which this many are held by its cached shortest path trees. (See charge_trees())
+        self.tree_size = 0
+
+    def get_bounding_box(self):
+        '''Returns the bounding box of the region as (north, south, east, west).'''
+        return self.north, self.south, self.east, self.west
+
+    def contains(self, north, south, east, west):
+        '''Determine if the given bounding box lies completely inside of the region.'''
+        return north <= self.north and south >= self.south and east <= self.east and west >= self.west
+
+    def covers(self, latitude, longitude):
+        '''Determine if a coordinate lies inside of the region.'''
+        return self.south <= latitude <= self.north and self.west <= longitude <= self.east
+
+#Objects which are shared with the rest of the program, and never counted as part of a graph.
+SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+def measure_size(root):
+    '''
+    Estimates the bytes used by an object and everything it refers to, counting each object once.
+    Follows dictionaries, lists, tuples, sets and the attributes of objects. (Including the
+    Nodes of a Graph, its Street_Names and anything stored in Graph.derived)
+    Objects with a memory_size() method (such as the Tree_Cache of a graph) estimate their own size
+    instead, since walking them would be slow.
+    Walks the objects with a stack, so long chains of nodes do not hit the recursion limit.
+    '''
+    seen = set()
+    total = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SHARED_TYPES) or obj is None:
+            continue
+        seen.add(id(obj))
+        if callable(getattr(obj, "memory_size", None)) and not isinstance(obj, type):
+            total += obj.memory_size()
+            continue
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, (str, bytes, int, float, bool)):
+            continue
+        else:
+            if hasattr(obj, "__dict__"):
+                stack.append(obj.__dict__)
+            for slot in getattr(type(obj), "__slots__", ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return total
+
+def tree_size(graph):
+    '''Returns the estimated bytes of the shortest path trees cached on a graph. (See Data_Structures.Tree_Cache)'''
+    trees = graph.derived.get("trees")
+    return 0 if trees is None else trees.memory_size()
+
+class Region_Cache(object):
+    '''Least recently used cache of Regions, held within a memory budget.'''
+
+    def __init__(self, budget_mb=512):
+        '''
+        Initialization for the cache.
+        -----------------------------
+        Inputs:
+            - budget_mb --> Most megabytes that the cached graphs may use together.
+                            A single region larger than the budget is still kept, on its own.
+        '''
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.regions = OrderedDict()    #Bounding box --> Region, least recently used first.
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def find(self, north, south, east, west):
+        '''Returns a cached region which contains the bounding box, or None. Does not count as a use.'''
+        with self.lock:
+            return self._find(north, south, east, west)
+
+    def _find(self, north, south, east, west):
+        '''Same as find(). The caller must hold self.lock.'''
+        for region in reversed(self.regions.values()):
+            if region.contains(north, south, east, west):
+                return region
+        return None
+
+    def get(self, north, south, east, west):
+        '''Returns a cached region which contains the bounding box, or None. Counts as a hit or a miss.'''
+        with self.lock:
+            region = self._find(north, south, east, west)
+            if region is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.regions.move_to_end(region.get_bounding_box())
+            return region
+
+    def add(self, region):
+        '''Measures a new region and adds it to the cache, evicting others to stay within the budget.'''
+        size = measure_size(region.graph)
+        with self.lock:
+            key = region.get_bounding_box()
+            if key in self.regions:
+                self.size -= self.regions.pop(key).size
+            region.size = size
+            region.tree_size = tree_size(region.graph)
+            self.regions[key] = region
+            self.size += size
+            self.evict()
+        return region
+
+    def resize(self, region):
+        '''
+        Measures a cached region again, after its graph has changed or gained preprocessing,
+        and evicts others if it no longer fits.
+        '''
+        size = measure_size(region.graph)
+        with self.lock:
+            if self.regions.get(region.get_bounding_box()) is not region:
+                return
+            self.size += size - region.size
+            region.size = size
+            region.tree_size = tree_size(region.graph)
+            self.evict()
+
+    def charge_trees(self, region):
+        '''
+        Updates the size of a cached region for the shortest path trees its searches have cached
+        since it was measured, without measuring the whole graph again, and evicts others if it no
+        longer fits. The caller must hold region.lock, so the trees do not change while they are counted.
+        '''
+        trees = tree_size(region.graph)
+        with self.lock:
+            if self.regions.get(region.get_bounding_box()) is not region:
+                return
+            self.size += trees - region.tree_size
+            region.size += trees - region.tree_size
+            region.tree_size = trees
+            self.evict()
+
+    def evict(self):
+        '''Evicts least recently used regions until the cache is within its budget. The caller must hold self.lock.'''
+        while self.size > self.budget and len(self.regions) > 1:
+            key, region = self.regions.popitem(last=False)
+            self.size -= region.size
+            self.evictions += 1
+
+    def values(self):
+        '''Returns a list of the cached regions.'''
+        with self.lock:
+            return list(self.regions.values())
+
+    def metrics(self):
+        '''Returns a dictionary of the cache's usage, which can be sent as JSON.'''
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"regions": len(self.regions), "size_mb": round(self.size / 1024 / 1024, 2),
+                    "budget_mb": round(self.budget / 1024 / 1024, 2), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hit_rate": round(self.hits / lookups, 3) if lookups else None}
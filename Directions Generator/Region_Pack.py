@@ -0,0 +1,459 @@
+'''
+Program: Region_Pack.py
+Description: Offline region packs, so routes can be found without the OSM servers.
+             The build step reads a local OSM extract, keeps the streets which can
+             be driven on, and writes a pack with the intersections, the streets
+             between them (names, lengths, highway types and speed limits), a grid
+             spatial index and the addresses found in the extract. When packs are
+             installed, Functionality.fetch_region() and Functionality.geocode()
+             answer from them first, with no network I/O at all.
+
+Usage: python Region_Pack.py extract output.pack [--bbox NORTH SOUTH EAST WEST] [--cell DEGREES]
+       python Region_Pack.py --info output.pack
+    extract --> An .osm XML file, optionally compressed (.osm.bz2, .osm.gz), or a .pbf file
+                when pyosmium is installed. (pip install osmium)
+
+Packs are found in the directories listed in the DIRECTIONS_PACKS environment variable,
+separated like PATH. Set DIRECTIONS_OFFLINE=1 to never use the network, even for areas
+and addresses which no pack covers.
+'''
+
+#Imports
+import os
+import bz2
+import gzip
+import json
+import math
+import argparse
+import threading
+import xml.etree.ElementTree as ElementTree
+import Geocoder as geocoding
+try:
+    import osmium     #Only needed to read .pbf extracts.
+except ImportError:
+    osmium = None
+
+#Version of the pack file layout. (2: edges carry the id of the OSM way they come from)
+PACK_FORMAT = 2
+#Highway types which are driven on, as in OSMNX's "drive" network.
+DRIVE_HIGHWAYS = frozenset(("motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+                            "secondary", "secondary_link", "tertiary", "tertiary_link", "unclassified",
+                            "residential", "living_street", "road", "service"))
+#Service roads which are not part of the drive network.
+EXCLUDED_SERVICES = frozenset(("parking", "parking_aisle", "driveway", "private", "emergency_access"))
+#Access tags which close a way to cars.
+NO_ACCESS = frozenset(("no", "private"))
+#Size of the cells of the spatial index, in degrees. (About 1 km north-south)
+CELL_SIZE = 0.01
+EARTH_RADIUS = 6371008.8
+
+class Pack_Error(Exception):
+    '''Raised when a pack or extract cannot be read, or no pack covers an area while offline.'''
+    pass
+
+def is_drivable(tags):
+    '''Determine if a way with the given OSM tags is part of the drive network.'''
+    if tags.get("highway") not in DRIVE_HIGHWAYS or tags.get("area") == "yes":
+        return False
+    if tags.get("access") in NO_ACCESS or tags.get("motor_vehicle") in NO_ACCESS or tags.get("motorcar") in NO_ACCESS:
+        return False
+    return tags.get("service") not in EXCLUDED_SERVICES
+
+def oneway_of(tags):
+    '''Returns 1 if a way may only be driven in the order of its nodes, -1 if only against it, and 0 if both.'''
+    oneway = tags.get("oneway")
+    if oneway in ("yes", "true", "1") or (oneway is None and tags.get("junction") == "roundabout"):
+        return 1
+    if oneway in ("-1", "reverse"):
+        return -1
+    return 0
+
+def haversine(latitude1, longitude1, latitude2, longitude2):
+    '''Distance in metres between two coordinates, along the surface of a spherical earth.'''
+    phi1 = math.radians(latitude1)
+    phi2 = math.radians(latitude2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
+
+def normalize(text):
+    '''Lowercase words of an address, with punctuation removed, for matching. e.g. "12 Main St." --> "12 main st"'''
+    return " ".join("".join(character if character.isalnum() else " " for character in text.lower()).split())
+
+def address_of(tags):
+    '''Returns (display_name, search_key) for OSM address tags, or None if they have no house number and street.'''
+    number = tags.get("addr:housenumber")
+    street = tags.get("addr:street")
+    if number is None or street is None:
+        return None
+    #Display names follow Nominatim's "number, street, city" order, which endpoint_nodes_of() relies on.
+    parts = [number, street] + [tags[key] for key in ("addr:city", "addr:postcode") if key in tags]
+    return ", ".join(parts), normalize(number + " " + street)
+
+def open_extract(path):
+    '''Opens an OSM XML extract for reading as bytes, decompressing .bz2 and .gz files.'''
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def extract_elements(path):
+    '''
+    Yields the nodes, ways and relations of an OSM XML extract in order. Each one is dropped from the
+    parsed tree once the next is read, so reading a whole extract takes no more memory than one element.
+    '''
+    with open_extract(path) as extract:
+        context = ElementTree.iterparse(extract, events=("start", "end"))
+        event, root = next(context)
+        for event, element in context:
+            if event == "end" and element.tag in ("node", "way", "relation"):
+                yield element
+                root.clear()
+
+def read_extract(path):
+    '''
+    Reads the parts of an OSM extract which a pack needs.
+    The extract is read twice: first its ways, to find the nodes which the drive network and the
+    addressed buildings use, then its nodes, keeping the coordinates of only those. (Most nodes of
+    an extract outline buildings, land use and the like, which a pack has no use for)
+    ------------------------------------------------------------------------------
+    Output:
+        coordinates --> Dictionary of node id --> (latitude, longitude) for the nodes which the ways use.
+        ways --> List of (way id, node ids, tags) for every way in the drive network.
+        addresses --> List of (display_name, search_key, latitude, longitude)
+    '''
+    if path.endswith(".pbf"):
+        return read_pbf(path)
+    used = set()
+    ways = []
+    outlines = []
+    coordinates = {}
+    addresses = []
+    try:
+        for element in extract_elements(path):
+            if element.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+                refs = [int(nd.get("ref")) for nd in element.iter("nd")]
+                if is_drivable(tags):
+                    ways.append((int(element.get("id")), refs, tags))
+                    used.update(refs)
+                address = address_of(tags)
+                if address is not None and refs != []:
+                    #Buildings are tagged on their outline; use its first corner.
+                    outlines.append((address, refs[0]))
+                    used.add(refs[0])
+        for element in extract_elements(path):
+            if element.tag != "node":
+                #Nodes come before ways in an extract, so there are none left to read.
+                break
+            tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+            address = address_of(tags)
+            node_id = int(element.get("id"))
+            if address is not None or node_id in used:
+                latitude, longitude = float(element.get("lat")), float(element.get("lon"))
+                if node_id in used:
+                    coordinates[node_id] = (latitude, longitude)
+                if address is not None:
+                    addresses.append(address + (latitude, longitude))
+    except (OSError, ElementTree.ParseError) as err:
+        raise Pack_Error("Could not read the extract %s (%s)" %(path, err))
+    addresses.extend(address + coordinates[ref] for address, ref in outlines if ref in coordinates)
+    return coordinates, ways, addresses
+
+def read_pbf(path):
+    '''Same as read_extract(), for .pbf extracts, which are also read twice. Needs pyosmium.'''
+    if osmium is None:
+        raise Pack_Error("Reading .pbf extracts needs pyosmium. Install it with: pip install osmium")
+
+    class Way_Handler(osmium.SimpleHandler):
+        def __init__(self):
+            osmium.SimpleHandler.__init__(self)
+            self.used = set()
+            self.ways = []
+            self.outlines = []
+
+        def way(self, way):
+            tags = dict(way.tags)
+            refs = [nd.ref for nd in way.nodes]
+            if is_drivable(tags):
+                self.ways.append((way.id, refs, tags))
+                self.used.update(refs)
+            address = address_of(tags)
+            if address is not None and refs != []:
+                self.outlines.append((address, refs[0]))
+                self.used.add(refs[0])
+
+    class Node_Handler(osmium.SimpleHandler):
+        def __init__(self, used):
+            osmium.SimpleHandler.__init__(self)
+            self.used = used
+            self.coordinates = {}
+            self.addresses = []
+
+        def node(self, node):
+            if node.location.valid():
+                if node.id in self.used:
+                    self.coordinates[node.id] = (node.location.lat, node.location.lon)
+                address = address_of(dict(node.tags))
+                if address is not None:
+                    self.addresses.append(address + (node.location.lat, node.location.lon))
+
+    ways = Way_Handler()
+    try:
+        ways.apply_file(path)
+        nodes = Node_Handler(ways.used)
+        nodes.apply_file(path)
+    except RuntimeError as err:
+        raise Pack_Error("Could not read the extract %s (%s)" %(path, err))
+    nodes.addresses.extend(address + nodes.coordinates[ref] for address, ref in ways.outlines if ref in nodes.coordinates)
+    return nodes.coordinates, ways.ways, nodes.addresses
+
+def cell_of(latitude, longitude, cell):
+    '''The (row, column) of the spatial index cell which a coordinate lies in.'''
+    return int(math.floor(latitude / cell)), int(math.floor(longitude / cell))
+
+def build_pack(coordinates, ways, addresses, bbox=None, cell=CELL_SIZE):
+    '''
+    Turns the contents of an extract into a pack.
+    ------------------------------------------------------------------------------
+    Ways are split at intersections (nodes shared by several ways, and the ends of
+    each way), like the simplified graphs of OSMNX, so only intersections become nodes.
+    ------------------------------------------------------------------------------
+    Input:
+        coordinates, ways, addresses --> As given by read_extract().
+        bbox --> Optional (north, south, east, west). Streets with neither end inside are left out.
+        cell --> Size of the spatial index cells, in degrees.
+    ------------------------------------------------------------------------------
+    Output:
+        (header, body) dictionaries, as written by write_pack().
+    '''
+    def inside(latitude, longitude):
+        return bbox is None or (bbox[1] <= latitude <= bbox[0] and bbox[3] <= longitude <= bbox[2])
+
+    #Nodes used more than once (by several ways, or twice by one) are intersections, as are the ends of ways.
+    uses = {}
+    for way_id, refs, tags in ways:
+        for ref in refs:
+            uses[ref] = uses.get(ref, 0) + 1
+    nodes = {}
+    edges = []
+    for way_id, refs, tags in ways:
+        refs = [ref for ref in refs if ref in coordinates]
+        if len(refs) < 2:
+            continue
+        oneway = oneway_of(tags)
+        if oneway == -1:
+            refs.reverse()
+        way = [tags.get("name"), tags.get("highway"), tags.get("maxspeed"), way_id]
+        start = refs[0]
+        length = 0.0
+        for previous, ref in zip(refs, refs[1:]):
+            length += haversine(*(coordinates[previous] + coordinates[ref]))
+            if uses[ref] > 1 or ref == refs[-1]:
+                if start != ref and (inside(*coordinates[start]) or inside(*coordinates[ref])):
+                    edges.append([start, ref, length] + way)
+                    if oneway == 0:
+                        edges.append([ref, start, length] + way)
+                    nodes[start] = coordinates[start]
+                    nodes[ref] = coordinates[ref]
+                start = ref
+                length = 0.0
+
+    #The spatial index lists the edges which start or end in each cell.
+    cells = {}
+    for index, edge in enumerate(edges):
+        for node_id in edge[:2]:
+            entries = cells.setdefault(cell_of(*nodes[node_id], cell), [])
+            if entries == [] or entries[-1] != index:
+                entries.append(index)
+    kept = [address for address in addresses if inside(address[2], address[3])]
+
+    if bbox is None:
+        latitudes = [latitude for latitude, longitude in nodes.values()] or [0]
+        longitudes = [longitude for latitude, longitude in nodes.values()] or [0]
+        bbox = (max(latitudes), min(latitudes), max(longitudes), min(longitudes))
+    header = {"format": PACK_FORMAT, "bounds": list(bbox), "cell": cell,
+              "nodes": len(nodes), "edges": len(edges), "addresses": len(kept)}
+    body = {"nodes": [[node_id, latitude, longitude] for node_id, (latitude, longitude) in nodes.items()],
+            "edges": edges, "cells": [[row, column, entries] for (row, column), entries in cells.items()],
+            "addresses": kept}
+    return header, body
+
+def write_pack(header, body, path):
+    '''
+    Writes a pack as gzip compressed JSON: the header on the first line and the body on the second,
+    so that the header can be read without loading the whole pack. The file is replaced in one step.
+    '''
+    temporary = path + ".tmp"
+    with gzip.open(temporary, "wt", encoding="utf-8") as output:
+        output.write(json.dumps(header) + "\n")
+        output.write(json.dumps(body) + "\n")
+    os.replace(temporary, path)
+
+def read_header(path):
+    '''Reads only the header of a pack.'''
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as saved:
+            header = json.loads(saved.readline())
+    except (OSError, ValueError) as err:
+        raise Pack_Error("Could not read the pack %s (%s)" %(path, err))
+    if header.get("format") != PACK_FORMAT:
+        raise Pack_Error("The pack %s was written in format %s, but format %d is needed. Build it again." %(path, header.get("format"), PACK_FORMAT))
+    return header
+
+def load_pack(path):
+    '''Loads a whole pack. Returns a Region_Pack.'''
+    header = read_header(path)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as saved:
+            saved.readline()
+            body = json.loads(saved.readline())
+    except (OSError, ValueError) as err:
+        raise Pack_Error("Could not read the pack %s (%s)" %(path, err))
+    return Region_Pack(header, body)
+
+class Region_Pack(object):
+    '''A loaded pack, which cuts regions out of its streets and looks up its addresses.'''
+
+    def __init__(self, header, body):
+        '''
+        Initialization for the pack.
+        -----------------------------
+        Inputs:
+            - header, body --> The dictionaries written by write_pack().
+        '''
+        self.bounds = tuple(header["bounds"])
+        self.cell = header["cell"]
+        self.nodes = {node_id: (latitude, longitude) for node_id, latitude, longitude in body["nodes"]}
+        self.edges = body["edges"]
+        self.cells = {(row, column): entries for row, column, entries in body["cells"]}
+        #Dictionary of search key --> (display_name, latitude, longitude)
+        self.addresses = {key: (display, latitude, longitude) for display, key, latitude, longitude in body["addresses"]}
+
+    def covers(self, north, south, east, west):
+        '''Determine if a bounding box lies completely inside of the pack.'''
+        return north <= self.bounds[0] and south >= self.bounds[1] and east <= self.bounds[2] and west >= self.bounds[3]
+
+    def region(self, north, south, east, west):
+        '''
+        Cuts the streets of a bounding box out of the pack, in place of Functionality.fetch_region().
+        Streets with at least one end inside the box are kept whole, like OSMNX's truncate_by_edge.
+        '''
+        first_row, first_column = cell_of(south, west, self.cell)
+        last_row, last_column = cell_of(north, east, self.cell)
+        found = set()
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                found.update(self.cells.get((row, column), ()))
+        region = Pack_Region()
+        for index in sorted(found):
+            start_id, end_id, length, name, highway, maxspeed, way_id = self.edges[index]
+            if any(south <= self.nodes[node_id][0] <= north and west <= self.nodes[node_id][1] <= east for node_id in (start_id, end_id)):
+                region.add_street(start_id, self.nodes[start_id], end_id, self.nodes[end_id], length, name, highway, maxspeed, way_id)
+        return region
+
+    def geocode(self, address):
+        '''
+        Looks up an address of the extract, such as "12 Main Street, Springfield" or "12, Main Street".
+        Returns a geopy location, or None if the pack does not know it.
+        '''
+        parts = [normalize(part) for part in address.split(",")]
+        candidates = [parts[0]]
+        if len(parts) > 1 and parts[0].isdigit():
+            candidates.append(parts[0] + " " + parts[1])
+        for key in candidates:
+            if key in self.addresses:
+                return geocoding.location_of(*self.addresses[key])
+        return None
+
+class Pack_Region(object):
+    '''Streets cut out of a pack, in the shape of the OSMNX graphs used by Functionality.build_graph().'''
+
+    def __init__(self):
+        self.node = {}
+        self.adj = {}
+
+    def add_street(self, start_id, start, end_id, end, length, name, highway, maxspeed, way_id):
+        '''Adds a one way street between two intersections, each given by its id and (latitude, longitude), and the OSM way it is part of.'''
+        for node_id, (latitude, longitude) in ((start_id, start), (end_id, end)):
+            if node_id not in self.node:
+                self.node[node_id] = {"y": latitude, "x": longitude}
+        way = {"length": length, "highway": highway, "maxspeed": maxspeed, "osmid": way_id}
+        if name is not None:
+            way["name"] = name
+        parallel = self.adj.setdefault(start_id, {}).setdefault(end_id, {})
+        parallel[len(parallel)] = way
+
+    def edges(self, data=None, keys=False):
+        '''Generates (u, v, key, None) for every edge, like the OSMNX graph.'''
+        for u in self.adj:
+            for v in self.adj[u]:
+                for key in self.adj[u][v]:
+                    yield u, v, key, None
+
+#Installed packs, found on first use. A list of [path, header, Region_Pack or None until loaded].
+_installed = None
+_lock = threading.Lock()
+
+def offline():
+    '''Determine if the network must never be used. (DIRECTIONS_OFFLINE=1)'''
+    return os.environ.get("DIRECTIONS_OFFLINE", "") not in ("", "0")
+
+def installed_packs():
+    '''Returns the packs in the DIRECTIONS_PACKS directories, reading only their headers until they are needed.'''
+    global _installed
+    with _lock:
+        if _installed is None:
+            _installed = []
+            for directory in os.environ.get("DIRECTIONS_PACKS", "").split(os.pathsep):
+                if directory == "" or not os.path.isdir(directory):
+                    continue
+                for name in sorted(os.listdir(directory)):
+                    if name.endswith(".pack"):
+                        path = os.path.join(directory, name)
+                        _installed.append([path, read_header(path), None])
+        return _installed
+
+def loaded(entry):
+    '''Returns the Region_Pack of an installed pack, loading it the first time.'''
+    with _lock:
+        if entry[2] is None:
+            entry[2] = load_pack(entry[0])
+        return entry[2]
+
+def find_pack(north, south, east, west):
+    '''Returns an installed Region_Pack which covers the bounding box, or None.'''
+    for entry in installed_packs():
+        bounds = entry[1]["bounds"]
+        if north <= bounds[0] and south >= bounds[1] and east <= bounds[2] and west >= bounds[3]:
+            return loaded(entry)
+    return None
+
+def geocode(address):
+    '''Looks an address up in every installed pack. Returns a geopy location, or None.'''
+    for entry in installed_packs():
+        location = loaded(entry).geocode(address)
+        if location is not None:
+            return location
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an offline region pack from a local OSM extract.")
+    parser.add_argument("extract", nargs="?", help="The .osm, .osm.bz2, .osm.gz or .pbf extract.")
+    parser.add_argument("output", help="The pack to write, or to describe with --info.")
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("NORTH", "SOUTH", "EAST", "WEST"),
+                        help="Only pack the streets of this bounding box.")
+    parser.add_argument("--cell", type=float, default=CELL_SIZE, help="Size of the spatial index cells, in degrees.")
+    parser.add_argument("--info", action="store_true", help="Describe an existing pack.")
+    args = parser.parse_args()
+
+    if not args.info:
+        if args.extract is None:
+            parser.error("an extract is needed to build a pack")
+        header, body = build_pack(*read_extract(args.extract), bbox=args.bbox, cell=args.cell)
+        write_pack(header, body, args.output)
+    header = read_header(args.output)
+    print("%s: %d intersections, %d street edges, %d addresses" %(args.output, header["nodes"], header["edges"], header["addresses"]))
+    print("Bounds (north, south, east, west): %s    Index cells: %s degrees" %(", ".join("%.5f" %(bound) for bound in header["bounds"]), header["cell"]))
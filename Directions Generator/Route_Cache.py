@@ -0,0 +1,168 @@
+'''
+Program: Route_Cache.py
+Description: Keeps the results of route searches, so a route which was already found
+             is never searched for again. Each endpoint is keyed by its street and its
+             coordinates, so differently worded addresses which resolve to the same
+             spot share one cached route. Results are keyed by
+             the region, a fingerprint of its graph's streets and the cost profile, held
+             within a memory budget (least recently used first out), and can be saved to
+             disk so they outlive the process. Saving happens in the background every
+             so often and when the cache is closed, never while a route is being found.
+
+PLEASE NOTE: Only the route rows are kept, not the directions. The directions name the
+             addresses as they were typed, so they are generated again for every query.
+             The rows start and end with the legs between the addresses and their streets,
+             so a route is never shared by addresses at different spots, even on the same
+             block. (Those legs, and the intersection the route joins the street at, differ)
+'''
+
+#Imports
+import os
+import json
+import threading
+from collections import OrderedDict
+from Region_Cache import measure_size
+
+#Decimal places the endpoints' coordinates are keyed by. (About 0.1 metres, so only the same spot matches)
+COORDINATE_DIGITS = 6
+
+def route_key(bounding_box, graph, start_street, start_node, end_street, end_node, profile):
+    '''
+    Returns the key a route is cached under.
+    ------------------------------------------------------------------------------
+    Input:
+        bounding_box --> The bounding box of the region routed on. (north, south, east, west)
+        graph --> The region's Graph. Its fingerprint is part of the key, so routes saved for a graph
+                  stay valid for a graph rebuilt from the same streets, and for no other. (See Graph.fingerprint())
+        start_street, start_node, end_street, end_node --> The endpoints, as given by
+                                                           Functionality.endpoint_nodes_of()
+        profile --> The cost profile. (See Cost_Profiles.py)
+    ------------------------------------------------------------------------------
+    Output:
+        A tuple which can be stored as JSON.
+    '''
+    start = [round(coordinate, COORDINATE_DIGITS) for coordinate in start_node.get_latlong()]
+    end = [round(coordinate, COORDINATE_DIGITS) for coordinate in end_node.get_latlong()]
+    return (list(bounding_box), graph.fingerprint(), profile, start_street.lower(), start, end_street.lower(), end)
+
+class Route_Cache(object):
+    '''Least recently used cache of route results, held within a memory budget and optionally saved to disk.'''
+
+    def __init__(self, budget_mb=16, path=None, save_interval=30):
+        '''
+        Initialization for the cache.
+        -----------------------------
+        Inputs:
+            - budget_mb --> Most megabytes the cached routes may use together.
+            - path --> Optional JSON file the cache is loaded from, and saved to by a background thread.
+            - save_interval --> Seconds between saves, which only happen if something changed.
+                                Call close() to save what is left when the cache is no longer needed.
+        '''
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.path = path
+        self.routes = OrderedDict()     #JSON of key --> (route, bytes), least recently used first.
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.changed = False            #Whether the routes changed since they were last saved.
+        self.save_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.save_interval = save_interval
+        if path is not None:
+            if os.path.exists(path):
+                self.load()
+            threading.Thread(target=self.save_periodically, daemon=True).start()
+
+    def get(self, key):
+        '''Returns the route cached under key, or None. Counts as a hit or a miss.'''
+        if key is None:
+            return None
+        name = json.dumps(key)
+        with self.lock:
+            entry = self.routes.get(name)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.routes.move_to_end(name)
+            return entry[0]
+
+    def put(self, key, route):
+        '''Caches a route, the list of rows from Graph.djikstra() or "Disconnected", under key.'''
+        if key is None:
+            return
+        with self.lock:
+            self._put(json.dumps(key), route)
+            self.changed = True
+
+    def _put(self, name, route):
+        '''Same as put(), with the key already as JSON. The caller must hold self.lock.'''
+        if name in self.routes:
+            self.size -= self.routes.pop(name)[1]
+        size = measure_size(route)
+        self.routes[name] = (route, size)
+        self.size += size
+        while self.size > self.budget and len(self.routes) > 1:
+            self.size -= self.routes.popitem(last=False)[1][1]
+
+    def invalidate(self, bounding_box, fingerprint):
+        '''Drops the routes of a region which were found on a graph with any fingerprint other than the given one.'''
+        with self.lock:
+            for name in list(self.routes):
+                key = json.loads(name)
+                if key[0] == list(bounding_box) and key[1] != fingerprint:
+                    self.size -= self.routes.pop(name)[1]
+                    self.changed = True
+
+    def load(self):
+        '''Loads the routes saved at self.path. A file which cannot be read is ignored.'''
+        try:
+            with open(self.path, "r", encoding="utf-8") as saved:
+                entries = json.load(saved)
+        except (OSError, ValueError):
+            return
+        with self.lock:
+            for name, route in entries:
+                self._put(name, route)
+
+    def save(self):
+        '''
+        Writes the routes to self.path, if there is one and they changed, least recently used first.
+        Only copying the list of routes holds self.lock; the file is written without it, and replaced
+        in one step, so it is never left half written.
+        '''
+        if self.path is None:
+            return
+        with self.save_lock:
+            with self.lock:
+                if not self.changed:
+                    return
+                entries = [[name, entry[0]] for name, entry in self.routes.items()]
+                self.changed = False
+            temporary = self.path + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as output:
+                json.dump(entries, output)
+            os.replace(temporary, self.path)
+
+    def save_periodically(self):
+        '''Background thread: saves the routes every self.save_interval seconds until the cache is closed.'''
+        while not self.stopped.wait(self.save_interval):
+            try:
+                self.save()
+            except OSError:
+                #Try again next time; the routes are still marked as changed.
+                with self.lock:
+                    self.changed = True
+
+    def close(self):
+        '''Stops the background saving and saves whatever changed since the last save.'''
+        self.stopped.set()
+        self.save()
+
+    def metrics(self):
+        '''Returns a dictionary of the cache's usage, which can be sent as JSON.'''
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"routes": len(self.routes), "size_mb": round(self.size / 1024 / 1024, 2), "hits": self.hits,
+                    "misses": self.misses, "hit_rate": round(self.hits / lookups, 3) if lookups else None}
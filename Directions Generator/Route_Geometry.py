@@ -0,0 +1,85 @@
+'''
+Program: Route_Geometry.py
+Description: Streams the geometry of a route as an encoded polyline or as GeoJSON.
+             Both work on any iterable of route segments, such as the generator
+             returned by Graph.route_segments(), and produce their output piece
+             by piece so a long route can be written to a map or a file without
+             building intermediate lists.
+
+PLEASE NOTE: Route segments are lists of [latitude, longitude, street_name, distance]
+'''
+
+#Imports
+import json
+
+def encode_value(value):
+    '''Encodes a single scaled and rounded coordinate difference with the polyline algorithm.'''
+    value = ~(value << 1) if value < 0 else (value << 1)
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+def polyline_stream(segments, start=None, precision=5):
+    '''
+    Generates an encoded polyline (Google's polyline algorithm) for a route, one point at a time.
+    ------------------------------------------------------------------------------
+    Input:
+        segments --> Iterable of route segments.
+        start --> Optional (latitude, longitude) of the start of the route, which
+                  the segments themselves do not include.
+        precision --> Number of decimal places kept. (5 is the usual precision)
+    ------------------------------------------------------------------------------
+    Output:
+        Pieces of the encoded string; "".join() them for the whole polyline.
+    '''
+    factor = 10 ** precision
+    previous_lat = 0
+    previous_lng = 0
+    if start is not None:
+        segments = _prepend(start, segments)
+    for segment in segments:
+        lat = int(round(segment[0] * factor))
+        lng = int(round(segment[1] * factor))
+        yield encode_value(lat - previous_lat) + encode_value(lng - previous_lng)
+        previous_lat = lat
+        previous_lng = lng
+
+def geojson_stream(segments, start=None):
+    '''
+    Generates a GeoJSON Feature with a LineString geometry for a route, one point at a time.
+    ------------------------------------------------------------------------------
+    Input:
+        segments --> Iterable of route segments.
+        start --> Optional (latitude, longitude) of the start of the route.
+    ------------------------------------------------------------------------------
+    Output:
+        Pieces of the JSON text; "".join() them for the whole document.
+        The feature's properties hold the total distance in metres and the streets driven on.
+    '''
+    if start is not None:
+        segments = _prepend(start, segments)
+    yield '{"type": "Feature", "geometry": {"type": "LineString", "coordinates": ['
+    distance = 0
+    streets = []
+    for i, segment in enumerate(segments):
+        #GeoJSON coordinates are in longitude, latitude order.
+        yield "%s[%s, %s]" %(", " if i > 0 else "", repr(segment[1]), repr(segment[0]))
+        distance += segment[3]
+        if segment[2] is not None and (streets == [] or streets[-1] != segment[2]):
+            streets.append(segment[2])
+    yield ']}, "properties": %s}' %(json.dumps({"distance": distance, "streets": streets}))
+
+def write_stream(stream, path):
+    '''Writes the pieces of a polyline or GeoJSON stream to a file as they are generated.'''
+    with open(path, "w", encoding="utf-8") as output:
+        for piece in stream:
+            output.write(piece)
+
+def _prepend(start, segments):
+    '''Generates a starting point, with no street or distance, followed by the route segments.'''
+    yield [start[0], start[1], None, 0]
+    for segment in segments:
+        yield segment
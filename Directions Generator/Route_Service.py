@@ -0,0 +1,582 @@
+'''
+Program: Route_Service.py
+Description: A long-running local routing service for the Directions Generator.
+             Geocoding results and regional graphs are kept warm in memory between
+             requests, so only the first search in a region pays for pulling and
+             building the graph. Regions are held within a memory budget, least
+             recently used first out. (See Region_Cache.py) Route results are cached as well, and can be
+             saved to disk. (See Route_Cache.py) Routes and distance matrices are served as JSON
+             over HTTP, and a bounded pool of workers with a bounded queue pushes
+             back on callers when the service is overloaded.
+
+Usage: python Route_Service.py [--host HOST] [--port PORT] [--workers N] [--queue N] [--memory-mb MB]
+                              [--tile-workers N] [--route-cache-mb MB] [--route-cache FILE] [--search-processes N]
+    GET /route?start=<address>&end=<address>[&profile=<profile>]
+    GET /matrix?address=<address>&address=<address>...[&profile=<profile>]
+    GET /metrics
+    GET /arterials?north=<lat>&south=<lat>&east=<lon>&west=<lon>[&min_speed=<km/h>]
+    Routes and matrices may pass the places already geocoded, each as location=[address, latitude, longitude]
+    in JSON, so they are not looked up again. (Used by Shard_Router.py)
+    POST /update with a JSON body of {"closures": [[start_id, end_id], ...],
+                                      "weights": [[start_id, end_id, profile, cost], ...]}
+        (A weight sets the cost of one street section under a profile other than "distance", such as
+         its travel time in seconds under "time". See Cost_Profiles.py)
+    POST /update with an OSM change file (.osc) as the body, sent as Content-Type: application/xml
+'''
+
+#Imports
+import os
+import io
+import json
+import time
+import threading
+import argparse
+import urllib.parse
+import urllib.request
+import urllib.error
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import Functionality as pathfinder
+import Multi_Stop as multi_stop
+import Region_Cache as cache
+import Route_Cache as route_cache
+import Tile_Builder as tiles
+import Cost_Profiles as profiles
+import Search_Backends as backends
+import Landmarks as landmarks
+import Geocoder as geocoding
+import Profiling as profiling
+import Shared_Graph as shared
+import Graph_Updates as graph_updates
+
+class Service_Busy(Exception):
+    '''Raised when the worker pool and its queue are both full.'''
+    pass
+
+def record_stage(timings, stage, begin):
+    '''Records the milliseconds since begin (from time.perf_counter()) as the time of a stage, if timings is a dictionary.'''
+    if timings is not None:
+        timings[stage] = round((time.perf_counter() - begin) * 1000, 3)
+
+class Route_Service(object):
+    '''Routing core which keeps geocoding results and regional graphs in memory.'''
+
+    def __init__(self, workers=4, queue_size=16, memory_mb=512, tile_workers=1, route_cache_mb=16, route_cache_path=None,
+                 backend=None, landmark_dir=None, search_processes=0):
+        '''
+        Initialization for the service.
+        -----------------------------
+        Inputs:
+            - workers --> Number of requests computed at the same time.
+            - queue_size --> Number of requests which may wait for a worker before
+                             new requests are turned away with Service_Busy.
+            - memory_mb --> Memory budget of the warm regions. (See Region_Cache.py)
+            - tile_workers --> Number of processes which build a new region, tile by tile. (See Tile_Builder.py)
+                               With 1, regions are fetched and built in the calling thread.
+            - route_cache_mb --> Memory budget of the cached route results. (See Route_Cache.py)
+            - route_cache_path --> Optional file the route results are saved to, so they outlive the service.
+            - backend --> Name of the search engine routes are found with. (See Search_Backends.py)
+            - landmark_dir --> Optional directory the landmark tables of the "alt" engine are saved to,
+                               so they outlive the service. (See Landmarks.py)
+            - search_processes --> If more than 0, routes are searched by this many worker processes on
+                                   shared copies of the regional graphs, instead of in the request's thread,
+                                   so searches use more than one core. (See Shared_Graph.Search_Pool)
+                                   These searches always use Dijkstra's algorithm, whatever the backend.
+        '''
+        self.geocodes = {}          #Dictionary of address --> geopy location.
+        self.regions = cache.Region_Cache(memory_mb)
+        self.routes = route_cache.Route_Cache(route_cache_mb, route_cache_path)
+        self.building = {}          #Dictionary of bounding box --> lock held while its region is being built.
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.tile_workers = tile_workers
+        self.backend = backends.get_backend(backend).name
+        self.landmark_dir = landmark_dir
+        if landmark_dir is not None:
+            os.makedirs(landmark_dir, exist_ok=True)
+        self.search_pool = shared.Search_Pool(search_processes) if search_processes > 0 else None
+
+    def submit(self, function, *args):
+        '''
+        Queue a call on the worker pool.
+        Raises Service_Busy instead of waiting if every worker and queue slot is taken.
+        '''
+        if not self.slots.acquire(blocking=False):
+            raise Service_Busy()
+        try:
+            future = self.executor.submit(function, *args)
+        except:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda future: self.slots.release())
+        return future
+
+    def geocode(self, address):
+        '''
+        Geocode an address, reusing the result of any previous lookup of it.
+        Failed lookups (Geocoder.Geocoding_Error) are not kept, so they are tried again next time.
+        '''
+        with self.lock:
+            if address in self.geocodes:
+                return self.geocodes[address]
+        location = pathfinder.geocode(address)
+        with self.lock:
+            self.geocodes[address] = location
+        return location
+
+    def region_for(self, north, south, east, west, progress=None, wanted=None):
+        '''
+        Returns a warm region which contains the bounding box.
+        If there is none, the region is pulled from the OSM database and kept.
+        A bounding box which is already being built (e.g. by a prefetch) is waited for rather than built twice.
+        progress is an optional function which is called with a message as each stage begins.
+        wanted is an optional function which says whether the region is still needed, such as for a prefetch
+        whose address may be edited again. It is asked between the stages of the build and before the region
+        is kept; once it returns False the build is abandoned, and None is returned.
+        '''
+        bounding_box = (north, south, east, west)
+        region = self.regions.get(*bounding_box)
+        if region is not None:
+            return region
+        with self.lock:
+            building = self.building.setdefault(bounding_box, threading.Lock())
+        with building:
+            #Another thread may have built the region while this one waited.
+            region = self.regions.find(*bounding_box)
+            if region is not None:
+                return region
+            try:
+                graph = self.build_region(north, south, east, west, progress, wanted)
+                if graph is None or (wanted is not None and not wanted()):
+                    return None
+                region = self.regions.add(cache.Region(north, south, east, west, graph))
+            finally:
+                with self.lock:
+                    self.building.pop(bounding_box, None)
+        return region
+
+    def build_region(self, north, south, east, west, progress=None, wanted=None):
+        '''
+        Pulls a bounding box from the OSM database and builds its graph, tile by tile if there are tile workers.
+        Returns None if wanted is given and returns False once the streets are pulled. (See region_for())
+        '''
+        if self.tile_workers > 1:
+            pathfinder.report(progress, "Fetching and building the streets tile by tile..")
+            return tiles.build_region(north, south, east, west, self.tile_workers)
+        pathfinder.report(progress, "Fetching streets from the OSM database..")
+        G = pathfinder.fetch_region(north, south, east, west)
+        if wanted is not None and not wanted():
+            return None
+        pathfinder.report(progress, "Building the graph of intersections and streets..")
+        return pathfinder.build_graph(G)
+
+    def warm(self, locations, buffer_km=1, wanted=None):
+        '''
+        Makes sure that the region around geocoded locations is warm, without routing on it.
+        buffer_km widens the region (See Functionality.bounding_box_of_all()), and wanted is as for region_for().
+        '''
+        return self.region_for(*pathfinder.bounding_box_of_all(locations, buffer_km), wanted=wanted)
+
+    def route(self, start_address, end_address, profile=profiles.DEFAULT_PROFILE, locations=None):
+        '''
+        Computes the route between two addresses, optimized for a cost profile. (See Cost_Profiles.py)
+        If the addresses were already geocoded, their (start, end) locations may be given to skip geocoding.
+        ------------------------------------------------------------------------------
+        Output:
+            A dictionary which can be sent as JSON. Its "status" is one of:
+                "ok"           --> "itinerary" holds the list of directions.
+                "unresolved"   --> "unresolved" lists which of "start"/"end" could not be found.
+                "same"         --> Both addresses resolve to the same place.
+                "disconnected" --> There is no path between the addresses.
+            "timings" holds the milliseconds spent in each stage. ("geocode", "region", "search", "directions")
+        ------------------------------------------------------------------------------
+        The query is profiled if profiling is switched on. (See Profiling.py)
+        '''
+        profiles.column_of(profile) #Unknown profiles are turned away before any work is done.
+        with profiling.default_profiler.profile(start_address=start_address, end_address=end_address, profile=profile) as query:
+            result = self.route_query(start_address, end_address, profile, locations)
+            query.tag(status=result["status"])
+        return result
+
+    def route_query(self, start_address, end_address, profile=profiles.DEFAULT_PROFILE, locations=None):
+        '''Computes the route between two addresses. (See route())'''
+        timings = {}
+        begin = time.perf_counter()
+        location1, location2 = locations or (self.geocode(start_address), self.geocode(end_address))
+        record_stage(timings, "geocode", begin)
+        unresolved = [name for name, location in (("start", location1), ("end", location2)) if location is None]
+        if unresolved != []:
+            return {"status": "unresolved", "unresolved": unresolved, "timings": timings}
+
+        result = {"start_address": pathfinder.format_address(location1),
+                  "end_address": pathfinder.format_address(location2), "timings": timings}
+        if result["start_address"] == result["end_address"]:
+            result["status"] = "same"
+            return result
+
+        route = self.route_locations(location1, location2, timings=timings, profile=profile)
+        if route == "Disconnected":
+            result["status"] = "disconnected"
+            return result
+
+        begin = time.perf_counter()
+        result["status"] = "ok"
+        result["distance"] = sum(step[3] for step in route)
+        result["itinerary"] = pathfinder.generate_directions(start_address, end_address, route)
+        record_stage(timings, "directions", begin)
+        return result
+
+    def route_locations(self, location1, location2, progress=None, timings=None, profile=profiles.DEFAULT_PROFILE):
+        '''
+        Finds the route rows between two geocoded locations on a warm region, optimized for a cost profile.
+        Routes between the same endpoints are answered from the route cache. (See Route_Cache.py)
+        If a timings dictionary is given, the milliseconds spent on the "region" and "search" stages are added to it.
+        '''
+        begin = time.perf_counter()
+        region = self.region_for(*pathfinder.bounding_box_of(location1, location2), progress=progress)
+        record_stage(timings, "region", begin)
+        pathfinder.report(progress, "Calculating the shortest path..")
+        profiling.tag_graph(region.graph)
+        begin = time.perf_counter()
+        endpoints = pathfinder.endpoint_nodes_of(location1, location2)
+        prepared = False
+        searching = None
+        found = False
+        with region.lock:
+            key = route_cache.route_key(region.get_bounding_box(), region.graph, *endpoints, profile)
+            route = self.routes.get(key)
+            if route is None:
+                found = True
+                region.graph.set_endpoints(*endpoints)
+                if self.search_pool is not None:
+                    #The search runs in a worker process, which need not hold the region's lock.
+                    searching = self.search_pool.submit(region, profile)
+                else:
+                    if self.backend == "alt":
+                        prepared = self.prepare_landmarks(region, profile)
+                    route = pathfinder.find_route(region.graph, profile, reuse=True, backend=self.backend)
+                    #Trees kept for reuse by the search are counted as part of the region.
+                    self.regions.charge_trees(region)
+        if searching is not None:
+            route = searching.result()
+            route = "Disconnected" if route is None else route
+        if found:
+            #Cached outside of the region's lock, so other queries on the region need not wait for it.
+            self.routes.put(key, route)
+        if prepared:
+            #The landmark tables are counted as part of the region.
+            self.regions.resize(region)
+        record_stage(timings, "search", begin)
+        return route
+
+    def prepare_landmarks(self, region, profile):
+        '''
+        Makes sure a region's graph has its landmark tables for a profile. They are loaded from
+        self.landmark_dir if they were saved for this version of the graph, or else built (and saved).
+        Returns True if they had to be loaded or built. The caller must hold region.lock.
+        '''
+        if profile in region.graph.derived.get("landmarks", {}):
+            return False
+        path = None
+        if self.landmark_dir is not None:
+            path = landmarks.table_path(self.landmark_dir, region.get_bounding_box(), profile)
+        landmarks.table_for(region.graph, profile, path)
+        return True
+
+    def matrix(self, addresses, profile=profiles.DEFAULT_PROFILE, locations=None):
+        '''
+        Computes the driving distance in metres between every pair of addresses.
+        If the addresses were already geocoded, their locations may be given to skip geocoding.
+        ------------------------------------------------------------------------------
+        Output:
+            A dictionary with "distances", where distances[i][j] is the distance from
+            addresses[i] to addresses[j], or None if there is no path.
+            For other cost profiles, the entries are costs in that profile's units. (e.g. seconds for "time")
+        '''
+        profiles.column_of(profile)
+        locations = locations or [self.geocode(address) for address in addresses]
+        unresolved = [address for address, location in zip(addresses, locations) if location is None]
+        if unresolved != []:
+            return {"status": "unresolved", "unresolved": unresolved}
+
+        #One warm region covers every address, and one search from each address reaches all the others.
+        region = self.region_for(*pathfinder.bounding_box_of_all(locations))
+        stops = multi_stop.stop_nodes_of(locations)
+        with region.lock:
+            for stop_node, street in stops:
+                region.graph.attach_stop(stop_node, street)
+            try:
+                matrix, trees = multi_stop.distance_matrix(region.graph, [stop_node for stop_node, street in stops], profile)
+            finally:
+                for stop_node, street in stops:
+                    region.graph.detach_stop(stop_node.get_id())
+
+        distances = [[None if distance == multi_stop.UNREACHABLE else distance for distance in row] for row in matrix]
+        return {"status": "ok", "addresses": addresses, "profile": profile, "distances": distances}
+
+    def arterials(self, north, south, east, west, min_speed):
+        '''
+        Exports the edges of a bounding box which are driven at min_speed km/h or faster, building its region if needed.
+        Returns a dictionary with the "nodes" and "edges" lists of Tile_Builder.export_graph(), which can be sent as JSON.
+        '''
+        region = self.region_for(north, south, east, west)
+        with region.lock:
+            nodes, edges, index = tiles.export_graph(region.graph, min_speed)
+        return {"status": "ok", "nodes": nodes, "edges": edges}
+
+    def apply_updates(self, updates):
+        '''
+        Applies street updates (see Graph_Updates.py) to the warm regions in place.
+        Only regions whose graphs actually change get a new version; the rest are left alone.
+        ------------------------------------------------------------------------------
+        Output:
+            A dictionary with the number of regions that were updated.
+        '''
+        return self.update_regions(lambda graph: updates)
+
+    def apply_osm_change(self, change):
+        '''
+        Applies an OSM change file, given as bytes, to the warm regions in place.
+        Each region reads it against its own graph, so ways are resolved against the ways it was built from.
+        Returns the same dictionary as apply_updates().
+        '''
+        try:
+            root = ET.parse(io.BytesIO(change)).getroot()
+        except ET.ParseError as err:
+            raise ValueError("Malformed OSM change file. (%s)" %(err))
+        return self.update_regions(lambda graph: graph_updates.osm_change_updates(root, graph))
+
+    def update_regions(self, updates_for):
+        '''
+        Applies the updates which updates_for(graph) gives for each warm region. (See apply_updates())
+        A region whose updates cannot all be applied in place (a "refetch" update) is pulled and built again instead.
+        '''
+        updated = 0
+        for region in self.regions.values():
+            with region.lock:
+                #New nodes are only added to the regions which they lie inside of.
+                local = [update for update in updates_for(region.graph) if update[0] != "node" or region.covers(update[2], update[3])]
+                refetch = any(update[0] == "refetch" for update in local)
+                changed = not refetch and region.graph.apply_updates(local)
+                fingerprint = region.graph.fingerprint() if changed else None
+                version = region.graph.version
+            if refetch:
+                graph = self.build_region(*region.get_bounding_box())
+                #Anything kept for the old graph by its version, such as a shared copy, must not be taken for the new one.
+                graph.version = version + 1
+                region = self.regions.add(cache.Region(*(region.get_bounding_box() + (graph,))))
+                fingerprint = graph.fingerprint()
+            elif changed:
+                self.regions.resize(region)
+            if refetch or changed:
+                updated += 1
+                self.routes.invalidate(region.get_bounding_box(), fingerprint)
+        if self.search_pool is not None:
+            #Shared copies of regions which were evicted by the resizing are no longer needed.
+            self.search_pool.keep(set(region.get_bounding_box() for region in self.regions.values()))
+        return {"status": "ok", "updated_regions": updated}
+
+    def metrics(self):
+        '''
+        Returns the usage of the warm regions and of their cached searches. (See Region_Cache.metrics())
+        The usage of the route cache is under "route_cache". (See Route_Cache.metrics())
+        '''
+        trees = [region.graph.derived["trees"] for region in self.regions.values() if "trees" in region.graph.derived]
+        metrics = dict(self.regions.metrics(), status="ok", geocodes=len(self.geocodes), route_cache=self.routes.metrics(),
+                       tree_hits=sum(cache.hits for cache in trees), tree_misses=sum(cache.misses for cache in trees))
+        if self.search_pool is not None:
+            self.search_pool.keep(set(region.get_bounding_box() for region in self.regions.values()))
+            metrics["shared_graph_mb"] = self.search_pool.shared_mb()
+        return metrics
+
+    def shutdown(self):
+        '''
+        Stops the worker pool once queued requests are finished, and the search processes if there are any.
+        Cached routes which were not saved yet are saved.
+        '''
+        self.executor.shutdown(wait=True)
+        self.routes.close()
+        if self.search_pool is not None:
+            self.search_pool.close()
+
+
+class Route_Handler(BaseHTTPRequestHandler):
+    '''HTTP handler which passes requests on to the server's Route_Service.'''
+
+    def do_GET(self):
+        '''Handles the /route, /matrix, /metrics and /arterials endpoints.'''
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        service = self.server.service
+        try:
+            if url.path == "/metrics":
+                self.send_json(200, service.metrics())
+                return
+            if url.path == "/arterials":
+                bounding_box = [float(query[name][0]) for name in ("north", "south", "east", "west")]
+                min_speed = float(query.get("min_speed", ["0"])[0])
+                self.send_json(200, service.submit(service.arterials, *bounding_box, min_speed).result())
+                return
+            profile = query.get("profile", [profiles.DEFAULT_PROFILE])[0]
+            if profile not in profiles.PROFILES:
+                self.send_json(400, {"status": "error", "error": "Unknown profile. Choose one of: " + ", ".join(profiles.PROFILES)})
+                return
+            #Places which the caller already geocoded.
+            locations = [geocoding.location_of(*json.loads(location)) for location in query.get("location", [])] or None
+            if url.path == "/route" and "start" in query and "end" in query:
+                future = service.submit(service.route, query["start"][0], query["end"][0], profile, locations)
+            elif url.path == "/matrix" and len(query.get("address", [])) > 1:
+                future = service.submit(service.matrix, query["address"], profile, locations)
+            else:
+                self.send_json(400, {"status": "error", "error": "Unknown endpoint or missing parameters."})
+                return
+            self.send_json(200, future.result())
+        except Service_Busy:
+            self.send_json(503, {"status": "busy", "error": "Too many requests are queued. Try again later."})
+        except geocoding.Geocoding_Error as err:
+            self.send_json(502, {"status": "error", "error": str(err)})
+        except (KeyError, ValueError, TypeError) as err:
+            self.send_json(400, {"status": "error", "error": "Malformed parameters. (%s)" %(err)})
+        except Exception as err:
+            self.send_json(500, {"status": "error", "error": str(err)})
+
+    def do_POST(self):
+        '''Handles the /update endpoint.'''
+        service = self.server.service
+        try:
+            if self.path != "/update":
+                self.send_json(400, {"status": "error", "error": "Unknown endpoint."})
+                return
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.headers.get("Content-Type", "").split(";")[0].strip() in ("application/xml", "text/xml"):
+                self.send_json(200, service.submit(service.apply_osm_change, data).result())
+                return
+            body = json.loads(data.decode("utf-8"))
+            updates = []
+            for start_id, end_id in body.get("closures", []):
+                updates.append(("remove", int(start_id), int(end_id)))
+                updates.append(("remove", int(end_id), int(start_id)))
+            for weight in body.get("weights", []):
+                if len(weight) != 4:
+                    raise ValueError("Each weight is [start_id, end_id, profile, cost], not %s" %(json.dumps(weight)))
+                start_id, end_id, profile, cost = weight
+                profiles.weighted_column(profile)
+                updates.append(("weight", int(start_id), int(end_id), profile, float(cost)))
+            self.send_json(200, service.submit(service.apply_updates, updates).result())
+        except Service_Busy:
+            self.send_json(503, {"status": "busy", "error": "Too many requests are queued. Try again later."})
+        except (ValueError, TypeError) as err:
+            self.send_json(400, {"status": "error", "error": str(err)})
+        except Exception as err:
+            self.send_json(500, {"status": "error", "error": str(err)})
+
+    def send_json(self, code, body):
+        '''Sends a dictionary as a JSON response.'''
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def make_server(host="127.0.0.1", port=8765, workers=4, queue_size=16, memory_mb=512, tile_workers=1,
+                route_cache_mb=16, route_cache_path=None, backend=None, landmark_dir=None, search_processes=0):
+    '''Creates an HTTP server with its own warm Route_Service. Call serve_forever() to run it.'''
+    server = ThreadingHTTPServer((host, port), Route_Handler)
+    server.service = Route_Service(workers, queue_size, memory_mb, tile_workers, route_cache_mb, route_cache_path, backend,
+                                   landmark_dir, search_processes)
+    return server
+
+
+def encode_locations(locations):
+    '''Encodes geocoded places as "location" query parameters. (See Route_Handler.do_GET())'''
+    return [("location", json.dumps([location.address, location.latitude, location.longitude])) for location in locations or ()]
+
+class Route_Client(object):
+    '''Thin client for a running Route_Service, used by the GUI.'''
+
+    def __init__(self, url="http://127.0.0.1:8765", timeout=300):
+        '''
+        Initialization for the client.
+        -----------------------------
+        Inputs:
+            - url --> Base url of the service.
+            - timeout --> Seconds to wait for a response.
+        '''
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def route(self, start_address, end_address, profile=profiles.DEFAULT_PROFILE, locations=None):
+        '''
+        Requests a route from the service. Returns the same dictionary as Route_Service.route().
+        locations are the optional geocoded (start, end) places, passed on so the service does not look them up again.
+        '''
+        query = urllib.parse.urlencode([("start", start_address), ("end", end_address), ("profile", profile)] + encode_locations(locations))
+        return self.get("/route?" + query)
+
+    def matrix(self, addresses, profile=profiles.DEFAULT_PROFILE, locations=None):
+        '''Requests a distance matrix from the service. Returns the same dictionary as Route_Service.matrix().'''
+        query = urllib.parse.urlencode([("address", address) for address in addresses] + [("profile", profile)] + encode_locations(locations))
+        return self.get("/matrix?" + query)
+
+    def arterials(self, north, south, east, west, min_speed):
+        '''Requests the fast edges of a bounding box. Returns the same dictionary as Route_Service.arterials().'''
+        query = urllib.parse.urlencode({"north": north, "south": south, "east": east, "west": west, "min_speed": min_speed})
+        return self.get("/arterials?" + query)
+
+    def update(self, closures=(), weights=(), osm_change=None):
+        '''
+        Posts street updates to the service. Returns the same dictionary as Route_Service.apply_updates().
+        closures are [start_id, end_id] and weights are [start_id, end_id, profile, cost].
+        If osm_change is given, it is posted instead: the bytes of an OSM change file. (See Route_Service.apply_osm_change())
+        '''
+        if osm_change is not None:
+            request = urllib.request.Request(self.url + "/update", data=osm_change, headers={"Content-Type": "application/xml"})
+        else:
+            body = json.dumps({"closures": list(closures), "weights": list(weights)}).encode("utf-8")
+            request = urllib.request.Request(self.url + "/update", data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as err:
+            return json.loads(err.read().decode("utf-8"))
+
+    def metrics(self):
+        '''Requests the usage of the service's warm regions. Returns the same dictionary as Route_Service.metrics().'''
+        return self.get("/metrics")
+
+    def get(self, path):
+        '''Sends a GET request and decodes the JSON response, including error responses.'''
+        try:
+            with urllib.request.urlopen(self.url + path, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as err:
+            return json.loads(err.read().decode("utf-8"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local routing service for the Directions Generator.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue", type=int, default=16)
+    parser.add_argument("--memory-mb", type=float, default=512)
+    parser.add_argument("--tile-workers", type=int, default=1)
+    parser.add_argument("--route-cache-mb", type=float, default=16)
+    parser.add_argument("--route-cache", help="File the cached route results are saved to and loaded from.")
+    parser.add_argument("--backend", default=backends.DEFAULT_BACKEND, choices=sorted(backends.BACKENDS),
+                        help="Search engine routes are found with.")
+    parser.add_argument("--landmarks", help="Directory the landmark tables of the alt engine are saved to and loaded from.")
+    parser.add_argument("--search-processes", type=int, default=0,
+                        help="Worker processes which search shared copies of the regional graphs. (0 searches in the request's thread)")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.workers, args.queue, args.memory_mb, args.tile_workers,
+                         args.route_cache_mb, args.route_cache, args.backend, args.landmarks, args.search_processes)
+    print("Routing service listening on http://%s:%d" %(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.service.shutdown()
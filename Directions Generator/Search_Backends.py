@@ -0,0 +1,305 @@
+'''
+Program: Search_Backends.py
+Description: Interchangeable engines for the shortest path search of find_route().
+             Every engine takes a Graph with its endpoints attached and returns the
+             same route rows as Graph.djikstra(), so the rest of the program does not
+             care which one ran.
+
+             python  --> The reference engine. Graph.dfs() then Graph.djikstra(), or the
+                         cached search of Graph.cached_route() when reuse is asked for.
+             csgraph --> Flattens the intersections into compressed sparse row (CSR) arrays
+                         once per graph version and profile, then searches them with
+                         scipy.sparse.csgraph. Connected components rule out disconnected
+                         routes without a search, and Djikstra's algorithm runs in C.
+             alt     --> A* search guided by landmark bounds, with the landmark tables kept in
+                         graph.derived. (See Landmarks.py)
+
+Usage: python Search_Backends.py [--sizes 10 20 40] [--queries N] [--profile PROFILE]
+       (Benchmarks every available engine on synthetic grids of streets of each size)
+
+PLEASE NOTE: The csgraph engine needs numpy and scipy, which are not needed otherwise.
+             When two routes tie on cost, engines may pick different ones of them.
+'''
+
+#Imports
+import os
+import time
+import random
+import argparse
+import Cost_Profiles as profiles
+import Landmarks as landmarks
+
+try:
+    import numpy        #Only needed by the csgraph engine.
+    from scipy.sparse import csr_matrix, csgraph
+except ImportError:
+    numpy = None
+
+#Engine used when none is chosen. It can be set with the DIRECTIONS_BACKEND environment variable.
+DEFAULT_BACKEND = os.environ.get("DIRECTIONS_BACKEND", "python")
+
+class Backend_Error(ValueError):
+    '''Raised when a search engine is unknown, or cannot run because its libraries are not installed.'''
+    pass
+
+class Search_Backend(object):
+    '''The interface of a search engine. Subclasses implement route(), and available() if they need extra libraries.'''
+
+    name = None
+
+    def available(self):
+        '''Returns whether the engine can run here.'''
+        return True
+
+    def route(self, graph, profile=profiles.DEFAULT_PROFILE, reuse=False):
+        '''
+        Finds the shortest route between the start and end nodes of a Graph.
+        ------------------------------------------------------------------------------
+        Input:
+            graph --> A Graph with its start and end nodes attached.
+            profile --> The cost profile to optimize for. (See Cost_Profiles.py)
+            reuse --> Whether the search may be kept for later routes on the same graph.
+        ------------------------------------------------------------------------------
+        Output:
+            The list of [latitude, longitude, street_name, distance] from Graph.djikstra(),
+            or None if there is no path between the start and end nodes.
+        '''
+        raise NotImplementedError
+
+    def prepare(self, graph, profile=profiles.DEFAULT_PROFILE):
+        '''Builds what the engine keeps in graph.derived ahead of the first route, so it can be timed apart. Most engines keep nothing.'''
+        pass
+
+class Python_Backend(Search_Backend):
+    '''The reference engine, which runs the pure Python searches of the Graph itself.'''
+
+    name = "python"
+
+    def route(self, graph, profile=profiles.DEFAULT_PROFILE, reuse=False):
+        '''See Search_Backend.route()'''
+        if reuse:
+            #The cached search finds out whether the end node can be reached by itself.
+            return graph.cached_route(profile)
+
+        '''
+        Use the Graph's function dfs() to determine if the graph's start node and the graph's
+        end node are connected. Proof of concept / a test case for disconnected graphs can be
+        found in the Data_Structures.py module under the DFS function.
+        '''
+        if graph.dfs() == False:
+            return None
+
+        '''
+        Use the Graph's function djikstra() to obtain the shortest route path between the Graph's
+        predefined start and end nodes. The shortest path route will be a list of lists in format:
+            [latitude, longitude, street_name, distance]
+        '''
+        return graph.djikstra(profile)
+
+class Flat_Graph(object):
+    '''
+    The intersections of a Graph under one cost profile, as CSR arrays.
+    Custom nodes (the endpoints and stops) are left out, so the arrays outlive them.
+    '''
+
+    def __init__(self, graph, profile):
+        column = profiles.column_of(profile)
+        self.ids = sorted(node_id for node_id in graph.node_list if node_id >= 0)
+        self.index = {node_id: i for i, node_id in enumerate(self.ids)}
+        offsets = [0]       #The edges of the node at index i are targets[offsets[i]:offsets[i + 1]]
+        targets = []        #Index of the node each edge leads to.
+        weights = []        #Cost of each edge under the profile.
+        for node_id in self.ids:
+            for end_id, edge in graph.node_list[node_id].get_edgelist().items():
+                if end_id >= 0:
+                    targets.append(self.index[end_id])
+                    weights.append(edge[3][column])
+            offsets.append(len(targets))
+        self.offsets = numpy.array(offsets, dtype=numpy.int32)
+        self.targets = numpy.array(targets, dtype=numpy.int32)
+        self.weights = numpy.array(weights, dtype=numpy.float64)
+
+        #Label of the weakly connected component of each node. Nodes with different labels are never connected.
+        size = len(self.ids)
+        matrix = csr_matrix((self.weights, self.targets, self.offsets), shape=(size, size))
+        self.components = csgraph.connected_components(matrix, directed=True, connection="weak")[1]
+
+class Csgraph_Backend(Search_Backend):
+    '''
+    Searches CSR arrays of the graph with scipy.sparse.csgraph.
+    The arrays are built on first use and kept in graph.derived, so they are rebuilt when the graph is updated.
+    Each search adds the start node as one extra row, and reaches the end node by the edges into it.
+    '''
+
+    name = "csgraph"
+
+    def available(self):
+        '''Returns whether numpy and scipy are installed.'''
+        return numpy is not None
+
+    def flatten(self, graph, profile):
+        '''Returns the Flat_Graph of a graph's intersections under a profile, building it on first use.'''
+        flats = graph.derived.setdefault("csgraph", {})
+        flat = flats.get(profile)
+        if flat is None:
+            flat = flats[profile] = Flat_Graph(graph, profile)
+        return flat
+
+    def prepare(self, graph, profile=profiles.DEFAULT_PROFILE):
+        '''See Search_Backend.prepare()'''
+        self.flatten(graph, profile)
+
+    def route(self, graph, profile=profiles.DEFAULT_PROFILE, reuse=False):
+        '''See Search_Backend.route(). The arrays are always kept, so reuse makes no difference.'''
+        flat = self.flatten(graph, profile)
+        column = profiles.column_of(profile)
+        size = len(flat.ids)
+
+        #The edges from the start node onto its street, and the edges into the end node from every node on its street.
+        starts = [(flat.index[node_id], edge[3][column]) for node_id, edge in graph.start_node.get_edgelist().items() if node_id >= 0]
+        end_id = graph.end_node.get_id()
+        entries = []
+        for node_id, street_id in graph.street_index.get(graph.names.lower_key(graph.end_street), ()):
+            edge = graph.node_list[node_id].get_edgelist().get(end_id)
+            if edge is not None:
+                entries.append((flat.index[node_id], edge))
+        if starts == [] or entries == []:
+            return None
+        first = [index for index, cost in starts]
+        last = [index for index, edge in entries]
+        if set(flat.components[first]).isdisjoint(flat.components[last]):
+            return None
+
+        #Search from the start node, added as row "size" after the intersections.
+        matrix = csr_matrix((numpy.concatenate((flat.weights, [cost for index, cost in starts])),
+                             numpy.concatenate((flat.targets, first)),
+                             numpy.append(flat.offsets, len(flat.targets) + len(starts))), shape=(size + 1, size + 1))
+        distances, previous = csgraph.dijkstra(matrix, indices=size, return_predecessors=True)
+
+        #The end node is reached through whichever edge into it gives the lowest total cost.
+        totals = distances[last] + [edge[3][column] for index, edge in entries]
+        best = int(numpy.argmin(totals))
+        if numpy.isinf(totals[best]):
+            return None
+        index, end_edge = entries[best]
+
+        #Walk the predecessors back to the start node, then read each step's street and length off the Graph.
+        path = [index]
+        while previous[path[-1]] != size:
+            path.append(previous[path[-1]])
+        path.reverse()
+        route = []
+        u = graph.start_node
+        for index in path:
+            v = graph.node_list[flat.ids[index]]
+            edge = u.get_edgelist()[v.get_id()]
+            route.append([v.latitude, v.longitude, graph.names.get_name(edge[2]), edge[1]])
+            u = v
+        end = graph.end_node
+        route.append([end.latitude, end.longitude, graph.names.get_name(end_edge[2]), end_edge[1]])
+        return route
+
+class Alt_Backend(Search_Backend):
+    '''
+    A* search guided by the triangle inequality bounds of a few landmarks. (See Landmarks.py)
+    The landmark tables are built on first use, or loaded if the service saved them, so this suits
+    warm regions which are routed on many times.
+    '''
+
+    name = "alt"
+
+    def prepare(self, graph, profile=profiles.DEFAULT_PROFILE):
+        '''See Search_Backend.prepare()'''
+        landmarks.table_for(graph, profile)
+
+    def route(self, graph, profile=profiles.DEFAULT_PROFILE, reuse=False):
+        '''See Search_Backend.route(). The landmark tables are always kept, so reuse makes no difference.'''
+        return landmarks.search(graph, landmarks.table_for(graph, profile), profile)
+
+#Every engine, by name.
+BACKENDS = {backend.name: backend for backend in (Python_Backend(), Csgraph_Backend(), Alt_Backend())}
+
+def get_backend(name=None):
+    '''Returns the engine with the given name. (Default: DEFAULT_BACKEND) Raises Backend_Error if it cannot be used.'''
+    name = name or DEFAULT_BACKEND
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise Backend_Error("Unknown search backend %r. (Choose from: %s)" %(name, ", ".join(sorted(BACKENDS))))
+    if not backend.available():
+        raise Backend_Error("The %s search backend needs numpy and scipy to be installed." %(name))
+    return backend
+
+def available_backends():
+    '''Returns the names of the engines which can run here.'''
+    return sorted(name for name, backend in BACKENDS.items() if backend.available())
+
+def benchmark(sizes, queries=10, profile=profiles.DEFAULT_PROFILE, seed=0):
+    '''
+    Times every available engine on square synthetic grids of streets. (See Load_Test.py)
+    Each grid is routed on with the same random queries by every engine, and the routes are
+    compared with the ones from the reference engine.
+    ------------------------------------------------------------------------------
+    Input:
+        sizes --> Numbers of rows (and columns) of each grid.
+        queries --> Number of routes per grid.
+        profile --> The cost profile searched on.
+        seed --> Seed for the random endpoints, so runs can be compared.
+    ------------------------------------------------------------------------------
+    Output:
+        A list of (size, nodes, engine, first_ms, mean_ms, same_rows, same_length)
+            first_ms --> Time of the first route, which includes any preprocessing.
+            mean_ms --> Mean time of the rest of the routes.
+            same_rows --> Number of routes identical to the reference.
+            same_length --> Number of routes as long as the reference. (Equal cost ties differ in rows only)
+    '''
+    #Only needed for the benchmark, which builds its graphs from the synthetic grid.
+    import Functionality as pathfinder
+    import Data_Structures as ds
+    import Load_Test as load_test
+
+    results = []
+    for size in sizes:
+        north = load_test.GRID_ORIGIN[0] + (size - 1) * load_test.GRID_STEP
+        east = load_test.GRID_ORIGIN[1] + (size - 1) * load_test.GRID_STEP
+        graph = pathfinder.build_graph(load_test.Synthetic_Region(north, load_test.GRID_ORIGIN[0], east, load_test.GRID_ORIGIN[1]))
+        generator = random.Random(seed)
+        endpoints = []
+        for query in range(queries):
+            start_row, start_column, end_row, end_column = (generator.randrange(size - 1) for i in range(4))
+            start = load_test.grid_address(start_row, start_column)[1]
+            end = load_test.grid_address(end_row, end_column)[1]
+            endpoints.append(("Row %d Street" %(start_row), ds.Node(-1, start[1], start[2]),
+                              "Row %d Street" %(end_row), ds.Node(-2, end[1], end[2])))
+
+        reference = []
+        for name in ["python"] + [name for name in available_backends() if name != "python"]:
+            backend = BACKENDS[name]
+            graph.derived.clear()
+            times = []
+            same_rows = same_length = 0
+            for query, (start_street, start_node, end_street, end_node) in enumerate(endpoints):
+                graph.set_endpoints(start_street, start_node, end_street, end_node)
+                begin = time.perf_counter()
+                route = backend.route(graph, profile)
+                times.append((time.perf_counter() - begin) * 1000)
+                if name == "python":
+                    reference.append(route)
+                expected = reference[query]
+                same_rows += route == expected
+                same_length += (route is None and expected is None) or (route is not None and expected is not None and
+                               abs(sum(row[3] for row in route) - sum(row[3] for row in expected)) < 1e-6)
+            mean = sum(times[1:]) / (len(times) - 1) if len(times) > 1 else times[0]
+            results.append((size, len(graph.node_list), name, times[0], mean, same_rows, same_length))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the search engines on synthetic grids of streets.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 20, 40], help="Rows (and columns) of each grid.")
+    parser.add_argument("--queries", type=int, default=10, help="Routes per grid.")
+    parser.add_argument("--profile", default=profiles.DEFAULT_PROFILE, choices=profiles.PROFILES)
+    args = parser.parse_args()
+
+    print("Size    Nodes  Engine      First ms    Mean ms    Same rows  Same length")
+    for size, nodes, name, first, mean, same_rows, same_length in benchmark(args.sizes, args.queries, args.profile):
+        print("%4d %8d  %-8s %11.2f %10.2f %8d/%d %8d/%d" %(size, nodes, name, first, mean, same_rows, args.queries, same_length, args.queries))
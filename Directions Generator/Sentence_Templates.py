@@ -0,0 +1,187 @@
+'''
+Program: Sentence_Templates.py
+Description: The sentence templates used to build the directions, parsed once into
+             compiled formatters instead of being rebuilt and filled in with chained
+             str.replace calls for every sentence. A Template_Engine can be given a
+             seed so that its randomly chosen sentences can be reproduced, and renders
+             whole itineraries in bulk.
+
+SENTENCE TEMPLATE PLACEHOLDERS:
+    |cs| = current street.
+    |ns| = next street.
+    |lr| = left or right.
+    |dist| = distance.
+    |nsew| = direction. (north/south/east/west or combination)
+    |nnsew| = nsew of next street.
+'''
+
+#Imports
+import re
+import random
+
+class Compiled_Template(object):
+    '''A sentence template with its placeholders parsed into a format string.'''
+
+    #Matches a placeholder such as |cs|
+    PLACEHOLDER = re.compile(r"\|(\w+)\|")
+
+    def __init__(self, template):
+        '''
+        Compiles a template.
+        -----------------------------
+        Inputs:
+            - template --> A template string containing |placeholders|.
+        '''
+        self.template = template
+        #Escape literal braces, then turn each |placeholder| into a {placeholder} field.
+        escaped = template.replace("{", "{{").replace("}", "}}")
+        self.format_string = self.PLACEHOLDER.sub(r"{\1}", escaped)
+        self.fields = frozenset(self.PLACEHOLDER.findall(template))
+
+    def render(self, values):
+        '''Fills in the placeholders with a dictionary of values.'''
+        return self.format_string.format_map(values)
+
+def compile_all(templates):
+    '''Compiles a tuple of template strings.'''
+    return tuple(Compiled_Template(template) for template in templates)
+
+#Beginning strings mainly relevant for the very beginning instruction.
+BEGINNINGS = compile_all(("drive |nsew|", "head |nsew|", "travel |nsew|", "go |nsew|"))
+
+#Beginning strings relevant for all instuctions after the very beginning.
+SENTENCE_STARTS = compile_all(("Follow |cs|", "Travel along |cs|", "Travel on |cs|", "Drive along |cs|",
+                               "Drive on |cs|", "Drive |nsew|", "Continue |nsew|", "Head |nsew|", "Go |nsew|"))
+
+#Strings used to build the middle of the sentence.
+MIDDLE_NSEW = compile_all((", heading |nsew| for |dist|", ", and head |nsew| for |dist|", " and go |nsew| for |dist|"))
+MIDDLE_CS = compile_all((" along |cs| for |dist|", " on |cs| for |dist|"))
+
+#Strings used to build the end of the sentence.
+ENDS_TURN_KNOWN = compile_all((". Then turn |lr| onto |ns|.", " before turning |lr| onto |ns|.", " and turn |lr| onto |ns|.",
+                               " and then turn |lr| onto |ns|."))
+ENDS_TURN_UNKNOWN = compile_all((". Then head |nnsew| on |ns|.", " before heading |nnsew| on |ns|.", ". Then turn onto |ns|.",
+                                 " and head |nnsew| on |ns|.", " and turn onto |ns|."))
+
+#The first and last steps of an itinerary.
+FIRST_STEP = Compiled_Template("Starting at your location |start|, |sentence|")
+LAST_STEP = Compiled_Template("|sentence| and you will have arrived at your destination at |end|.")
+#The first and last steps of the legs between the stops of a multi-stop trip. (See render_legs())
+LEAVE_STOP = Compiled_Template("Leaving |start|, |sentence|")
+ARRIVE_STOP = Compiled_Template("|sentence| and you will have arrived at stop |number|, |end|.")
+
+def add_bound(direction):
+    '''
+    Add the word "bound" in order to make instructions sound more appealing.
+    For example, instead of "drive North", say "drive North-bound"
+    '''
+    return direction if '-' in direction else direction + "-bound"
+
+def format_distance(distance):
+    '''
+    Formats a distance in metres for a sentence.
+    Distances of 1000 Metres or more are given in Kilometres to one decimal place (with ".0" left off),
+    and anything shorter is rounded down to the whole Metre.
+    '''
+    if distance >= 1000:
+        kilometres = "%.1f" %(distance / 1000)
+        if kilometres.endswith(".0"):
+            kilometres = kilometres[:-2]
+        return kilometres + " Kilometres"
+    return "%d Metres" %(distance)
+
+class Template_Engine(object):
+    '''Builds randomly chosen sentences from the compiled templates.'''
+
+    def __init__(self, seed=None):
+        '''
+        Initialization for the engine.
+        -----------------------------
+        Inputs:
+            - seed --> Seed for the engine's own random number generator, for reproducible sentences.
+                       If None, the shared generator of the random module is used.
+        '''
+        self.rng = random if seed is None else random.Random(seed)
+
+    def build_sentence(self, i, steps, point_a, point_b):
+        '''
+        Randomly constructs the sentence for step i. Same inputs and output as Functionality.build_sentence().
+        '''
+        choice = self.rng.choice
+        pieces = []
+        #Generate sentence template depending on multiple conditions:
+        if i == 0:
+            #For very beginning steps.
+            pieces.append(choice(BEGINNINGS))
+            pieces.append(choice(MIDDLE_CS))
+        elif i < steps:
+            #For all other steps.
+            start = choice(SENTENCE_STARTS)
+            pieces.append(start)
+            pieces.append(choice(MIDDLE_NSEW if "cs" in start.fields else MIDDLE_CS))
+        if i < steps-1:
+            #If not the final step.. attempt to include instruction for turning.
+            pieces.append(choice(ENDS_TURN_KNOWN if point_b[3] != "Unknown" else ENDS_TURN_UNKNOWN))
+
+        values = {"cs": point_a[0], "dist": format_distance(point_a[1]), "nsew": add_bound(point_a[2])}
+        if point_b != None:
+            values["ns"] = point_b[0]
+            values["nnsew"] = add_bound(point_b[2])
+            values["lr"] = point_b[3].lower()
+        return "".join([piece.render(values) for piece in pieces])
+
+    def render_itinerary(self, start_address, end_address, route_information, first=FIRST_STEP, last=LAST_STEP, number=None):
+        '''
+        Renders a sentence for every step of a route.
+        ------------------------------------------------------------------------------
+        Input:
+            route_information --> List of [street, length, direction, turn] for each street.
+            first, last --> Templates of the first and last steps, and the stop number the last one may name.
+        ------------------------------------------------------------------------------
+        Output:
+            An array of sentences. (An itinerary)
+        '''
+        itinerary = []
+        steps = len(route_information)
+        for i, street in enumerate(route_information):
+            if i < steps-1:
+                instruction = self.build_sentence(i, steps, street, route_information[i+1])
+            else:
+                #If the very end step.
+                instruction = self.build_sentence(i, steps, street, None)
+                instruction = last.render({"sentence": instruction, "end": end_address, "number": number})
+            if i == 0:
+                #If the very beginning step. (Which is also the end step of a route along one street)
+                instruction = first.render({"start": start_address, "sentence": instruction})
+            itinerary.append(instruction)
+        return itinerary
+
+    def render_legs(self, addresses, legs):
+        '''
+        Renders the itinerary of a trip with many stops, one leg at a time, so that every stop is arrived at.
+        ------------------------------------------------------------------------------
+        Input:
+            addresses --> The stops, in the order they are visited.
+            legs --> The route_information of the leg from each stop to the next. (See render_itinerary())
+        ------------------------------------------------------------------------------
+        Output:
+            An array of sentences. (An itinerary)
+        '''
+        itinerary = []
+        for i, route_information in enumerate(legs):
+            final = i == len(legs) - 1
+            itinerary.extend(self.render_itinerary(addresses[i], addresses[i + 1], route_information,
+                                                   FIRST_STEP if i == 0 else LEAVE_STOP,
+                                                   LAST_STEP if final else ARRIVE_STOP, i + 1))
+        return itinerary
+
+    def render_many(self, routes):
+        '''
+        Renders many itineraries in bulk.
+        Takes an iterable of (start_address, end_address, route_information) and generates an itinerary for each.
+        '''
+        for start_address, end_address, route_information in routes:
+            yield self.render_itinerary(start_address, end_address, route_information)
+
+#Engine shared by callers that do not need reproducible sentences.
+default_engine = Template_Engine()
@@ -0,0 +1,432 @@
+'''
+Program: Shard_Router.py
+Description: A sharded deployment of the routing service, for when one process cannot
+             hold every region that is served. The served area is split into a grid of
+             tiles, and each shard process (an ordinary Route_Service) owns a block of
+             them. A front router geocodes each query, works out from its addresses
+             which shard owns it, and forwards it to that shard over a local socket.
+             Trips between addresses of different shards are forwarded too if they are
+             no larger than a tile, since any shard can build a region anywhere. Longer
+             ones are routed on a coarse graph of the arterial roads, stitched together
+             from what each shard exports. Graph memory and query throughput grow with
+             the number of shards.
+
+Usage: python Shard_Router.py north south east west --shard URL --shard URL ... [--tiles ROWSxCOLUMNS]
+                              [--host HOST] [--port PORT]
+           (Each shard is started on its own, e.g. python Route_Service.py --port 8766)
+       python Shard_Router.py --local-test [--shards N] [--pairs N]
+           (Starts N shard processes on the synthetic grid of Load_Test.py, and checks the
+            router's answers and throughput against a single unsharded Route_Service.
+            Exits with an error if any check fails.)
+
+PLEASE NOTE: Routes on the coarse graph only follow arterials, joined to the addresses in a
+             straight line, so their length is only an estimate of the true shortest route.
+             Results say which shard answered them, and carry "coarse": True when they
+             fell back. Coarse results give "estimated_distance" (or "estimated_distances"
+             for matrices) in place of "distance", so they are never mistaken for exact ones.
+'''
+
+#Imports
+import math
+import time
+import heapq
+import random
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+import Data_Structures as ds
+import Functionality as pathfinder
+import Route_Service as service
+import Tile_Builder as tiles
+import Cost_Profiles as profiles
+import Load_Test as load_test
+
+#Edges driven at this speed in km/h or faster are arterials, and are kept in the coarse graph.
+ARTERIAL_SPEED = 50
+#Number of the nearest arterial nodes which each address of a cross-shard trip is joined to.
+CONNECTORS = 4
+#Range of the coarse estimate's length against the true route which --local-test accepts.
+STRETCH_RANGE = (0.5, 2.0)
+
+class Shard_Router(service.Route_Service):
+    '''
+    Front router which forwards each query to the shard process that owns its tiles.
+    It answers the same calls as a Route_Service, so it is served by the same Route_Handler.
+    '''
+
+    def __init__(self, north, south, east, west, shard_urls, grid=None, workers=8, queue_size=64):
+        '''
+        Initialization for the router.
+        -----------------------------
+        Inputs:
+            - north, south, east, west --> The area served by the shards.
+            - shard_urls --> Base url of each shard's Route_Service.
+            - grid --> Optional (rows, columns) of tiles. (Default: about one tile per shard, see Tile_Builder.tile_grid())
+            - workers, queue_size --> Size of the router's own worker pool. (See Route_Service)
+        '''
+        #The router keeps geocoding results, but never holds a region of its own.
+        service.Route_Service.__init__(self, workers, queue_size, memory_mb=0)
+        self.area = (north, south, east, west)
+        self.shards = [service.Route_Client(url) for url in shard_urls]
+        rows, columns = grid or tiles.tile_grid(len(self.shards))
+        self.tiles = tiles.split_tiles(north, south, east, west, rows, columns)
+        #Tiles are handed out in contiguous runs, so neighbouring tiles mostly share a shard.
+        self.owners = [index * len(self.shards) // len(self.tiles) for index in range(len(self.tiles))]
+        self.coarse = None          #Graph of the arterials over the whole area, stitched when first needed.
+        #Held while the coarse graph is stitched or dropped. Searches on it run at the same time, since
+        #the addresses are joined to it by edges on their own nodes, and the graph itself is only read...
+        self.coarse_lock = threading.Lock()
+        #...apart from its table of street names, which the addresses' streets are added to.
+        self.names_lock = threading.Lock()
+        self.forwarded = [0] * len(self.shards)
+        self.coarse_routes = 0
+
+    def owner_at(self, latitude, longitude):
+        '''Returns the shard which owns the tile a coordinate lies in, or None if it is outside the served area.'''
+        for (tile_north, tile_south, tile_east, tile_west), owner in zip(self.tiles, self.owners):
+            if tile_south <= latitude <= tile_north and tile_west <= longitude <= tile_east:
+                return owner
+        return None
+
+    def owner_of(self, locations):
+        '''
+        Returns the shard which a query between geocoded locations is forwarded to, or None if it
+        is routed on the coarse graph.
+            - If every location lies in one shard's tiles, that shard.
+            - Otherwise, if the query's bounding box is no larger than a tile, the shard which owns most of it.
+              (A shard builds whatever region it is asked for, and one this size is no more than it holds anyway)
+            - Otherwise, or if a location lies outside the served area, None.
+        '''
+        owners = set(self.owner_at(location.latitude, location.longitude) for location in locations)
+        if None in owners:
+            return None
+        if len(owners) == 1:
+            return owners.pop()
+        north, south, east, west = pathfinder.bounding_box_of_all(locations)
+        tile_north, tile_south, tile_east, tile_west = self.tiles[0]
+        if north - south > tile_north - tile_south or east - west > tile_east - tile_west:
+            return None
+        shares = {}
+        for (tile_north, tile_south, tile_east, tile_west), owner in zip(self.tiles, self.owners):
+            height = min(north, tile_north) - max(south, tile_south)
+            width = min(east, tile_east) - max(west, tile_west)
+            if height > 0 and width > 0:
+                shares[owner] = shares.get(owner, 0) + height * width
+        return max(sorted(shares), key=lambda owner: shares[owner])
+
+    def route_query(self, start_address, end_address, profile=profiles.DEFAULT_PROFILE, locations=None):
+        '''
+        Forwards the route to the shard which owns its addresses, or routes it on the coarse graph
+        if it is a long trip between shards. (See owner_of() and Route_Service.route())
+        Results also give the "shard" that answered them, which is None for coarse routes.
+        '''
+        begin = time.perf_counter()
+        locations = locations or (self.geocode(start_address), self.geocode(end_address))
+        geocoded = time.perf_counter() - begin
+        if all(location is not None for location in locations):
+            shard = self.owner_of(locations)
+            if shard is not None:
+                with self.lock:
+                    self.forwarded[shard] += 1
+                result = self.shards[shard].route(start_address, end_address, profile, locations)
+                result["shard"] = shard
+                result.setdefault("timings", {})["geocode"] = round(geocoded * 1000, 3)
+                return result
+
+        result = service.Route_Service.route_query(self, start_address, end_address, profile, locations)
+        result["timings"]["geocode"] = round(geocoded * 1000, 3)
+        if result["status"] in ("ok", "disconnected"):
+            result["shard"] = None
+            result["coarse"] = True
+        if "distance" in result:
+            #Arterials joined by straight lines; not the length of the true shortest route.
+            result["estimated_distance"] = result.pop("distance")
+        return result
+
+    def route_locations(self, location1, location2, progress=None, timings=None, profile=profiles.DEFAULT_PROFILE):
+        '''Finds the route rows between two geocoded locations on the coarse graph. (For trips which span shards)'''
+        begin = time.perf_counter()
+        graph = self.coarse_graph()
+        service.record_stage(timings, "region", begin)
+        begin = time.perf_counter()
+        start_street, start_node, end_street, end_node = pathfinder.endpoint_nodes_of(location1, location2)
+        tree = self.coarse_tree(graph, start_node, self.connectors(graph, start_node, start_street), profile)
+        entry = tree.reach(self.connectors(graph, end_node, end_street))
+        if entry is None:
+            route = "Disconnected"
+        else:
+            u, length, street_id, costs = entry
+            steps = tree.path(u.get_id()) + [(end_node, end_street, length)]
+            route = [[node.latitude, node.longitude, street, distance] for node, street, distance in steps]
+        with self.lock:
+            self.coarse_routes += 1
+        service.record_stage(timings, "search", begin)
+        return route
+
+    def matrix(self, addresses, profile=profiles.DEFAULT_PROFILE, locations=None):
+        '''
+        Forwards the matrix to the shard which owns its addresses, or works it out on the coarse graph.
+        (See owner_of() and Route_Service.matrix())
+        '''
+        column = profiles.column_of(profile)
+        locations = locations or [self.geocode(address) for address in addresses]
+        unresolved = [address for address, location in zip(addresses, locations) if location is None]
+        if unresolved != []:
+            return {"status": "unresolved", "unresolved": unresolved}
+        shard = self.owner_of(locations)
+        if shard is not None:
+            with self.lock:
+                self.forwarded[shard] += 1
+            return dict(self.shards[shard].matrix(addresses, profile, locations), shard=shard)
+
+        graph = self.coarse_graph()
+        stops = [(ds.Node(-3 - index, location.latitude, location.longitude), location.address.split(", ")[1])
+                 for index, location in enumerate(locations)]
+        #Each stop is joined to the coarse graph once; the same straight lines lead to it and away from it.
+        joins = [self.connectors(graph, stop_node, street) for stop_node, street in stops]
+        distances = []
+        for origin, (stop_node, street) in enumerate(stops):
+            tree = self.coarse_tree(graph, stop_node, joins[origin], profile)
+            row = []
+            for destination in range(len(stops)):
+                entry = None if origin == destination else tree.reach(joins[destination])
+                if origin == destination:
+                    row.append(0)
+                elif entry is None:
+                    row.append(None)
+                else:
+                    row.append(tree.distance[entry[0].get_id()] + entry[3][column])
+            distances.append(row)
+        with self.lock:
+            self.coarse_routes += 1
+        return {"status": "ok", "addresses": addresses, "profile": profile, "estimated_distances": distances,
+                "shard": None, "coarse": True}
+
+    def coarse_graph(self):
+        '''Returns the graph of arterials over the whole area, asking each shard for the arterials of its tiles the first time.'''
+        with self.coarse_lock:
+            if self.coarse is None:
+                parts = []
+                for tile, owner in zip(self.tiles, self.owners):
+                    exported = self.shards[owner].arterials(*tile, ARTERIAL_SPEED)
+                    edges = [(start_id, end_id, length, street, tuple(costs)) for start_id, end_id, length, street, costs in exported["edges"]]
+                    parts.append((exported["nodes"], edges, []))
+                self.coarse = tiles.stitch(parts)
+            return self.coarse
+
+    def connectors(self, graph, node, street):
+        '''
+        Joins an address to the coarse graph in a straight line.
+        Returns the edges from the CONNECTORS nearest arterial nodes to the address's node, as tuples of
+        (node, edge_length, street_id, costs), named after the address's street.
+        '''
+        latitude, longitude = node.get_latlong()
+        scale = math.cos(math.radians(latitude))
+        #Ranked by a flat approximation first, so the exact distance is only worked out for the nearest few.
+        nearest = heapq.nsmallest(CONNECTORS, graph.node_list.values(), key=lambda other: (other.latitude - latitude) ** 2 +
+                                                                                        ((other.longitude - longitude) * scale) ** 2)
+        with self.names_lock:
+            street_id = graph.names.intern(street)
+        edges = []
+        for other in nearest:
+            distance = ds.longlat_to_metres(other, node)
+            edges.append((other, distance, street_id, profiles.edge_costs(distance)))
+        return edges
+
+    def coarse_tree(self, graph, node, connectors, profile):
+        '''
+        Joins a node to the coarse graph by its connectors (see connectors()) and returns a Shortest_Path_Tree
+        to grow from it. The edges are added to the node alone, so the coarse graph is left as it was.
+        '''
+        for other, distance, street_id, costs in connectors:
+            node.add_edge(other, (distance, street_id, costs))
+        return ds.Shortest_Path_Tree(graph, node, profile=profile)
+
+    def apply_updates(self, updates):
+        '''Passes street updates on to every shard, and drops the coarse graph so it is stitched again with them.'''
+        closures = [[update[1], update[2]] for update in updates if update[0] == "remove"]
+        weights = [list(update[1:5]) for update in updates if update[0] == "weight"]
+        updated = sum(shard.update(closures, weights).get("updated_regions", 0) for shard in self.shards)
+        with self.coarse_lock:
+            self.coarse = None
+        return {"status": "ok", "updated_regions": updated}
+
+    def apply_osm_change(self, change):
+        '''Passes an OSM change file on to every shard, and drops the coarse graph so it is stitched again with it.'''
+        updated = sum(shard.update(osm_change=change).get("updated_regions", 0) for shard in self.shards)
+        with self.coarse_lock:
+            self.coarse = None
+        return {"status": "ok", "updated_regions": updated}
+
+    def metrics(self):
+        '''Returns the router's counts along with the metrics of every shard. (See Route_Service.metrics())'''
+        shards = []
+        for index, shard in enumerate(self.shards):
+            try:
+                metrics = shard.metrics()
+            except OSError as err:
+                metrics = {"status": "unreachable", "error": str(err)}
+            shards.append(dict(metrics, url=shard.url, forwarded=self.forwarded[index],
+                               tiles=[tile for tile, owner in zip(self.tiles, self.owners) if owner == index]))
+        coarse = self.coarse
+        return {"status": "ok", "geocodes": len(self.geocodes), "coarse_routes": self.coarse_routes,
+                "coarse_nodes": None if coarse is None else len(coarse.node_list), "shards": shards}
+
+def make_router(north, south, east, west, shard_urls, grid=None, host="127.0.0.1", port=8765, workers=8, queue_size=64):
+    '''Creates an HTTP server for a Shard_Router, with the same endpoints as a Route_Service. Call serve_forever() to run it.'''
+    server = ThreadingHTTPServer((host, port), service.Route_Handler)
+    server.service = Shard_Router(north, south, east, west, shard_urls, grid, workers, queue_size)
+    return server
+
+def run_shard(ports, workers):
+    '''Shard process of the local test: a Route_Service on the synthetic grid, on a free local port which is put on ports.'''
+    pathfinder.fetch_region = load_test.synthetic_fetch
+    service.Route_Handler.log_message = lambda handler, *args: None
+    server = service.make_server("127.0.0.1", 0, workers)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+def test_corpus(pairs, spread, seed=0):
+    '''
+    Address pairs on the synthetic grid: three in four are short trips, which usually stay inside one shard,
+    and the rest are long trips across the grid. Returns (pairs, places) like Load_Test.synthetic_corpus().
+    '''
+    rng = random.Random(seed)
+    places = {}
+    corpus = []
+    for n in range(pairs):
+        i, j = rng.randrange(spread), rng.randrange(spread)
+        if n % 4 == 3:
+            k, l = rng.randrange(spread), rng.randrange(spread)
+        else:
+            k, l = min(spread - 1, max(0, i + rng.randint(-6, 6))), min(spread - 1, max(0, j + rng.randint(-6, 6)))
+        ends = []
+        for row, column in ((i, j), (k, l)):
+            address, place = load_test.grid_address(row, column)
+            places[address] = place
+            ends.append(address)
+        corpus.append(tuple(ends))
+    return corpus, places
+
+def local_test(shards=4, pairs=80, spread=120, concurrency=8):
+    '''
+    Starts shard processes on the synthetic grid and a router in this process, then sends every pair of a
+    test corpus both to the router and to a single unsharded Route_Service and compares the answers.
+    Raises AssertionError, after printing the report, unless:
+        - Every forwarded route is exactly as long as the unsharded one.
+        - Every short trip of the corpus (See test_corpus()) was forwarded rather than routed on the coarse graph.
+        - Every coarse route gives an "estimated_distance" and no "distance", within STRETCH_RANGE of the true length.
+        - A matrix within one shard is forwarded with "distances", and one across the area is estimated.
+    '''
+    corpus, places = test_corpus(pairs, spread)
+    #Opposite corners of the grid, for a matrix which can only be estimated.
+    far = []
+    for row, column in ((0, 0), (spread - 1, spread - 1)):
+        address, place = load_test.grid_address(row, column)
+        places[address] = place
+        far.append(address)
+    stub = load_test.install_stubs(places)
+    step = load_test.GRID_STEP
+    north, south = load_test.GRID_ORIGIN[0] + (spread + 10) * step, load_test.GRID_ORIGIN[0] - 10 * step
+    east, west = load_test.GRID_ORIGIN[1] + (spread + 10) * step, load_test.GRID_ORIGIN[1] - 10 * step
+
+    ports = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_shard, args=(ports, 4), daemon=True) for n in range(shards)]
+    for process in processes:
+        process.start()
+    urls = ["http://127.0.0.1:%d" %(ports.get(timeout=60)) for process in processes]
+    router = Shard_Router(north, south, east, west, urls)
+    reference = service.Route_Service(workers=concurrency, queue_size=len(corpus))
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            begin = time.perf_counter()
+            sharded = list(executor.map(lambda pair: router.route(*pair), corpus))
+            router_seconds = time.perf_counter() - begin
+            begin = time.perf_counter()
+            single = list(executor.map(lambda pair: reference.route(*pair), corpus))
+            reference_seconds = time.perf_counter() - begin
+
+        failures = []
+        exact = 0
+        mismatched = 0
+        stretches = []
+        for n, (pair, result, expected) in enumerate(zip(corpus, sharded, single)):
+            if result.get("coarse") and n % 4 != 3:
+                failures.append("Short trip %s -> %s was routed on the coarse graph." %(pair))
+            if result["status"] != "ok" or expected["status"] != "ok":
+                mismatched += result["status"] != expected["status"]
+            elif result.get("coarse"):
+                if "distance" in result or "estimated_distance" not in result:
+                    failures.append("Coarse route %s -> %s does not give its length as an estimate." %(pair))
+                    continue
+                stretches.append(result["estimated_distance"] / expected["distance"])
+                if not STRETCH_RANGE[0] <= stretches[-1] <= STRETCH_RANGE[1]:
+                    failures.append("Coarse route %s -> %s is %.2fx the true length." %(pair + (stretches[-1],)))
+            elif abs(result["distance"] - expected["distance"]) < 1e-6:
+                exact += 1
+            else:
+                mismatched += 1
+        stretches.sort()
+        if mismatched != 0:
+            failures.append("%d routes differ from the unsharded service." %(mismatched))
+
+        near = list(corpus[0])
+        if router.owner_of([router.geocode(address) for address in near]) is not None:
+            result = router.matrix(near)
+            if result.get("distances") != reference.matrix(near).get("distances"):
+                failures.append("A matrix forwarded to one shard differs from the unsharded service.")
+        result = router.matrix(far)
+        if not result.get("coarse") or "distances" in result or "estimated_distances" not in result:
+            failures.append("A matrix across the area does not give its lengths as estimates.")
+
+        metrics = router.metrics()
+        print("Shards: %d    Tiles: %d    Pairs: %d" %(shards, len(router.tiles), len(corpus)))
+        for index, shard in enumerate(metrics["shards"]):
+            print("  Shard %d: %4d forwarded, %2d regions, %6.2f MB" %(index, shard["forwarded"], shard.get("regions", 0), shard.get("size_mb", 0)))
+        print("Forwarded routes matching the unsharded service: %d, mismatches: %d" %(exact, mismatched))
+        if stretches != []:
+            print("Coarse routes: %d over %d arterial nodes, length against the true route: median %.2fx, range %.2fx - %.2fx"
+                  %(len(stretches), metrics["coarse_nodes"], stretches[len(stretches) // 2], stretches[0], stretches[-1]))
+        print("Router: %.2f s    Unsharded: %.2f s    (%d simultaneous queries, cold caches)" %(router_seconds, reference_seconds, concurrency))
+        if failures != []:
+            raise AssertionError("\n".join(failures))
+    finally:
+        for process in processes:
+            process.terminate()
+        reference.shutdown()
+        router.shutdown()
+        stub.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Front router for a sharded deployment of the routing service.")
+    parser.add_argument("north", type=float, nargs="?")
+    parser.add_argument("south", type=float, nargs="?")
+    parser.add_argument("east", type=float, nargs="?")
+    parser.add_argument("west", type=float, nargs="?")
+    parser.add_argument("--shard", action="append", default=[], help="Base url of a shard. Repeat for each shard.")
+    parser.add_argument("--tiles", help="Grid of tiles as ROWSxCOLUMNS. (Default: about one tile per shard)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--local-test", action="store_true", help="Run the multi-process test on the synthetic grid.")
+    parser.add_argument("--shards", type=int, default=4, help="Number of shard processes for --local-test.")
+    parser.add_argument("--pairs", type=int, default=80, help="Number of address pairs for --local-test.")
+    args = parser.parse_args()
+
+    if args.local_test:
+        local_test(args.shards, args.pairs)
+        raise SystemExit(0)
+    if args.west is None or args.shard == []:
+        parser.error("the served area and at least one --shard are required")
+    grid = tuple(int(count) for count in args.tiles.lower().split("x")) if args.tiles else None
+    server = make_router(args.north, args.south, args.east, args.west, args.shard, grid, args.host, args.port, args.workers, args.queue)
+    print("Shard router for %d shards listening on http://%s:%d" %(len(args.shard), args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.service.shutdown()
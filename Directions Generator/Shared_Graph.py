@@ -0,0 +1,595 @@
+'''
+Program: Shared_Graph.py
+Description: Places a Graph into a single block of shared memory so that worker
+             processes can open it read-only without copying it. The graph is
+             flattened into compressed sparse row (CSR) arrays, which means that
+             N worker processes cost roughly one graph's worth of memory instead
+             of N unpickled copies. A Search_Pool runs the searches of the routing
+             service in worker processes this way. (See Route_Service.py)
+
+Usage: python Shared_Graph.py [--size N] [--workers 1 4 16] [--routes N]
+       (Measures the memory of each worker process searching one synthetic regional graph,
+        attached to a shared block or holding its own unpickled copy, and fails unless the
+        shared workers use less memory than the copies at every worker count. Linux only.)
+
+PLEASE NOTE: Nodes are referred to by their index in the shared arrays. Use
+             index_of() to convert an OSM id into an index.
+'''
+
+#Imports
+import time
+import heapq
+import atexit
+import struct
+import bisect
+import random
+import argparse
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import Cost_Profiles as profiles
+
+#Layout of the header at the very start of the shared block.
+#(node_count, edge_count, name_count, name_bytes, start_index, end_index)
+HEADER = struct.Struct("<6q")
+#Index written to the header for an endpoint which was not shared.
+NO_NODE = -1
+#Number of shared graphs each worker process keeps open at once.
+WORKER_GRAPHS = 4
+
+def share_graph(graph, name=None, profile=profiles.DEFAULT_PROFILE, endpoints=True):
+    '''
+    Copies a Graph into a new block of shared memory.
+    ------------------------------------------------------------------------------
+    Input:
+        graph --> The Graph to be shared, with or without its start and end nodes.
+        name  --> Optional name for the shared memory block.
+        profile --> The cost profile searched on. Each profile gets its own block, since the
+                    weights are that profile's cost column. (See Cost_Profiles.py)
+        endpoints --> If False, custom nodes (the endpoints and stops) and the edges to them are left out,
+                      so the block serves any endpoints. (See Shared_Graph.route())
+    ------------------------------------------------------------------------------
+    Output:
+        A Shared_Graph which owns the block. Pass shared.get_name() to workers,
+        and call shared.unlink() once every worker is finished with it.
+    '''
+    #All nodes of the graph, including the custom start and end nodes if it has them.
+    nodes = [node for node_id, node in graph.node_list.items() if endpoints or node_id >= 0]
+    if endpoints:
+        for node in (graph.start_node, graph.end_node):
+            if node is not None and not graph.node_exists(node.get_id()):
+                nodes.append(node)
+    #Sort by id so that workers can binary search for a node without building a dictionary.
+    nodes.sort(key=lambda node: node.get_id())
+    index = {node.get_id(): i for i, node in enumerate(nodes)}
+
+    #Edges refer to street names by their id in the graph's name table.
+    column = profiles.column_of(profile)
+    offsets = [0]
+    targets = []
+    weights = []
+    lengths = []
+    streets = []
+    for node in nodes:
+        for key, edge in node.get_edgelist().items():
+            if key not in index:
+                #Edges to custom nodes which were left out.
+                continue
+            targets.append(index[key])
+            weights.append(edge[3][column])
+            lengths.append(edge[1])
+            streets.append(edge[2])
+        offsets.append(len(targets))
+
+    #Pack the street names into a single blob with an offset table.
+    names = graph.names.names
+    name_blob = bytearray()
+    name_offsets = [0]
+    for street in names:
+        name_blob += street.encode("utf-8")
+        name_offsets.append(len(name_blob))
+
+    n = len(nodes)
+    m = len(targets)
+    k = len(names)
+    size = HEADER.size + 8 * (3*n + (n+1) + 4*m + (k+1)) + len(name_blob)
+
+    #Create the block and write every section into it in order.
+    shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+    HEADER.pack_into(shm.buf, 0, n, m, k, len(name_blob), index.get(-1, NO_NODE), index.get(-2, NO_NODE))
+    position = HEADER.size
+    sections = (("q", [node.get_id() for node in nodes]),
+                ("d", [node.get_latlong()[0] for node in nodes]),
+                ("d", [node.get_latlong()[1] for node in nodes]),
+                ("q", offsets),
+                ("q", targets),
+                ("d", weights),
+                ("d", lengths),
+                ("q", streets),
+                ("q", name_offsets))
+    for fmt, values in sections:
+        struct.pack_into("<%d%s" %(len(values), fmt), shm.buf, position, *values)
+        position += 8 * len(values)
+    shm.buf[position:position+len(name_blob)] = name_blob
+
+    return Shared_Graph(shm.name, _shm=shm)
+
+class Shared_Graph(object):
+    '''A read-only view of a Graph stored in shared memory.'''
+
+    def __init__(self, name, _shm=None):
+        '''
+        Attaches to the shared memory block with the given name.
+        -----------------------------
+        Inputs:
+            - name --> Name of the block, as returned by get_name() of the owner.
+        '''
+        self.owner = _shm is not None
+        if _shm is None:
+            try:
+                #Attaching processes must not unlink the block when they exit. (Python 3.13+)
+                _shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                #Before Python 3.13 the block is registered again, with the resource tracker the workers
+                #share with the process which created it, so it is still only unlinked by its owner.
+                _shm = shared_memory.SharedMemory(name=name)
+        self.shm = _shm
+
+        n, m, k, name_bytes, self.start_index, self.end_index = HEADER.unpack_from(self.shm.buf, 0)
+        buf = self.buf = self.shm.buf.toreadonly()
+        position = HEADER.size
+
+        def section(fmt, count):
+            '''Returns a read-only typed view over the next section of the block.'''
+            nonlocal position
+            view = buf[position:position + 8*count].cast(fmt)
+            position += 8 * count
+            return view
+
+        self.ids = section("q", n)
+        self.latitudes = section("d", n)
+        self.longitudes = section("d", n)
+        self.offsets = section("q", n+1)
+        self.targets = section("q", m)
+        self.weights = section("d", m)
+        self.lengths = section("d", m)
+        self.streets = section("q", m)
+        self.name_offsets = section("q", k+1)
+        self.names = buf[position:position+name_bytes]
+
+    def get_name(self):
+        '''Returns the name of the shared memory block, for passing to worker processes.'''
+        return self.shm.name
+
+    def node_count(self):
+        '''Returns the number of nodes in the shared graph.'''
+        return len(self.ids)
+
+    def index_of(self, osm_id):
+        '''
+        Returns the index of the node with the given OSM id.
+        Raises a KeyError if the node does not exist.
+        '''
+        i = bisect.bisect_left(self.ids, osm_id)
+        if i == len(self.ids) or self.ids[i] != osm_id:
+            raise KeyError(osm_id)
+        return i
+
+    def get_latlong(self, i):
+        '''Returns the latitude longitude coordinates of the node at index i.'''
+        return self.latitudes[i], self.longitudes[i]
+
+    def get_street(self, street_id):
+        '''Returns the street name with the given street number.'''
+        return str(self.names[self.name_offsets[street_id]:self.name_offsets[street_id+1]], "utf-8")
+
+    def get_edgelist(self, i):
+        '''
+        Generates the edges of the node at index i.
+        Each edge is a tuple of (destination_index, edge_cost, street_id, edge_length)
+        '''
+        for e in range(self.offsets[i], self.offsets[i+1]):
+            yield self.targets[e], self.weights[e], self.streets[e], self.lengths[e]
+
+    def dfs(self, start_id=-1, end_id=-2):
+        '''
+        Determines if the node with end_id can be reached from the node with start_id.
+        Mirrors Graph.dfs(), but keeps its discovered set local to the call.
+        '''
+        start = self.index_of(start_id)
+        end = self.index_of(end_id)
+        discovered = {start}
+        stack = [start]
+        while stack != []:
+            u = stack.pop()
+            for v, weight, street, length in self.get_edgelist(u):
+                if v == end:
+                    return True
+                if v not in discovered:
+                    discovered.add(v)
+                    stack.append(v)
+        return False
+
+    def djikstra(self, start_id=-1, end_id=-2):
+        '''
+        Finds the shortest path between two nodes of the shared graph.
+        Search state is kept local to the call, so any number of workers can search at once.
+        ------------------------------------------------------------------------------
+        Output:
+            The same list of [latitude, longitude, street_name, distance] as Graph.djikstra(),
+            or an empty list if end_id cannot be reached.
+        '''
+        start = self.index_of(start_id)
+        end = self.index_of(end_id)
+        distance = {start: 0}
+        previous = {}
+        heapqueue = [(0, start)]
+        while heapqueue != []:
+            dist, u = heapq.heappop(heapqueue)
+            if u == end:
+                break
+            if dist > distance[u]:
+                #Stale entry; u was already settled with a smaller distance.
+                continue
+            for v, weight, street, length in self.get_edgelist(u):
+                temp = dist + weight
+                if temp < distance.get(v, 40075000):
+                    distance[v] = temp
+                    previous[v] = (u, street, length)
+                    heapq.heappush(heapqueue, (temp, v))
+
+        #Reverse-build the shortest path from end node to start node.
+        shortest_path = []
+        node = end
+        while node in previous:
+            u, street, length = previous[node]
+            latitude, longitude = self.get_latlong(node)
+            shortest_path.append([latitude, longitude, self.get_street(street), length])
+            node = u
+        shortest_path.reverse()
+        return shortest_path
+
+    def route(self, starts, ends, end_point):
+        '''
+        Finds the shortest route between two endpoints which are not part of the shared graph,
+        such as the addresses of a query on a shared regional graph. (See endpoint_edges())
+        Search state is kept local to the call, so any number of workers can search at once.
+        ------------------------------------------------------------------------------
+        Input:
+            starts --> The edges from the start address, as (node_id, cost, length, street_id)
+            ends --> The edges into the end address, as (node_id, cost, length, street_id)
+            end_point --> (latitude, longitude) of the end address.
+        ------------------------------------------------------------------------------
+        Output:
+            The same list of [latitude, longitude, street_name, distance] as Graph.djikstra(),
+            or None if the end address cannot be reached.
+        '''
+        distance = {}
+        previous = {}       #Index --> (previous index or None for the start address, street id, length)
+        heapqueue = []
+        for node_id, cost, length, street in starts:
+            try:
+                i = self.index_of(node_id)
+            except KeyError:
+                continue
+            if cost < distance.get(i, 40075000):
+                distance[i] = cost
+                previous[i] = (None, street, length)
+                heapq.heappush(heapqueue, (cost, i))
+        entries = {}        #Index --> (cost, length, street id) of its edge into the end address.
+        for node_id, cost, length, street in ends:
+            try:
+                i = self.index_of(node_id)
+            except KeyError:
+                continue
+            if i not in entries or cost < entries[i][0]:
+                entries[i] = (cost, length, street)
+
+        best = None
+        while heapqueue != []:
+            dist, u = heapq.heappop(heapqueue)
+            if best is not None and dist >= best[0]:
+                #Nothing left can beat the best way into the end address.
+                break
+            if dist > distance[u]:
+                #Stale entry; u was already settled with a smaller distance.
+                continue
+            if u in entries and (best is None or dist + entries[u][0] < best[0]):
+                best = (dist + entries[u][0], u)
+            for v, weight, street, length in self.get_edgelist(u):
+                temp = dist + weight
+                if temp < distance.get(v, 40075000):
+                    distance[v] = temp
+                    previous[v] = (u, street, length)
+                    heapq.heappush(heapqueue, (temp, v))
+        if best is None:
+            return None
+
+        #Reverse-build the route from the end address back to the start address.
+        node = best[1]
+        cost, length, street = entries[node]
+        shortest_path = [[end_point[0], end_point[1], self.get_street(street), length]]
+        while node is not None:
+            u, street, length = previous[node]
+            latitude, longitude = self.get_latlong(node)
+            shortest_path.append([latitude, longitude, self.get_street(street), length])
+            node = u
+        shortest_path.reverse()
+        return shortest_path
+
+    def close(self):
+        '''Detaches from the shared memory block. Views must not be used afterwards.'''
+        for view in (self.ids, self.latitudes, self.longitudes, self.offsets, self.targets,
+                     self.weights, self.lengths, self.streets, self.name_offsets, self.names, self.buf):
+            view.release()
+        self.shm.close()
+
+    def unlink(self):
+        '''Closes and destroys the shared memory block. Only the owner should call this.'''
+        self.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+#The shared graph opened by the current worker process.
+worker_graph = None
+
+def init_worker(name):
+    '''
+    Initializer for process pool workers, for example:
+        multiprocessing.Pool(4, initializer=init_worker, initargs=(shared.get_name(),))
+    '''
+    global worker_graph
+    worker_graph = Shared_Graph(name)
+
+def route_in_worker(start_id=-1, end_id=-2):
+    '''Computes a shortest path on the worker's shared graph. For use with Pool.map and friends.'''
+    return worker_graph.djikstra(start_id, end_id)
+
+#Shared graphs opened by the current worker process of a Search_Pool, by block name. Least recently used first.
+worker_graphs = OrderedDict()
+
+def init_search_worker():
+    '''Initializer for the worker processes of a Search_Pool, which detaches them from their graphs when they exit.'''
+    atexit.register(close_worker_graphs)
+
+def close_worker_graphs():
+    '''Detaches the current worker process from every shared graph it has open.'''
+    while worker_graphs:
+        worker_graphs.popitem()[1].close()
+
+def route_shared(name, starts, ends, end_point):
+    '''
+    Worker process of a Search_Pool: finds a route on the shared graph with the given block name.
+    The block is attached on first use and kept open for the next searches on it.
+    '''
+    graph = worker_graphs.get(name)
+    if graph is None:
+        graph = worker_graphs[name] = Shared_Graph(name)
+        while len(worker_graphs) > WORKER_GRAPHS:
+            worker_graphs.popitem(last=False)[1].close()
+    else:
+        worker_graphs.move_to_end(name)
+    return graph.route(starts, ends, end_point)
+
+def endpoint_edges(graph, profile=profiles.DEFAULT_PROFILE):
+    '''
+    Returns the endpoints attached to a Graph as arguments for Shared_Graph.route(): (starts, ends, end_point)
+    The edges are given as (node_id, cost, length, street_id), with the cost under profile.
+    '''
+    column = profiles.column_of(profile)
+    starts = [(node_id, edge[3][column], edge[1], edge[2]) for node_id, edge in graph.start_node.get_edgelist().items() if node_id >= 0]
+    end_id = graph.end_node.get_id()
+    ends = []
+    for node_id, street_id in graph.street_index.get(graph.names.lower_key(graph.end_street), ()):
+        edge = graph.node_list[node_id].get_edgelist().get(end_id)
+        if edge is not None:
+            ends.append((node_id, edge[3][column], edge[1], edge[2]))
+    return starts, ends, graph.end_node.get_latlong()
+
+class Search_Pool(object):
+    '''
+    Worker processes which search regional graphs placed in shared memory, so searches run on several
+    cores while every worker maps the same copy of each graph. One block is kept per region and profile,
+    and it is shared again whenever the region's graph gets a new version.
+    '''
+
+    def __init__(self, processes):
+        '''
+        Initialization for the pool.
+        -----------------------------
+        Inputs:
+            - processes --> Number of worker processes.
+        '''
+        #Workers are spawned rather than forked, since the service forks from a process with running threads.
+        self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=init_search_worker)
+        self.blocks = {}        #(bounding box, profile) --> [graph version, Shared_Graph, futures of searches on it]
+        self.retired = []       #Blocks which were replaced or whose region was evicted, unlinked once their searches finish.
+        self.lock = threading.Lock()
+
+    def submit(self, region, profile=profiles.DEFAULT_PROFILE):
+        '''
+        Starts the search for the route between the endpoints attached to a region's graph.
+        The caller must hold region.lock, but need not hold it while waiting for the result.
+        Returns a Future of the route rows, which are None if the end cannot be reached.
+        '''
+        key = (region.get_bounding_box(), profile)
+        with self.lock:
+            block = self.blocks.get(key)
+            if block is None or block[0] != region.graph.version:
+                if block is not None:
+                    self.retired.append(block)
+                block = self.blocks[key] = [region.graph.version, share_graph(region.graph, profile=profile, endpoints=False), []]
+            future = self.executor.submit(route_shared, block[1].get_name(), *endpoint_edges(region.graph, profile))
+            block[2] = [pending for pending in block[2] if not pending.done()] + [future]
+            self.sweep()
+        return future
+
+    def keep(self, bounding_boxes):
+        '''Retires the blocks of every region whose bounding box is not in bounding_boxes, such as evicted regions.'''
+        with self.lock:
+            for key in [key for key in self.blocks if key[0] not in bounding_boxes]:
+                self.retired.append(self.blocks.pop(key))
+            self.sweep()
+
+    def sweep(self):
+        '''Unlinks the retired blocks which no search is using any more. The caller must hold self.lock.'''
+        waiting = []
+        for block in self.retired:
+            if all(future.done() for future in block[2]):
+                block[1].unlink()
+            else:
+                waiting.append(block)
+        self.retired = waiting
+
+    def shared_mb(self):
+        '''Returns the megabytes of shared memory held by the pool.'''
+        with self.lock:
+            return round(sum(block[1].shm.size for block in self.blocks.values()) / 1024 / 1024, 2)
+
+    def close(self):
+        '''Stops the worker processes once their searches are finished, and unlinks every block.'''
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            self.retired.extend(self.blocks.values())
+            self.blocks = {}
+            self.sweep()
+
+def process_memory():
+    '''Returns the memory of the current process in kilobytes as {"rss", "pss", "private"}. (Linux only)'''
+    memory = {}
+    with open("/proc/self/smaps_rollup") as rollup:
+        for line in rollup:
+            field = line.split(":")[0]
+            if field in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                memory[field] = int(line.split()[1])
+    return {"rss": memory["Rss"], "pss": memory["Pss"], "private": memory["Private_Clean"] + memory["Private_Dirty"]}
+
+#What each worker of memory_report() searches: a Shared_Graph, a Graph of its own, or nothing.
+measured_graph = None
+measured_barrier = None
+
+def init_measured(mode, payload, barrier):
+    '''Initializer for the workers of memory_report(). payload is a block name, or the exported graph to copy.'''
+    global measured_graph, measured_barrier
+    import Data_Structures as ds
+    measured_barrier = barrier
+    if mode == "shared":
+        measured_graph = Shared_Graph(payload)
+    elif mode == "copy":
+        nodes, edges = payload
+        measured_graph = ds.Graph()
+        for node_id, latitude, longitude in nodes:
+            measured_graph.add_node(node_id, latitude, longitude)
+        for start_id, end_id, length, street, costs in edges:
+            measured_graph.add_edge(start_id, end_id, (length, street), costs)
+
+def measure_worker(pairs):
+    '''
+    Task for the workers of memory_report(): searches between pairs of intersections, waits until
+    every worker has done the same (so each worker takes exactly one task), and reports its memory.
+    '''
+    import Data_Structures as ds
+    for start_id, end_id in pairs:
+        if isinstance(measured_graph, Shared_Graph):
+            measured_graph.djikstra(start_id, end_id)
+        elif measured_graph is not None:
+            ds.Shortest_Path_Tree(measured_graph, measured_graph.node_list[start_id]).grow(target_id=end_id)
+    measured_barrier.wait(timeout=300)
+    return process_memory()
+
+def memory_report(size=100, worker_counts=(1, 4, 16), routes=10, seed=0):
+    '''
+    Measures the memory of each worker process while N workers search one synthetic regional graph.
+    (See Load_Test.py) The graph is built without endpoints, as the service keeps its warm regions.
+    ------------------------------------------------------------------------------
+    Modes:
+        empty  --> Workers holding no graph, for the memory of the interpreter itself.
+        shared --> Workers attached to one shared block.
+        copy   --> Workers which each unpickle and build their own copy of the graph, as the
+                   workers of Tile_Builder.py would have to.
+    ------------------------------------------------------------------------------
+    Output:
+        (nodes, block_mb, results) where results is a list of (mode, workers, rss_mb, pss_mb, private_mb, seconds),
+        with the memory averaged per worker.
+            rss --> Every page the worker touches, counting shared pages in full.
+            pss --> Shared pages divided between the processes sharing them.
+            private --> Pages only this worker uses.
+    '''
+    import Functionality as pathfinder
+    import Load_Test as load_test
+    import Tile_Builder as tiles
+
+    north = load_test.GRID_ORIGIN[0] + (size - 1) * load_test.GRID_STEP
+    east = load_test.GRID_ORIGIN[1] + (size - 1) * load_test.GRID_STEP
+    graph = pathfinder.build_graph(load_test.Synthetic_Region(north, load_test.GRID_ORIGIN[0], east, load_test.GRID_ORIGIN[1]))
+    shared = share_graph(graph)
+    nodes, edges, index = tiles.export_graph(graph)
+    ids = sorted(graph.node_list)
+    generator = random.Random(seed)
+    pairs = [(generator.choice(ids), generator.choice(ids)) for route in range(routes)]
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    try:
+        for workers in worker_counts:
+            for mode, payload in (("empty", None), ("shared", shared.get_name()), ("copy", (nodes, edges))):
+                begin = time.perf_counter()
+                barrier = context.Barrier(workers)
+                with context.Pool(workers, initializer=init_measured, initargs=(mode, payload, barrier)) as pool:
+                    memory = pool.map(measure_worker, [pairs] * workers, chunksize=1)
+                seconds = time.perf_counter() - begin
+                results.append((mode, workers) + tuple(sum(sample[field] for sample in memory) / len(memory) / 1024
+                                                       for field in ("rss", "pss", "private")) + (seconds,))
+    finally:
+        block_mb = shared.shm.size / 1024 / 1024
+        shared.unlink()
+    return len(graph.node_list), block_mb, results
+
+
+def check_memory(results, slack_mb=1.0):
+    '''
+    Checks the results of memory_report(): with every number of workers, a worker attached to the
+    shared block must use less memory (PSS) than a worker holding its own copy, and the extra memory
+    of a shared worker over an empty one must not grow as more workers share the block.
+    ------------------------------------------------------------------------------
+    Input:
+        results  --> The results of memory_report().
+        slack_mb --> Growth in MB per worker allowed between two numbers of workers, for noise.
+    Output:
+        AssertionError listing every failed check, if any.
+    '''
+    pss = {(mode, workers): pss_mb for mode, workers, rss_mb, pss_mb, private_mb, seconds in results}
+    worker_counts = sorted(set(workers for mode, workers in pss))
+    failures = []
+    for workers in worker_counts:
+        if pss[("shared", workers)] >= pss[("copy", workers)]:
+            failures.append("%d workers: shared PSS %.1f MB is not below copy PSS %.1f MB"
+                            %(workers, pss[("shared", workers)], pss[("copy", workers)]))
+    #The graph's share of each shared worker, above the interpreter itself.
+    extra = [(workers, pss[("shared", workers)] - pss[("empty", workers)]) for workers in worker_counts]
+    for (fewer, before), (more, after) in zip(extra, extra[1:]):
+        if after > before + slack_mb:
+            failures.append("shared PSS over empty grew from %.1f MB with %d workers to %.1f MB with %d workers"
+                            %(before, fewer, after, more))
+    if failures:
+        raise AssertionError("\n".join(failures))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure per-worker memory with a shared graph and with copies of it.")
+    parser.add_argument("--size", type=int, default=100, help="Rows (and columns) of the synthetic grid.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16], help="Numbers of worker processes.")
+    parser.add_argument("--routes", type=int, default=10, help="Searches per worker.")
+    args = parser.parse_args()
+
+    nodes, block_mb, results = memory_report(args.size, args.workers, args.routes)
+    print("Graph of %d nodes, shared block of %.1f MB" %(nodes, block_mb))
+    print("Mode     Workers   RSS MB/worker   PSS MB/worker   Private MB/worker   Total PSS MB   Seconds")
+    for mode, workers, rss, pss, private, seconds in results:
+        print("%-8s %7d %15.1f %15.1f %19.1f %14.1f %9.1f" %(mode, workers, rss, pss, private, pss * workers, seconds))
+    check_memory(results)
+    print("Shared PSS per worker stayed below copy PSS with %s workers." %(", ".join(str(workers) for workers in args.workers)))
@@ -0,0 +1,195 @@
+'''
+Program: Tile_Builder.py
+Description: Builds the graph of a large region on several cores. The region is split
+             into a grid of tiles, and a process pool fetches each tile from the OSM
+             database and builds its part of the graph. Each part comes back as plain
+             lists of nodes, edges, street index entries and OSM way records, and a stitching step
+             merges them into one regional Graph. Intersections on the boundary
+             between tiles appear in both parts and are merged by their OSM id.
+
+Usage: python Tile_Builder.py north south east west [--workers N] [--tiles ROWSxCOLUMNS]
+       (Reports how the build time scales from 1 to N worker processes.)
+'''
+
+#Imports
+import os
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import Data_Structures as ds
+import Functionality as pathfinder
+
+def split_tiles(north, south, east, west, rows, columns):
+    '''Splits a bounding box into a grid of rows x columns tiles, each given as (north, south, east, west).'''
+    height = (north - south) / rows
+    width = (east - west) / columns
+    tiles = []
+    for row in range(rows):
+        for column in range(columns):
+            tiles.append((north - row * height, north - (row + 1) * height,
+                          west + (column + 1) * width, west + column * width))
+    return tiles
+
+def tile_grid(workers):
+    '''Chooses a grid with at least one tile per worker, as close to square as possible. Returns (rows, columns).'''
+    rows = max(1, int(workers ** 0.5))
+    columns = -(-workers // rows)
+    return rows, columns
+
+def free_flow_speed(length, costs):
+    '''
+    Returns the speed in km/h at which an edge is driven under the "time" profile. (See Cost_Profiles.py)
+    Rounded, so that a road with a 50 km/h limit does not come back as 49.999.. km/h.
+    '''
+    return round(length / costs[1] * 3.6, 3) if costs[1] > 0 else 0
+
+def export_graph(graph, min_speed=None):
+    '''
+    Converts a Graph into plain lists which can be sent between processes cheaply.
+    (Pickling the Nodes themselves would follow every edge from node to node)
+    ------------------------------------------------------------------------------
+    Input:
+        graph --> The Graph to export.
+        min_speed --> Optional speed in km/h. If given, only edges at least this fast are exported,
+                      along with the nodes at their ends, and no street index. (e.g. the arterial roads)
+    ------------------------------------------------------------------------------
+    Output:
+        nodes --> List of (osm_id, latitude, longitude)
+        edges --> List of (start_id, end_id, edge_length, street_name, costs)
+        index --> List of (node_id, street_name) for each street leaving a node. (See Graph.index_street())
+    '''
+    names = graph.names
+    nodes = []
+    edges = []
+    kept = set()
+    for node_id, node in graph.node_list.items():
+        for end_id, edge in node.get_edgelist().items():
+            if end_id < 0 or (min_speed is not None and free_flow_speed(edge[1], edge[3]) < min_speed):
+                #Custom nodes (such as attached endpoints) are never exported.
+                continue
+            edges.append((node_id, end_id, edge[1], names.get_name(edge[2]), edge[3]))
+            kept.update((node_id, end_id))
+    for node_id, node in graph.node_list.items():
+        if min_speed is None or node_id in kept:
+            latitude, longitude = node.get_latlong()
+            nodes.append((node_id, latitude, longitude))
+    if min_speed is not None:
+        return nodes, edges, []
+    index = []
+    for entries in graph.street_index.values():
+        for node_id, street_id in entries:
+            index.append((node_id, names.get_name(street_id)))
+    return nodes, edges, index
+
+def build_tile(tile):
+    '''
+    Worker process: fetches one tile from the OSM database and builds its part of the graph.
+    Streets crossing the edge of the tile are kept whole, so neighbouring tiles share their boundary nodes.
+    A tile with no streets in it, such as one over a lake, gives an empty part.
+    '''
+    north, south, east, west = tile
+    try:
+        G = pathfinder.fetch_region(north, south, east, west)
+    except pathfinder.EMPTY_REGION_ERRORS:
+        return [], [], [], [], []
+    graph = pathfinder.build_graph(G)
+    return export_graph(graph) + (export_ways(graph), export_sources(graph))
+
+def export_ways(graph):
+    '''Returns the OSM way records of a Graph as a list of (way_id, start_id, end_id). (See Graph.record_way())'''
+    return [(way_id, start_id, end_id) for way_id, edges in graph.ways.items() for start_id, end_id in edges]
+
+def export_sources(graph):
+    '''
+    Returns the parallel edges recorded for the merged edges of a Graph, as a list of
+    (start_id, end_id, [(way_ids, edge_length, street_name, costs), ...]). (See Graph.record_sources())
+    '''
+    names = graph.names
+    return [(start_id, end_id, [(way_ids, length, names.get_name(street_id), costs) for way_ids, length, street_id, costs in sources])
+            for (start_id, end_id), sources in graph.sources.items()]
+
+def stitch(parts):
+    '''
+    Merges the parts of a region built by build_tile() into one Graph.
+    Nodes are merged by OSM id. An edge found in more than one part keeps its shortest length,
+    along with the parallel edges recorded in the part it was kept from.
+    Parts may also be the (nodes, edges, index) of export_graph() alone, without way records.
+    '''
+    graph = ds.Graph()
+    for part in parts:
+        for node_id, latitude, longitude in part[0]:
+            if graph.node_exists(node_id) == False:
+                graph.add_node(node_id, latitude, longitude)
+    for part in parts:
+        nodes, edges, index = part[:3]
+        kept = set()
+        for start_id, end_id, length, street, costs in edges:
+            existing = graph.node_list[start_id].get_edgelist().get(end_id)
+            if existing is None or length < existing[1]:
+                graph.add_edge(start_id, end_id, (length, street), costs)
+                kept.add((start_id, end_id))
+        for node_id, street in index:
+            graph.index_street(node_id, (None, street))
+        for way_id, start_id, end_id in (part[3] if len(part) > 3 else ()):
+            graph.record_way(way_id, start_id, end_id)
+        for start_id, end_id, sources in (part[4] if len(part) > 4 else ()):
+            if (start_id, end_id) in kept:
+                graph.sources[(start_id, end_id)] = [(tuple(way_ids), length, graph.names.intern(street), tuple(costs))
+                                                     for way_ids, length, street, costs in sources]
+    return graph
+
+def build_region(north, south, east, west, workers=None, grid=None):
+    '''
+    Builds the graph of a region, with each tile fetched and built in its own process.
+    ------------------------------------------------------------------------------
+    Input:
+        north, south, east, west --> The bounding box of the region.
+        workers --> Number of worker processes. (Default: the number of cores)
+                    With 1 worker, every tile is built in this process.
+        grid --> Optional (rows, columns) of tiles. (Default: see tile_grid())
+    ------------------------------------------------------------------------------
+    Output:
+        A Graph of the region without endpoints, the same as build_graph(fetch_region(...)) gives.
+    '''
+    workers = workers or os.cpu_count() or 1
+    rows, columns = grid or tile_grid(workers)
+    tiles = split_tiles(north, south, east, west, rows, columns)
+    if workers == 1:
+        parts = [build_tile(tile) for tile in tiles]
+    else:
+        #Workers are spawned rather than forked, since the service builds regions from threads. (See Route_Service.region_for())
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            parts = list(executor.map(build_tile, tiles))
+    return stitch(parts)
+
+def scaling_report(north, south, east, west, max_workers, grid=None):
+    '''
+    Times build_region() with 1 to max_workers worker processes, on the same grid of tiles.
+    Returns a list of (workers, seconds, speedup, nodes, edges)
+    '''
+    grid = grid or tile_grid(max_workers)
+    results = []
+    for workers in range(1, max_workers + 1):
+        begin = time.perf_counter()
+        graph = build_region(north, south, east, west, workers, grid)
+        seconds = time.perf_counter() - begin
+        speedup = results[0][1] / seconds if results != [] else 1.0
+        results.append((workers, seconds, speedup, len(graph.node_list), graph.edge_count()))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report how building a region's graph scales with worker processes.")
+    parser.add_argument("north", type=float)
+    parser.add_argument("south", type=float)
+    parser.add_argument("east", type=float)
+    parser.add_argument("west", type=float)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tiles", help="Grid of tiles as ROWSxCOLUMNS. (Default: about one tile per worker)")
+    args = parser.parse_args()
+    grid = tuple(int(count) for count in args.tiles.lower().split("x")) if args.tiles else None
+
+    print("Workers    Seconds    Speedup    Nodes    Edges")
+    for workers, seconds, speedup, nodes, edges in scaling_report(args.north, args.south, args.east, args.west, args.workers, grid):
+        print("%7d %10.2f %9.2fx %8d %8d" %(workers, seconds, speedup, nodes, edges))